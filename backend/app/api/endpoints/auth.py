@@ -12,8 +12,9 @@ from app.core.security import (
 )
 from app.schemas import User, UserCreate, Token
 from app.model import User as UserModel
+from app.core.profiling import ProfiledRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 
 @router.post("/register", response_model=User)
 async def register(user_in: UserCreate, db: Session = Depends(get_db)):
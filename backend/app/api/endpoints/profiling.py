@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.core.profiling import get_profile
+from app.core.security import get_current_admin
+
+router = APIRouter()
+
+
+@router.get("/{request_id}")
+async def read_profile(request_id: str, admin=Depends(get_current_admin)):
+    """
+    Get a stored request profile (requests made with ?profile=1)
+    """
+    profile = get_profile(request_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Profile {request_id} not found"
+        )
+    return profile
@@ -1,12 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+import gzip
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
 from typing import List, Optional
+from datetime import datetime
 from pydantic import BaseModel
-from app.core.database import get_db
-import json
+from app.core.config import settings
+from app.core.concurrency import SingleFlight, cancel_on_disconnect, get_limiter
+from app.core.database import QueryCanceller, read_db, read_session
+from app.core.fastjson import FastJSONResponse, dumps, raw_json
+from app.core.profiling import ProfiledRoute, profile_section, run_in_threadpool
+from app.graph.alternatives import journey_alternatives
+from app.graph.bundle import get_bundle
+from app.graph.snapping import get_snapper, nearest_node
+from app.graph.patterns import get_transfer_patterns, hub_journeys
+from app.graph.ranking import rank_direct_routes
+from app.graph.regions import get_registry, network_at, region_id_at
+from app.graph.snapshot import get_network
+from app.graph.speeds import get_speed_profiles, seconds_of_day
+from app.graph.transfers import get_transfers
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
+
+# Identical expensive queries in flight at the same time run only once
+_in_flight = SingleFlight()
 
 # Pydantic Models
 class LocationPoint(BaseModel):
@@ -19,6 +37,8 @@ class NearestStop(BaseModel):
     distance_meters: float
     latitude: float
     longitude: float
+    # Parent station; only its nearest platform is listed
+    station_id: Optional[int] = None
 
 class BusRoute(BaseModel):
     route_id: int
@@ -28,6 +48,13 @@ class BusRoute(BaseModel):
     start_sequence: Optional[int]
     end_sequence: Optional[int]
     distance_meters: Optional[float]
+    # Only with a departure_time, from the speed profiles
+    estimated_time_seconds: Optional[float] = None
+    # Only when ranked from the network snapshot
+    from_stop_id: Optional[int] = None
+    to_stop_id: Optional[int] = None
+    walking_meters: Optional[float] = None
+    generalized_cost_seconds: Optional[float] = None
 
 class RouteStop(BaseModel):
     sequence: int
@@ -53,15 +80,240 @@ class WalkingSegment(BaseModel):
     cost: float
     geometry: dict  # GeoJSON type
 
+class JourneyLeg(BaseModel):
+    mode: str  # walk or bus
+    duration_seconds: float
+    distance_meters: float
+    route_id: Optional[int] = None
+    route_name: Optional[str] = None
+    from_stop_id: Optional[int] = None
+    to_stop_id: Optional[int] = None
+    segments: Optional[List[WalkingSegment]] = None
+
+class JourneyOption(BaseModel):
+    total_time_seconds: float
+    walking_meters: float
+    transfers: int
+    legs: List[JourneyLeg]
+
+class SnappedPoint(BaseModel):
+    way_id: int
+    fraction: float
+    distance_meters: float
+    source_node_id: int
+    target_node_id: int
+    source_cost: float
+    target_cost: float
+    latitude: float
+    longitude: float
+
 class CompleteJourney(BaseModel):
     start_location: LocationPoint
     end_location: LocationPoint
     nearest_start_stops: List[NearestStop]
     nearest_end_stops: List[NearestStop]
+    # Lowest generalized cost first when the network snapshot is loaded
     direct_routes: List[BusRoute]
     has_direct_route: bool
     walking_to_start: Optional[List[WalkingSegment]] = None
     walking_from_end: Optional[List[WalkingSegment]] = None
+    # Ranked by total time: between hubs always, elsewhere only when more
+    # than one is asked for
+    alternatives: Optional[List[JourneyOption]] = None
+
+# Response helpers for trusted DB rows (skip pydantic validation)
+def _pick_fields(model, rows) -> list:
+    if not rows:
+        return []
+    fields = model.model_fields
+    return [{name: row.get(name) for name in fields} for row in rows]
+
+
+def _walking_segment(row) -> dict:
+    return {
+        "seq": row[0],
+        "way_id": row[1],
+        "way_name": row[2],
+        "length_meters": row[3],
+        "cost": row[4],
+        "geometry": raw_json(row[5]) if row[5] else {},
+    }
+
+
+WALKING_ROUTE_SQL = text("""
+    SELECT * FROM calculate_walking_route(:s_lat, :s_lng, :e_lat, :e_lng, :walking_kmh)
+""")
+WALKING_ROUTE_NODES_SQL = text("""
+    SELECT * FROM calculate_walking_route_between_nodes(
+        :source, :target, :s_lat, :s_lng, :e_lat, :e_lng, :walking_kmh
+    )
+""")
+
+
+def _walk(db, s_lat: float, s_lng: float, e_lat: float, e_lng: float, network=None) -> Optional[list]:
+    """
+    Walking segments between two points, or None when there is no path.
+    With a snapshot both points are snapped here and only the path search
+    runs in SQL; without one the SQL function snaps them itself.
+    """
+    params = {
+        "s_lat": s_lat,
+        "s_lng": s_lng,
+        "e_lat": e_lat,
+        "e_lng": e_lng,
+        "walking_kmh": settings.WALKING_SPEED_KMH
+    }
+    if network is None:
+        rows = db.execute(WALKING_ROUTE_SQL, params).fetchall()
+    else:
+        with profile_section("graph.snap_walk"):
+            origin, target = get_snapper(network).snap_many([(s_lng, s_lat), (e_lng, e_lat)])
+        if origin is None or target is None:
+            return None
+        params["source"] = int(network.node_id[nearest_node(network, origin)])
+        params["target"] = int(network.node_id[nearest_node(network, target)])
+        rows = db.execute(WALKING_ROUTE_NODES_SQL, params).fetchall()
+    return [_walking_segment(row) for row in rows] if rows else None
+
+
+def _departure_seconds(departure_time: Optional[datetime]) -> Optional[int]:
+    return seconds_of_day(departure_time) if departure_time is not None else None
+
+
+def _add_etas(routes: list, departure_seconds: Optional[int], network=None) -> None:
+    """Time-dependent ETA for each route dict at the departure time"""
+    if departure_seconds is None or not routes:
+        return
+    profiles = get_speed_profiles(network)
+    if profiles is None:
+        return
+    for route in routes:
+        route["estimated_time_seconds"] = profiles.route_eta(
+            route["route_id"], route["distance_meters"], departure_seconds
+        )
+
+
+def _add_region_etas(routes: list, departure_seconds: int, region: Optional[int]) -> None:
+    _add_etas(routes, departure_seconds, get_network(region))
+
+
+def _region_at(lng: float, lat: float) -> Optional[int]:
+    """
+    Region serving a point, None when regions are not configured. A point
+    outside every region is refused rather than searched in every city.
+    """
+    if get_registry() is None:
+        return None
+    region = region_id_at(lng, lat)
+    if region is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Location is outside every supported region"
+        )
+    return region
+
+
+STOP_POINT_SQL = text("SELECT ST_X(geom), ST_Y(geom) FROM bus_stop WHERE stop_id = :stop_id")
+ROUTE_POINT_SQL = text("""
+    SELECT ST_X(s.geom), ST_Y(s.geom)
+    FROM route_stop rs
+    JOIN bus_stop s ON s.stop_id = rs.stop_id
+    WHERE rs.route_id = :route_id
+    ORDER BY rs.sequence
+    LIMIT 1
+""")
+
+
+def _region_of(db, query, params: dict, missing: str) -> Optional[int]:
+    """Region at the point `query` returns (a stop's position), see _region_at"""
+    if get_registry() is None:
+        return None
+    row = db.execute(query, params).fetchone()
+    if row is None:
+        raise HTTPException(status_code=404, detail=missing)
+    return _region_at(row[0], row[1])
+
+
+WAY_GEOMETRY_SQL = text("SELECT osm_id, ST_AsGeoJSON(geom) FROM osm_way WHERE osm_id = ANY(:ids)")
+
+
+def _journey_options(db, network, options) -> list:
+    """
+    Materialize alternatives for the response. The walked ways of every
+    option come back from one geometry query.
+    """
+    way_ids = {
+        int(network.way_id[way])
+        for option in options for leg in option.legs if leg["mode"] == "walk"
+        for way in leg["ways"]
+    }
+    geometry = {}
+    if way_ids:
+        geometry = dict(db.execute(WAY_GEOMETRY_SQL, {"ids": list(way_ids)}).fetchall())
+
+    walk_pace = 3.6 / settings.WALKING_SPEED_KMH
+    content = []
+    for option in options:
+        legs = []
+        for leg in option.legs:
+            item = {
+                "mode": leg["mode"],
+                "duration_seconds": leg["duration_seconds"],
+                "distance_meters": leg["distance_meters"],
+            }
+            if leg["mode"] == "bus":
+                route = leg["route"]
+                item["route_id"] = int(network.route_id[route])
+                item["route_name"] = network.string(int(network.route_name[route]))
+                item["from_stop_id"] = int(network.stop_id[leg["from_stop"]])
+                item["to_stop_id"] = int(network.stop_id[leg["to_stop"]])
+            else:
+                segments = []
+                for seq, (way, meters) in enumerate(zip(leg["ways"], leg["way_meters"]), start=1):
+                    way_id = int(network.way_id[way])
+                    segments.append({
+                        "seq": seq,
+                        "way_id": way_id,
+                        "way_name": network.string(int(network.way_name[way])),
+                        "length_meters": meters,
+                        "cost": meters * walk_pace,
+                        "geometry": raw_json(geometry[way_id]) if geometry.get(way_id) else {},
+                    })
+                item["segments"] = segments
+            legs.append(item)
+        content.append({
+            "total_time_seconds": option.total_seconds,
+            "walking_meters": option.walking_meters,
+            "transfers": option.transfers,
+            "legs": legs,
+        })
+    return content
+
+
+# SQLSTATE for statement_timeout and pg_cancel_backend
+QUERY_CANCELED = "57014"
+
+
+async def _shared(request: Request, name: str, key: tuple, fn, *args) -> bytes:
+    """
+    Run a blocking query function off the event loop, once for all
+    identical concurrent requests, inside the endpoint's admission limit.
+    The query is cancelled once every client asking for it has gone.
+    """
+    async def run(canceller: QueryCanceller):
+        async with get_limiter(name).slot():
+            return await run_in_threadpool(fn, canceller, *args)
+
+    try:
+        return await cancel_on_disconnect(request, _in_flight.do((name,) + key, run))
+    except OperationalError as e:
+        if getattr(e.orig, "pgcode", None) == QUERY_CANCELED:
+            raise HTTPException(
+                status_code=504,
+                detail=f"{name} query exceeded its time budget"
+            )
+        raise
+
 
 # Endpoints
 @router.get("/nearest-stops", response_model=List[NearestStop])
@@ -70,19 +322,26 @@ async def get_nearest_stops(
     lng: float = Query(..., description="Longitude"),
     max_distance: int = Query(500, description="Max distance in meters"),
     limit: int = Query(5, description="Number of stops to return"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(read_db("nearest_stops"))
 ):
     """
     Find nearest bus stops to a location
     """
     try:
+        region = _region_at(lng, lat)
         query = text("""
-            SELECT * FROM find_nearest_stops(:lat, :lng, :max_dist, :lim)
+            SELECT * FROM find_nearest_stops(:lat, :lng, :max_dist, :lim, :region)
         """)
         
         results = db.execute(
             query,
-            {"lat": lat, "lng": lng, "max_dist": max_distance, "lim": limit}
+            {
+                "lat": lat,
+                "lng": lng,
+                "max_dist": max_distance,
+                "lim": limit,
+                "region": region
+            }
         ).fetchall()
         
         return [
@@ -91,10 +350,13 @@ async def get_nearest_stops(
                 stop_name=row[1],
                 distance_meters=row[2],
                 latitude=row[3],
-                longitude=row[4]
+                longitude=row[4],
+                station_id=row[5]
             )
             for row in results
         ]
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -103,19 +365,22 @@ async def get_nearest_stops(
 async def get_routes_between_stops(
     start_stop_id: int = Query(..., description="Start bus stop ID"),
     end_stop_id: int = Query(..., description="End bus stop ID"),
-    db: Session = Depends(get_db)
+    departure_time: Optional[datetime] = Query(None, description="Departure time, for time-dependent ETAs"),
+    db: Session = Depends(read_db("routes_between_stops"))
 ):
     """
     Find all bus routes that connect two stops
     """
     try:
+        # The start stop's position picks the region
+        region = _region_of(db, STOP_POINT_SQL, {"stop_id": start_stop_id}, f"Stop {start_stop_id} not found")
         query = text("""
-            SELECT * FROM find_routes_between_stops(:start, :end)
+            SELECT * FROM find_routes_between_stops(:start, :end, :region)
         """)
         
         results = db.execute(
             query,
-            {"start": start_stop_id, "end": end_stop_id}
+            {"start": start_stop_id, "end": end_stop_id, "region": region}
         ).fetchall()
         
         if not results:
@@ -124,99 +389,175 @@ async def get_routes_between_stops(
                 detail=f"No routes found between stop {start_stop_id} and {end_stop_id}"
             )
         
-        return [
-            BusRoute(
-                route_id=row[0],
-                route_name=row[1],
-                route_type=row[2],
-                is_direct=row[3],
-                start_sequence=row[4],
-                end_sequence=row[5],
-                distance_meters=row[6]
-            )
+        routes = [
+            {
+                "route_id": row[0],
+                "route_name": row[1],
+                "route_type": row[2],
+                "is_direct": row[3],
+                "start_sequence": row[4],
+                "end_sequence": row[5],
+                "distance_meters": row[6]
+            }
             for row in results
         ]
+        departure_seconds = _departure_seconds(departure_time)
+        if departure_seconds is not None:
+            # A profile refresh queries the DB and rebuilds arrays, off the loop
+            await run_in_threadpool(_add_region_etas, routes, departure_seconds, region)
+        return [BusRoute(**route) for route in routes]
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/route-details/{route_id}", response_model=RouteDetails)
-async def get_route_details(
+def _route_details_body(
+    canceller: QueryCanceller,
     route_id: int,
-    start_stop_id: Optional[int] = Query(None, description="Starting stop ID"),
-    end_stop_id: Optional[int] = Query(None, description="Ending stop ID"),
-    db: Session = Depends(get_db)
-):
-    """
-    Get detailed information about a specific route
-    """
-    try:
+    start_stop_id: Optional[int],
+    end_stop_id: Optional[int],
+    departure_seconds: Optional[int]
+) -> bytes:
+    with read_session("route_details", canceller) as db:
+        # The region of the start stop, or of the route's first stop
+        if start_stop_id is not None:
+            region = _region_of(db, STOP_POINT_SQL, {"stop_id": start_stop_id}, f"Stop {start_stop_id} not found")
+        else:
+            region = _region_of(db, ROUTE_POINT_SQL, {"route_id": route_id}, f"Route {route_id} not found")
         query = text("""
-            SELECT * FROM get_route_geometry(:route_id, :start_stop, :end_stop)
+            SELECT * FROM get_route_geometry(:route_id, :speed_kmh, :start_stop, :end_stop)
         """)
         
         result = db.execute(
             query,
             {
                 "route_id": route_id,
+                "speed_kmh": settings.SPEED_PROFILE_DEFAULT_KMH,
                 "start_stop": start_stop_id,
                 "end_stop": end_stop_id
             }
         ).fetchone()
         
-        if not result:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Route {route_id} not found"
-            )
-        
-        # Parse stops JSON
-        stops_data = result[6]  # stops column
-        stops = []
-        if stops_data:
-            for stop in stops_data:
-                stops.append(RouteStop(
-                    sequence=stop['sequence'],
-                    stop_id=stop['stop_id'],
-                    stop_name=stop['stop_name'],
-                    latitude=stop['latitude'],
-                    longitude=stop['longitude']
-                ))
-        
-        return RouteDetails(
-            route_id=result[0],
-            route_name=result[1],
-            route_type=result[2],
-            total_distance_meters=result[3],
-            estimated_time_seconds=result[4],
-            geometry=json.loads(result[5]),  # geom_json
-            stops=stops
+    if not result:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Route {route_id} not found"
+        )
+    
+    estimated_time = result[4]
+    if departure_seconds is not None:
+        network = get_network(region)
+        profiles = get_speed_profiles(network) if network is not None else None
+        if profiles is not None:
+            estimated_time = profiles.route_eta(route_id, result[3], departure_seconds) or estimated_time
+
+    # Trusted DB row: the geometry text goes out without being parsed
+    with profile_section("build.RouteDetails"):
+        content = {
+            "route_id": result[0],
+            "route_name": result[1],
+            "route_type": result[2],
+            "total_distance_meters": result[3],
+            "estimated_time_seconds": estimated_time,
+            "geometry": raw_json(result[5]),  # geom_json
+            "stops": _pick_fields(RouteStop, result[6]),
+        }
+
+    with profile_section("json.render"):
+        return dumps(content)
+
+
+@router.get("/route-details/{route_id}", response_model=RouteDetails)
+async def get_route_details(
+    request: Request,
+    route_id: int,
+    start_stop_id: Optional[int] = Query(None, description="Starting stop ID"),
+    end_stop_id: Optional[int] = Query(None, description="Ending stop ID"),
+    departure_time: Optional[datetime] = Query(None, description="Departure time, for a time-dependent ETA"),
+):
+    """
+    Get detailed information about a specific route
+    """
+    departure_seconds = _departure_seconds(departure_time)
+    try:
+        body = await _shared(
+            request,
+            "route_details",
+            (route_id, start_stop_id, end_stop_id, departure_seconds),
+            _route_details_body, route_id, start_stop_id, end_stop_id, departure_seconds
         )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return FastJSONResponse(body)
 
 
-@router.post("/plan-journey", response_model=CompleteJourney)
-async def plan_journey(
+def _plan_journey_body(
+    canceller: QueryCanceller,
     start: LocationPoint,
     end: LocationPoint,
-    max_walk_distance: int = Query(500, description="Max walking distance in meters"),
-    db: Session = Depends(get_db)
-):
-    """
-    Plan complete journey from start to end location
-    Includes:
-    - Nearest stops to start and end
-    - Direct bus routes between stops
-    - Walking routes if needed
-    """
-    try:
+    max_walk_distance: int,
+    departure_seconds: Optional[int],
+    alternatives: int
+) -> bytes:
+    # Each region has its own snapshot; a journey cannot leave it
+    region = _region_at(start.lng, start.lat)
+    if region != _region_at(end.lng, end.lat):
+        raise HTTPException(
+            status_code=400,
+            detail="Start and end are in different regions"
+        )
+    network = network_at(start.lng, start.lat)
+
+    # Searched before taking a connection, everything is in memory. Hub to
+    # hub journeys are answered from the stored transfer patterns.
+    options = []
+    ranked_direct = None
+    hub_options = None
+    if network is not None:
+        profiles = get_speed_profiles(network) if departure_seconds is not None else None
+        with profile_section("graph.rank_direct"):
+            ranked_direct = rank_direct_routes(
+                network,
+                (start.lng, start.lat),
+                (end.lng, end.lat),
+                max_walk_distance,
+                settings.DIRECT_ROUTES_MAX,
+                departure_seconds,
+                profiles,
+            )
+        patterns = get_transfer_patterns(network)
+        if patterns is not None:
+            with profile_section("graph.transfer_patterns"):
+                hub_options = hub_journeys(
+                    network, patterns,
+                    (start.lng, start.lat),
+                    (end.lng, end.lat),
+                    max_walk_distance,
+                    alternatives,
+                    departure_seconds,
+                    profiles,
+                    ranked_direct,
+                )
+        if hub_options is not None:
+            options = hub_options
+        elif alternatives > 1:
+            with profile_section("graph.alternatives"):
+                options = journey_alternatives(
+                    network,
+                    (start.lng, start.lat),
+                    (end.lng, end.lat),
+                    max_walk_distance,
+                    alternatives,
+                    departure_seconds,
+                    profiles,
+                )
+
+    with read_session("plan_journey", canceller) as db:
         query = text("""
-            SELECT find_complete_journey(:start_lat, :start_lng, :end_lat, :end_lng, :max_walk)
+            SELECT find_complete_journey(:start_lat, :start_lng, :end_lat, :end_lng, :max_walk, :region, :direct)
         """)
         
         result = db.execute(
@@ -226,7 +567,10 @@ async def plan_journey(
                 "start_lng": start.lng,
                 "end_lat": end.lat,
                 "end_lng": end.lng,
-                "max_walk": max_walk_distance
+                "max_walk": max_walk_distance,
+                "region": region,
+                # Ranked in memory, only the nearest stops are needed
+                "direct": ranked_direct is None
             }
         ).fetchone()
         
@@ -238,72 +582,194 @@ async def plan_journey(
         
         journey_data = result[0]
         
-        # Parse response
-        nearest_start = [
-            NearestStop(**stop) for stop in journey_data.get('nearest_start_stops', [])
-        ] if journey_data.get('nearest_start_stops') else []
+        # Keep only the declared fields, the rows themselves are trusted
+        nearest_start = _pick_fields(NearestStop, journey_data.get('nearest_start_stops'))
+        nearest_end = _pick_fields(NearestStop, journey_data.get('nearest_end_stops'))
+        if ranked_direct is not None:
+            direct_routes = ranked_direct
+            has_direct_route = bool(ranked_direct)
+        else:
+            direct_routes = _pick_fields(BusRoute, journey_data.get('direct_routes'))
+            has_direct_route = journey_data.get('has_direct_route', False)
         
-        nearest_end = [
-            NearestStop(**stop) for stop in journey_data.get('nearest_end_stops', [])
-        ] if journey_data.get('nearest_end_stops') else []
-        
-        direct_routes = [
-            BusRoute(**route) for route in journey_data.get('direct_routes', [])
-        ] if journey_data.get('direct_routes') else []
-        
-        # Calculate walking segments if needed
+        # Calculate walking segments if needed: to and from the stops of the
+        # best ranked route, else to the nearest stop
         walking_to_start = None
         walking_from_end = None
         
-        if nearest_start:
-            walk_query = text("""
-                SELECT * FROM calculate_walking_route(:s_lat, :s_lng, :e_lat, :e_lng)
-            """)
-            
-            walk_result = db.execute(
-                walk_query,
-                {
-                    "s_lat": start.lat,
-                    "s_lng": start.lng,
-                    "e_lat": nearest_start[0].latitude,
-                    "e_lng": nearest_start[0].longitude
-                }
-            ).fetchall()
-            
-            if walk_result:
-                walking_to_start = [
-                    WalkingSegment(
-                        seq=row[0],
-                        way_id=row[1],
-                        way_name=row[2],
-                        length_meters=row[3],
-                        cost=row[4],
-                        geometry=json.loads(row[5]) if row[5] else {}
-                    )
-                    for row in walk_result
-                ]
-        
-        return CompleteJourney(
-            start_location=start,
-            end_location=end,
-            nearest_start_stops=nearest_start,
-            nearest_end_stops=nearest_end,
-            direct_routes=direct_routes,
-            has_direct_route=journey_data.get('has_direct_route', False),
-            walking_to_start=walking_to_start,
-            walking_from_end=walking_from_end
+        if ranked_direct:
+            board = network.stop_index(ranked_direct[0]["from_stop_id"])
+            alight = network.stop_index(ranked_direct[0]["to_stop_id"])
+            walking_to_start = _walk(
+                db, start.lat, start.lng, float(network.stop_lat[board]), float(network.stop_lng[board]),
+                network
+            )
+            walking_from_end = _walk(
+                db, float(network.stop_lat[alight]), float(network.stop_lng[alight]), end.lat, end.lng,
+                network
+            )
+        elif nearest_start:
+            walking_to_start = _walk(
+                db, start.lat, start.lng, nearest_start[0]["latitude"], nearest_start[0]["longitude"],
+                network
+            )
+
+        journey_options = _journey_options(db, network, options) if options else None
+    
+    with profile_section("build.CompleteJourney"):
+        content = {
+            "start_location": start.model_dump(),
+            "end_location": end.model_dump(),
+            "nearest_start_stops": nearest_start,
+            "nearest_end_stops": nearest_end,
+            "direct_routes": direct_routes,
+            "has_direct_route": has_direct_route,
+            "walking_to_start": walking_to_start,
+            "walking_from_end": walking_from_end,
+            "alternatives": journey_options,
+        }
+
+    with profile_section("json.render"):
+        return dumps(content)
+
+
+@router.post("/plan-journey", response_model=CompleteJourney)
+async def plan_journey(
+    request: Request,
+    start: LocationPoint,
+    end: LocationPoint,
+    max_walk_distance: int = Query(500, description="Max walking distance in meters"),
+    departure_time: Optional[datetime] = Query(None, description="Departure time, for time-dependent ETAs"),
+    alternatives: int = Query(1, ge=1, le=settings.ALTERNATIVES_MAX, description="Number of ranked journey options"),
+):
+    """
+    Plan complete journey from start to end location
+    Includes:
+    - Nearest stops to start and end
+    - Direct bus routes between stops, best first by walking and riding
+      time (from the network snapshot when it is loaded)
+    - Walking routes if needed
+    - Bus ETAs at departure_time, when given
+    - Up to `alternatives` diverse walk / bus options, fastest first
+      (from precomputed transfer patterns when the nearest station at
+      both ends is a hub)
+    """
+    departure_seconds = _departure_seconds(departure_time)
+    try:
+        body = await _shared(
+            request,
+            "plan_journey",
+            (start.lat, start.lng, end.lat, end.lng, max_walk_distance, departure_seconds, alternatives),
+            _plan_journey_body, start, end, max_walk_distance, departure_seconds, alternatives
         )
-        
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return FastJSONResponse(body)
+
+
+def _snapped_point(network, snap) -> dict:
+    return {
+        "way_id": int(network.way_id[snap.way]),
+        "fraction": snap.fraction,
+        "distance_meters": snap.distance_meters,
+        "source_node_id": int(network.node_id[network.way_source[snap.way]]),
+        "target_node_id": int(network.node_id[network.way_target[snap.way]]),
+        "source_cost": snap.source_cost,
+        "target_cost": snap.target_cost,
+        "latitude": snap.lat,
+        "longitude": snap.lng,
+    }
+
+
+def _by_region(points: List[LocationPoint]) -> dict:
+    """Region ID -> indexes of the points inside it"""
+    groups = {}
+    for i, p in enumerate(points):
+        groups.setdefault(region_id_at(p.lng, p.lat), []).append(i)
+    return groups
+
+
+@router.post("/snap", response_model=List[Optional[SnappedPoint]])
+async def snap_points(points: List[LocationPoint]):
+    """
+    Snap GPS points onto the nearest ways (null when none is close enough)
+    """
+    if len(points) > settings.SNAP_MAX_BATCH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.SNAP_MAX_BATCH} points per request"
+        )
+    # Loading a snapshot or re-reading the regions manifest blocks, off the loop
+    registry = get_registry()
+    if registry is None and await run_in_threadpool(get_network) is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Network snapshot not loaded"
+        )
+
+    # Points are snapped against their own region's snapshot
+    groups = await run_in_threadpool(_by_region, points)
+
+    content = [None] * len(points)
+    for region, indexes in groups.items():
+        if registry is not None and region is None:
+            continue  # outside every region
+        network = await run_in_threadpool(get_network, region)
+        if network is None:
+            continue
+        snapper = await run_in_threadpool(get_snapper, network)
+        snaps = await run_in_threadpool(snapper.snap_many, [(points[i].lng, points[i].lat) for i in indexes])
+        for i, snap in zip(indexes, snaps):
+            if snap is not None:
+                content[i] = _snapped_point(network, snap)
+    return FastJSONResponse(content)
+
+
+@router.get("/network-snapshot")
+async def get_network_snapshot(
+    request: Request,
+    since: Optional[int] = Query(None, description="Version the client already has, for a delta"),
+    region: Optional[int] = Query(None, description="Region ID, when running one snapshot per city"),
+):
+    """
+    Stops, routes, stop sequences and simplified geometries as one gzipped
+    columnar JSON bundle for offline use, or the changes since a version
+    """
+    network = await run_in_threadpool(get_network, region)
+    if network is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Network snapshot not loaded"
+        )
+
+    etag = f'"{network.version}"'
+    headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+    if since == network.version or request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    try:
+        bundle = await run_in_threadpool(get_bundle, network)
+        body = None
+        if since is not None:
+            body = await run_in_threadpool(bundle.delta, since)
+        if body is None:
+            body = bundle.body
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+    else:
+        body = gzip.decompress(body)
+    return Response(body, media_type="application/json", headers=headers)
 
 
 @router.get("/routes-at-stop/{stop_id}")
 async def get_routes_at_stop(
     stop_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(read_db("routes_at_stop"))
 ):
     """
     Get all bus routes that serve a specific stop
@@ -337,13 +803,20 @@ async def get_routes_at_stop(
 
 
 @router.get("/route-types")
-async def get_available_route_types(db: Session = Depends(get_db)):
+async def get_available_route_types(
+    region: Optional[int] = Query(None, description="Only route types of this region"),
+    db: Session = Depends(read_db("route_types"))
+):
     """
     Get all available route types (bus, minibus, microbus, etc.)
     """
     try:
-        query = text("SELECT DISTINCT route_type FROM route WHERE route_type IS NOT NULL")
-        results = db.execute(query).fetchall()
+        query = text("""
+            SELECT DISTINCT route_type FROM route
+            WHERE route_type IS NOT NULL
+              AND (CAST(:region AS SMALLINT) IS NULL OR region_id = :region)
+        """)
+        results = db.execute(query, {"region": region}).fetchall()
         
         return {
             "route_types": [row[0] for row in results if row[0]]
@@ -352,12 +825,24 @@ async def get_available_route_types(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _network_health() -> dict:
+    network = get_network()
+    registry = get_registry()
+    return {
+        "network_snapshot": network.version if network else None,
+        "regions": registry.loaded() if registry else None,
+        "transfers": network is not None and get_transfers(network) is not None,
+        "transfer_patterns": network is not None and get_transfer_patterns(network) is not None,
+    }
+
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {
         "status": "ok",
         "service": "routing",
+        **await run_in_threadpool(_network_health),
         "features": [
             "nearest_stops",
             "routes_between_stops",
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends, status
+from sqlalchemy.orm import Session
+from typing import List
+
+from app.schemas.speed_profile import SpeedProfile, SpeedProfileUpdate
+from app.crud import speed_profile
+from app.core.database import get_db
+from app.core.profiling import ProfiledRoute
+from app.core.security import get_current_admin
+
+router = APIRouter(prefix="/speed-profiles", tags=["Speed profiles"], route_class=ProfiledRoute)
+
+@router.get("/", response_model=List[SpeedProfile])
+def list_speed_profiles(db: Session = Depends(get_db)):
+    return speed_profile.get_profiles(db)
+
+@router.put("/", response_model=SpeedProfile)
+def put_speed_profile(profile_in: SpeedProfileUpdate, db: Session = Depends(get_db), admin=Depends(get_current_admin)):
+    """
+    Create or replace the profile for a highway type or route. Routing
+    picks it up within SPEED_PROFILE_CHECK_SECONDS, no restart needed.
+    """
+    return speed_profile.upsert_profile(db, profile_in)
+
+@router.delete("/{profile_id}", status_code=status.HTTP_200_OK)
+def delete_speed_profile(profile_id: int, db: Session = Depends(get_db), admin=Depends(get_current_admin)):
+    return speed_profile.delete_profile(db, profile_id)
@@ -6,8 +6,9 @@ from typing import List
 from app.schemas.user import User, UserCreate, UserUpdate, UserPasswordUpdate
 from app.crud import user
 from app.core.database import get_db  
+from app.core.profiling import ProfiledRoute
 
-router = APIRouter(prefix="/users", tags=["Users"])
+router = APIRouter(prefix="/users", tags=["Users"], route_class=ProfiledRoute)
 
 @router.post("/", response_model=User, status_code=status.HTTP_201_CREATED)
 def create_user(user_in: UserCreate, db: Session = Depends(get_db)):
@@ -0,0 +1,214 @@
+import gzip
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import anyio
+
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _gzip(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def _brotli(body: bytes) -> bytes:
+    return brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+
+def _zstd(body: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL).compress(body)
+
+
+# Server preference, best ratio for GeoJSON first
+ENCODERS = [("gzip", _gzip)]
+if brotli is not None:
+    ENCODERS.insert(0, ("br", _brotli))
+if zstandard is not None:
+    ENCODERS.insert(0, ("zstd", _zstd))
+_ENCODER_FUNCS = dict(ENCODERS)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the preferred encoding the client accepts (q > 0), if any"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for name, _ in ENCODERS:
+        q = accepted.get(name, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def _is_compressible(content_type: str) -> bool:
+    content_type = content_type.split(";", 1)[0].strip().lower()
+    return content_type.startswith("text/") or content_type in settings.COMPRESSION_CONTENT_TYPES
+
+
+def _vary(headers: list) -> bytes:
+    """The response's Vary values with Accept-Encoding added"""
+    values = [
+        value.strip()
+        for k, v in headers if k.lower() == b"vary"
+        for value in v.split(b",") if value.strip()
+    ]
+    if b"*" not in values and not any(v.lower() == b"accept-encoding" for v in values):
+        values.append(b"Accept-Encoding")
+    return b", ".join(values)
+
+
+class _ResponseCache:
+    """
+    LRU of already-compressed responses, bounded by total body size.
+    Only touched from the event loop thread, so no locking.
+    """
+
+    def __init__(self):
+        self.entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.size = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, status, headers, body = entry
+        if expires < time.monotonic():
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return status, headers, body
+
+    def put(self, key, status: int, headers: list, body: bytes) -> None:
+        if len(body) > settings.COMPRESSION_CACHE_MAX_BYTES:
+            return
+        self._remove(key)
+        expires = time.monotonic() + settings.COMPRESSION_CACHE_TTL_SECONDS
+        self.entries[key] = (expires, status, headers, body)
+        self.size += len(body)
+        while self.size > settings.COMPRESSION_CACHE_MAX_BYTES:
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, key) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[3])
+
+
+class CompressionMiddleware:
+    """
+    Content-negotiated zstd / brotli / gzip compression for responses over
+    COMPRESSION_MIN_SIZE. Large bodies are compressed in a worker thread so
+    the event loop keeps serving. GET responses under COMPRESSION_CACHE_PATHS
+    are cached after compression, per encoding, and served from memory.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.cache = _ResponseCache()
+
+    def _cache_key(self, scope, headers: dict, encoding: Optional[str]):
+        if scope["method"] != "GET" or b"authorization" in headers:
+            return None
+        if not any(scope["path"].startswith(p) for p in settings.COMPRESSION_CACHE_PATHS):
+            return None
+        query = scope.get("query_string", b"")
+        # Profiled requests, and ETAs that follow live speed profiles
+        if b"profile=" in query or b"departure_time=" in query:
+            return None
+        # CORS headers depend on the Origin, should CORS ever sit inside this middleware
+        return scope["path"], query, encoding or "identity", headers.get(b"origin")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        cache_key = self._cache_key(scope, headers, encoding)
+
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                status, response_headers, body = cached
+                await send({"type": "http.response.start", "status": status, "headers": response_headers})
+                await send({"type": "http.response.body", "body": body})
+                return
+
+        start_message = None
+        chunks = []
+        passthrough = False
+
+        async def buffering_send(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                response_headers = {k.lower(): v for k, v in message.get("headers", [])}
+                content_type = response_headers.get(b"content-type", b"").decode("latin-1")
+                if (
+                    encoding is None and cache_key is None
+                    or b"content-encoding" in response_headers
+                    or not _is_compressible(content_type)
+                ):
+                    passthrough = True
+                    await send(message)
+                    return
+                start_message = message
+                return
+
+            if message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if message.get("more_body", False):
+                    return
+                await self._finish(start_message, b"".join(chunks), encoding, cache_key, send)
+
+        await self.app(scope, receive, buffering_send)
+
+    async def _finish(self, start_message, body: bytes, encoding, cache_key, send):
+        status = start_message["status"]
+        headers = [
+            (k, v) for k, v in start_message.get("headers", [])
+            if k.lower() not in (b"content-length", b"vary")
+        ]
+        headers.append((b"vary", _vary(start_message.get("headers", []))))
+
+        if encoding is not None and len(body) >= settings.COMPRESSION_MIN_SIZE:
+            compress = _ENCODER_FUNCS[encoding]
+            if len(body) >= settings.COMPRESSION_THREAD_MIN_SIZE:
+                body = await anyio.to_thread.run_sync(compress, body)
+            else:
+                body = compress(body)
+            headers.append((b"content-encoding", encoding.encode()))
+
+        headers.append((b"content-length", str(len(body)).encode()))
+
+        if cache_key is not None and status == 200:
+            self.cache.put(cache_key, status, headers, body)
+
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
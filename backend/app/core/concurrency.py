@@ -0,0 +1,144 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Hashable
+
+from fastapi import HTTPException, Request, status
+
+from app.core.config import settings
+from app.core.database import QueryCanceller, read_pool_saturated
+
+
+class _Call:
+    __slots__ = ("task", "waiters", "canceller")
+
+    def __init__(self):
+        self.task: asyncio.Task = None
+        self.waiters = 0
+        self.canceller = QueryCanceller()
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one in-flight computation.
+
+    The computation runs as its own task, so a caller going away does not
+    cancel the work other callers are still waiting on. When the last
+    caller goes away, the task and its backend query are cancelled.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[QueryCanceller], Awaitable]):
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call()
+            call.task = asyncio.ensure_future(fn(call.canceller))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._forget(key, call)
+                call.canceller.cancel()
+                call.task.cancel()
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Abandoned computations may fail with nobody left to look
+        if call.task.done() and not call.task.cancelled():
+            call.task.exception()
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable):
+    """
+    Await `awaitable`, cancelling it as soon as the HTTP client disconnects
+    so abandoned requests stop holding database work.
+    """
+    work = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        work.cancel()
+        raise
+    finally:
+        watcher.cancel()
+
+    if not work.done():
+        work.cancel()
+        raise HTTPException(status_code=499, detail="Client closed request")
+    return work.result()
+
+
+def overloaded(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=detail,
+        headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)},
+    )
+
+
+class AdmissionLimiter:
+    """
+    At most `limit` concurrent executions with a bounded wait queue. When the
+    queue is full, the wait times out, or the read pool has no connection
+    left, the request is shed with 503 + Retry-After instead of piling up.
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self._queued = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        if read_pool_saturated():
+            raise overloaded("Database connections exhausted, retry shortly")
+        if not self._semaphore.locked():
+            # Free slot, acquire() returns without suspending
+            await self._semaphore.acquire()
+        else:
+            if self._queued >= settings.ADMISSION_QUEUE_SIZE:
+                raise overloaded(f"Too many concurrent {self.name} requests")
+            self._queued += 1
+            try:
+                await asyncio.wait_for(
+                    self._semaphore.acquire(), settings.ADMISSION_QUEUE_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                raise overloaded(f"Timed out waiting for a {self.name} slot")
+            finally:
+                self._queued -= 1
+
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+
+_limiters: Dict[str, AdmissionLimiter] = {}
+
+
+def get_limiter(name: str) -> AdmissionLimiter:
+    limiter = _limiters.get(name)
+    if limiter is None:
+        limit = settings.ADMISSION_LIMITS.get(name, settings.ADMISSION_DEFAULT_LIMIT)
+        limiter = _limiters[name] = AdmissionLimiter(name, limit)
+    return limiter
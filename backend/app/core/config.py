@@ -4,6 +4,12 @@ from typing import Optional
 class Settings(BaseSettings):
     # Database
     DATABASE_URL: str
+    SQL_ECHO: bool = True
+
+    # Read replicas for routing and POI queries (empty = use the primary)
+    READ_REPLICA_URLS: list = []
+    READ_POOL_SIZE: int = 10
+    READ_MAX_OVERFLOW: int = 20
     
     # Security
     SECRET_KEY: str
@@ -17,6 +23,100 @@ class Settings(BaseSettings):
     # App
     PROJECT_NAME: str = "Road Paari"
     VERSION: str = "1.0.0"
+
+    # Profiling (?profile=1, admin only)
+    PROFILE_SAMPLE_INTERVAL_MS: int = 5
+    PROFILE_STORE_SIZE: int = 100
+
+    # Anonymized request log for replay (disabled when no path is set)
+    REQUEST_LOG_PATH: Optional[str] = None
+    REQUEST_LOG_SAMPLE_RATE: float = 1.0
+    REQUEST_LOG_PREFIXES: list = ["/api/routing/"]
+
+    # Per-endpoint statement_timeout budgets for read queries (ms, 0 = none)
+    STATEMENT_TIMEOUT_MS: dict = {
+        "nearest_stops": 1000,
+        "routes_between_stops": 2000,
+        "route_details": 3000,
+        "plan_journey": 5000,
+        "routes_at_stop": 1000,
+        "route_types": 1000,
+        "speed_profiles": 2000,
+    }
+    STATEMENT_TIMEOUT_DEFAULT_MS: int = 5000
+
+    # Admission control for expensive routing queries (concurrent executions)
+    ADMISSION_LIMITS: dict = {"plan_journey": 8, "route_details": 16}
+    ADMISSION_DEFAULT_LIMIT: int = 16
+    ADMISSION_QUEUE_SIZE: int = 64
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 2.0
+    ADMISSION_RETRY_AFTER_SECONDS: int = 1
+
+    # Response compression
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_THREAD_MIN_SIZE: int = 64 * 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 5
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    COMPRESSION_CONTENT_TYPES: list = [
+        "application/json",
+        "application/geo+json",
+        "application/javascript",
+        "application/xml",
+        "image/svg+xml",
+    ]
+    # GET responses cached after compression (static route data)
+    COMPRESSION_CACHE_PATHS: list = ["/api/routing/route-details/", "/api/routing/route-types"]
+    COMPRESSION_CACHE_TTL_SECONDS: int = 300
+    COMPRESSION_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Memory-mapped network snapshot written by `python -m app.graph.export`
+    NETWORK_SNAPSHOT_PATH: Optional[str] = None
+    NETWORK_SNAPSHOT_CHECK_SECONDS: float = 5.0
+    # Offline bundles for the mobile client (default: <snapshot path>.bundles)
+    NETWORK_BUNDLE_DIR: Optional[str] = None
+    NETWORK_BUNDLE_KEEP: int = 10
+    NETWORK_BUNDLE_SIMPLIFY_METERS: float = 5.0
+    # One snapshot per region, from `python -m app.graph.export --regions-dir`
+    # (replaces NETWORK_SNAPSHOT_PATH when set)
+    NETWORK_REGIONS_DIR: Optional[str] = None
+    REGION_DEFAULT_ID: Optional[int] = None
+    REGION_MEMORY_BUDGET_MB: int = 1024
+
+    # Time-dependent speed profiles (speed_profile table)
+    SERVICE_TIMEZONE: str = "Asia/Kathmandu"
+    SPEED_PROFILE_BUCKET_MINUTES: int = 30
+    SPEED_PROFILE_DEFAULT_KMH: float = 20.0
+    SPEED_PROFILE_CHECK_SECONDS: float = 10.0
+
+    # Journey alternatives (plan-journey ?alternatives=k)
+    ALTERNATIVES_MAX: int = 5
+    ALTERNATIVE_STRETCH: float = 0.4
+    ALTERNATIVE_MAX_OVERLAP: float = 0.7
+    ALTERNATIVE_BOARDING_SECONDS: float = 300.0
+    WALKING_SPEED_KMH: float = 4.5
+    # Direct routes in plan-journey, ranked in memory by generalized cost:
+    # WALK_RELUCTANCE x walking seconds + ride seconds + boarding seconds
+    DIRECT_ROUTES_MAX: int = 10
+    WALK_RELUCTANCE: float = 2.0
+
+    # Stops closer than this are merged into one station (app/importers/stations.py)
+    STATION_CLUSTER_METERS: float = 30.0
+
+    # Stop-to-stop walking transfers written by `python -m app.graph.transfers`
+    TRANSFERS_PATH: Optional[str] = None
+    TRANSFER_RADIUS_METERS: float = 400.0
+    # Least time charged for a transfer, also between platforms on one node
+    TRANSFER_MIN_SECONDS: float = 60.0
+    # Transfer patterns between hub stations written by `python -m app.graph.patterns`
+    TRANSFER_PATTERNS_PATH: Optional[str] = None
+    PATTERN_HUB_COUNT: int = 300
+    PATTERN_MAX_RIDES: int = 3
+
+    # Snapping GPS points onto the way network (in-memory STRtree)
+    SNAP_MAX_DISTANCE_METERS: float = 500.0
+    SNAP_CACHE_SIZE: int = 10000
+    SNAP_MAX_BATCH: int = 1000
     
     class Config:
         env_file = ".env"
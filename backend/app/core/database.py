@@ -1,14 +1,41 @@
-from sqlalchemy import create_engine
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 from app.core.config import settings
 
+POOL_SIZE = 10
+MAX_OVERFLOW = 20
+
 engine = create_engine(
     settings.DATABASE_URL,
-    echo=True,  
-    pool_pre_ping=True, 
-    pool_size=10,
-    max_overflow=20
+    echo=settings.SQL_ECHO,
+    pool_pre_ping=True,
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW
+)
+
+# Read-only traffic (routing, POIs) goes to the replicas, or to the primary
+# when none are configured
+read_engines = [
+    create_engine(
+        url,
+        echo=settings.SQL_ECHO,
+        pool_pre_ping=True,
+        pool_size=settings.READ_POOL_SIZE,
+        max_overflow=settings.READ_MAX_OVERFLOW
+    )
+    for url in settings.READ_REPLICA_URLS
+] or [engine]
+
+# Connections each read engine can hand out (pool_size + max_overflow)
+_read_capacity = (
+    settings.READ_POOL_SIZE + settings.READ_MAX_OVERFLOW
+    if settings.READ_REPLICA_URLS else POOL_SIZE + MAX_OVERFLOW
 )
 
 SessionLocal = sessionmaker(
@@ -17,13 +44,130 @@ SessionLocal = sessionmaker(
     autoflush=False
 )
 
+ReadSessionLocals = [
+    sessionmaker(bind=read_engine, autocommit=False, autoflush=False)
+    for read_engine in read_engines
+]
+_read_cycle = itertools.cycle(ReadSessionLocals)
+_read_cycle_lock = threading.Lock()
+
 Base = declarative_base()
 
+
+def _next_read_factory():
+    with _read_cycle_lock:
+        return next(_read_cycle)
+
+
+def read_pool_saturated() -> bool:
+    """True when every read engine has all of its connections checked out"""
+    return all(e.pool.checkedout() >= _read_capacity for e in read_engines)
+
+
+class QueryCanceller:
+    """
+    Cancels the backend query of a session from another thread, e.g. when
+    the client that asked for it has disconnected. Safe to call before the
+    session exists: the session then refuses to start.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connection = None
+        self.cancelled = False
+
+    def attach(self, dbapi_connection) -> None:
+        with self._lock:
+            if self.cancelled:
+                raise QueryCancelled()
+            self._connection = dbapi_connection
+
+    def detach(self) -> None:
+        """
+        Forget the connection; a later cancel() no longer reaches it. Waits
+        for a cancel() in progress, so the connection is not returned to the
+        pool (and handed to another request) while it is being cancelled.
+        """
+        with self._lock:
+            self._connection = None
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            connection = self._connection
+            # psycopg2 sends a cancel request on a separate socket
+            if connection is not None and hasattr(connection, "cancel"):
+                connection.cancel()
+
+
+class QueryCancelled(Exception):
+    pass
+
+
+def statement_timeout_ms(endpoint: Optional[str]) -> int:
+    return settings.STATEMENT_TIMEOUT_MS.get(endpoint, settings.STATEMENT_TIMEOUT_DEFAULT_MS)
+
+
+def _prepare_read_transaction(session, transaction, connection) -> None:
+    """
+    Read sessions are plain lazy Sessions: the setup runs when a transaction
+    first checks out a connection. A request answered without the database
+    never touches a pool.
+    """
+    canceller = session.info.get("canceller")
+    if canceller is not None:
+        canceller.attach(connection.connection.dbapi_connection)
+    timeout_ms = session.info.get("statement_timeout_ms")
+    if timeout_ms:
+        # Transaction scoped, the pooled connection keeps its defaults
+        connection.execute(
+            text("SELECT set_config('statement_timeout', :ms, true)"),
+            {"ms": str(int(timeout_ms))}
+        )
+
+
+for _factory in ReadSessionLocals:
+    event.listen(_factory, "after_begin", _prepare_read_transaction)
+
+
+@contextmanager
+def read_session(endpoint: Optional[str] = None, canceller: Optional[QueryCanceller] = None):
+    """
+    Read-only session for work that outlives a single request's dependencies,
+    with the endpoint's statement_timeout budget
+    """
+    db = _next_read_factory()(info={
+        "statement_timeout_ms": statement_timeout_ms(endpoint),
+        "canceller": canceller,
+    })
+    try:
+        yield db
+    finally:
+        # Before the connection goes back to the pool and on to another request
+        if canceller is not None:
+            canceller.detach()
+        db.close()
+
+
 # Helper function to get database session
 def get_db():
-    """Dependency for getting database session"""
+    """Dependency for getting a primary database session (reads and writes)"""
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db():
+    """Dependency for getting a read-only session on a replica"""
+    with read_session() as db:
+        yield db
+
+
+def read_db(endpoint: str):
+    """Like get_read_db, with the statement_timeout budget of `endpoint`"""
+    def dependency():
+        with read_session(endpoint) as db:
+            yield db
+    return dependency
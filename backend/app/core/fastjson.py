@@ -0,0 +1,76 @@
+import json
+import re
+from decimal import Decimal
+from typing import Any, Union
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback, same output just slower
+    orjson = None
+
+# orjson.Fragment (3.10+) is what lets raw geometry skip re-encoding
+_USE_ORJSON = orjson is not None and hasattr(orjson, "Fragment")
+
+
+class RawJSON:
+    """
+    Already-serialized JSON (e.g. ST_AsGeoJSON output) that is spliced into
+    the response as is, without a json.loads / re-encode round trip.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Union[str, bytes]):
+        self.value = value if isinstance(value, bytes) else value.encode("utf-8")
+
+
+def raw_json(value: Union[str, bytes]):
+    if _USE_ORJSON:
+        return orjson.Fragment(value)
+    return RawJSON(value)
+
+
+def _default(obj: Any):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+_PLACEHOLDER = re.compile(r'"\\u0000rawjson:(\d+)\\u0000"')
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    fragments = []
+
+    def default(o):
+        if isinstance(o, RawJSON):
+            fragments.append(o.value.decode("utf-8"))
+            return f"\0rawjson:{len(fragments) - 1}\0"
+        if isinstance(o, Decimal):
+            return float(o)
+        raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+    text = json.dumps(obj, default=default, separators=(",", ":"), ensure_ascii=False)
+    if fragments:
+        text = _PLACEHOLDER.sub(lambda m: fragments[int(m.group(1))], text)
+    return text.encode("utf-8")
+
+
+def dumps(obj: Any) -> bytes:
+    if _USE_ORJSON:
+        return orjson.dumps(obj, default=_default)
+    return _stdlib_dumps(obj)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response for trusted data: no response-model validation, orjson
+    when installed, and RawJSON fragments passed through untouched.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):  # already rendered, e.g. a shared result
+            return content
+        return dumps(content)
@@ -0,0 +1,141 @@
+"""
+Versioned SQL migrations.
+
+    python -m app.core.migrations [--status]
+
+Files in backend/migrations named NNNN_description.sql are applied in
+version order, each in its own transaction, and recorded in
+schema_migration with a checksum. A file that has been applied must not
+change afterwards: schema and function changes go in a new file.
+"""
+import argparse
+import hashlib
+import os
+import re
+from typing import Dict, List, NamedTuple
+
+MIGRATIONS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "migrations"
+)
+FILENAME = re.compile(r"^(\d{4})_(\w+)\.sql$")
+# pg_advisory_lock key, so two deploys never migrate at the same time
+LOCK_KEY = 7_402_211
+
+SCHEMA_MIGRATION_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migration (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        checksum TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+"""
+
+
+class MigrationError(Exception):
+    pass
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    sql: str
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+
+
+def discover(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = FILENAME.match(filename)
+        if match is None:
+            continue
+        with open(os.path.join(directory, filename), encoding="utf-8") as f:
+            migrations.append(Migration(int(match.group(1)), match.group(2), f.read()))
+    versions = [m.version for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise MigrationError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def _applied(cursor) -> Dict[int, str]:
+    cursor.execute("SELECT version, checksum FROM schema_migration")
+    return dict(cursor.fetchall())
+
+
+def migrate(raw, directory: str = MIGRATIONS_DIR, verbose: bool = True) -> List[Migration]:
+    """Apply pending migrations on a DBAPI connection; returns the ones applied"""
+    cursor = raw.cursor()
+    cursor.execute(SCHEMA_MIGRATION_SQL)
+    raw.commit()
+
+    cursor.execute("SELECT pg_advisory_lock(%s)", (LOCK_KEY,))
+    try:
+        done = _applied(cursor)
+        applied = []
+        for migration in discover(directory):
+            if migration.version in done:
+                if done[migration.version] != migration.checksum:
+                    raise MigrationError(
+                        f"Migration {migration.version:04d}_{migration.name} changed after it was applied"
+                    )
+                continue
+            try:
+                cursor.execute(migration.sql)
+                cursor.execute(
+                    "INSERT INTO schema_migration (version, name, checksum) VALUES (%s, %s, %s)",
+                    (migration.version, migration.name, migration.checksum),
+                )
+                raw.commit()
+            except Exception:
+                raw.rollback()
+                raise
+            applied.append(migration)
+            if verbose:
+                print(f"Applied {migration.version:04d}_{migration.name}")
+        return applied
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (LOCK_KEY,))
+        raw.commit()
+
+
+def status(raw, directory: str = MIGRATIONS_DIR) -> List[tuple]:
+    """(version, name, state) for every migration file"""
+    cursor = raw.cursor()
+    cursor.execute(SCHEMA_MIGRATION_SQL)
+    raw.commit()
+    done = _applied(cursor)
+    rows = []
+    for migration in discover(directory):
+        if migration.version not in done:
+            state = "pending"
+        elif done[migration.version] != migration.checksum:
+            state = "changed"
+        else:
+            state = "applied"
+        rows.append((migration.version, migration.name, state))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the SQL migrations in backend/migrations")
+    parser.add_argument("--status", action="store_true", help="List migrations without applying them")
+    args = parser.parse_args()
+
+    # Imported here so bench scripts can use migrate() without app settings
+    from app.core.database import engine
+
+    raw = engine.raw_connection()
+    try:
+        if args.status:
+            for version, name, state in status(raw):
+                print(f"{version:04d}_{name}: {state}")
+        elif not migrate(raw):
+            print("Schema is up to date")
+    finally:
+        raw.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+import asyncio
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Optional
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool as _run_in_threadpool
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar(
+    "current_profile", default=None
+)
+
+# Finished profiles, kept in memory under their request id
+_profiles: "OrderedDict[str, dict]" = OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+class RequestProfile:
+    """
+    Collects SQL statements, timed sections and Python stack samples
+    for a single request.
+
+    Stack samples are taken from every thread that did work for the
+    request (the event loop thread and any threadpool workers), so
+    samples of other requests sharing those threads can show up too.
+    """
+
+    def __init__(self, method: str, path: str):
+        self.request_id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.endpoint_started: Optional[float] = None
+        self.endpoint_finished: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.sql: list = []
+        self.sections: dict = {}
+        self.samples: Counter = Counter()
+        self.threads: set = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def watch_current_thread(self) -> None:
+        self.threads.add(threading.get_ident())
+
+    def add_section(self, name: str, seconds: float) -> None:
+        with self._lock:
+            section = self.sections.setdefault(name, {"count": 0, "total_ms": 0.0})
+            section["count"] += 1
+            section["total_ms"] += seconds * 1000
+
+    def add_sql(self, statement: str, parameters, seconds: float, rowcount: int) -> None:
+        with self._lock:
+            self.sql.append({
+                "statement": statement.strip(),
+                "parameters": repr(parameters),
+                "duration_ms": round(seconds * 1000, 3),
+                "rowcount": rowcount,
+            })
+
+    def start(self) -> None:
+        self.watch_current_thread()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self.finished = time.perf_counter()
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+        # Before the endpoint runs FastAPI parses and validates the request and
+        # resolves its dependencies (DB sessions included); after it returns
+        # the response model is validated and serialized
+        if self.endpoint_started is not None:
+            self.add_section("fastapi.dependencies_and_validation", self.endpoint_started - self.started)
+        if self.endpoint_finished is not None:
+            self.add_section("fastapi.response_serialization", self.finished - self.endpoint_finished)
+
+    def _sample(self) -> None:
+        interval = settings.PROFILE_SAMPLE_INTERVAL_MS / 1000
+        while not self._stop.wait(interval):
+            frames = sys._current_frames()
+            for ident in list(self.threads):
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_filename}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                if stack:
+                    self.samples[";".join(reversed(stack))] += 1
+
+    def to_dict(self) -> dict:
+        sql_ms = sum(stmt["duration_ms"] for stmt in self.sql)
+        return {
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "total_ms": round((self.finished - self.started) * 1000, 3),
+            "sql_total_ms": round(sql_ms, 3),
+            "sql": self.sql,
+            "sections": {
+                name: {"count": s["count"], "total_ms": round(s["total_ms"], 3)}
+                for name, s in self.sections.items()
+            },
+            "sample_interval_ms": settings.PROFILE_SAMPLE_INTERVAL_MS,
+            "samples": [
+                {"stack": stack, "count": count}
+                for stack, count in self.samples.most_common()
+            ],
+        }
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current_profile.get()
+
+
+@contextmanager
+def profile_section(name: str):
+    """Time a block under `name` when the current request is being profiled"""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_section(name, time.perf_counter() - start)
+
+
+def get_profile(request_id: str) -> Optional[dict]:
+    with _profiles_lock:
+        return _profiles.get(request_id)
+
+
+def _store_profile(profile: RequestProfile) -> None:
+    with _profiles_lock:
+        _profiles[profile.request_id] = profile.to_dict()
+        while len(_profiles) > settings.PROFILE_STORE_SIZE:
+            _profiles.popitem(last=False)
+
+
+# SQL timings for every engine, recorded only while a profile is active
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    if profile is None:
+        return
+    starts = conn.info.get("profile_query_start")
+    if not starts:
+        return
+    profile.watch_current_thread()
+    profile.add_sql(statement, parameters, time.perf_counter() - starts.pop(), cursor.rowcount)
+
+
+def _watched(profile: RequestProfile, func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        profile.watch_current_thread()
+        return func(*args, **kwargs)
+    return wrapper
+
+
+async def run_in_threadpool(func, *args, **kwargs):
+    """
+    fastapi.concurrency.run_in_threadpool that registers the worker thread
+    with the current profile, so CPU work without SQL is sampled too
+    """
+    profile = _current_profile.get()
+    if profile is not None:
+        func = _watched(profile, func)
+    return await _run_in_threadpool(func, *args, **kwargs)
+
+
+def _check_admin(token: str) -> None:
+    from app.core.security import get_current_admin, get_current_user
+
+    db = SessionLocal()
+    try:
+        get_current_admin(get_current_user(token=token, db=db))
+    finally:
+        db.close()
+
+
+async def _authorize_profiling(request: Request) -> None:
+    """
+    Profiling is admin only, reuse the normal auth dependencies by hand.
+    The user lookup is a blocking query, so it runs off the event loop.
+    """
+    from app.core.security import oauth2_scheme
+
+    token = await oauth2_scheme(request)
+    await _run_in_threadpool(_check_admin, token)
+
+
+def _profiled_endpoint(endpoint):
+    """Mark when the endpoint body starts and returns"""
+    if asyncio.iscoroutinefunction(endpoint):
+        @wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            profile = _current_profile.get()
+            if profile is None:
+                return await endpoint(*args, **kwargs)
+            profile.endpoint_started = time.perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profile.endpoint_finished = time.perf_counter()
+    else:
+        @wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            profile = _current_profile.get()
+            if profile is None:
+                return endpoint(*args, **kwargs)
+            profile.watch_current_thread()
+            profile.endpoint_started = time.perf_counter()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                profile.endpoint_finished = time.perf_counter()
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """
+    Route class that profiles a request when `?profile=1` is passed by an
+    admin. The profile is stored under a request id which is returned in
+    the `X-Profile-Id` header and can be read from /api/profiling/{id}.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _profiled_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def profiled_handler(request: Request):
+            if request.query_params.get("profile") != "1":
+                return await handler(request)
+
+            await _authorize_profiling(request)
+            profile = RequestProfile(request.method, request.url.path)
+            token = _current_profile.set(profile)
+            profile.start()
+            try:
+                response = await handler(request)
+            finally:
+                profile.stop()
+                _current_profile.reset(token)
+                _store_profile(profile)
+
+            response.headers["X-Profile-Id"] = profile.request_id
+            return response
+
+        return profiled_handler
@@ -0,0 +1,150 @@
+import atexit
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode
+
+from app.core.config import settings
+
+# Coordinates are rounded to ~100 m so a log never pins down a home address
+COORD_DECIMALS = 3
+MAX_BODY_BYTES = 65536
+# Logged in place of a body over MAX_BODY_BYTES; bench.replay skips those requests
+TRUNCATED_BODY = "<truncated>"
+FLUSH_INTERVAL_SECONDS = 1.0
+CLOSE_TIMEOUT_SECONDS = 5.0
+
+
+def _is_coordinate(key: str) -> bool:
+    key = key.lower()
+    return "lat" in key or "lng" in key or "lon" in key
+
+
+def _anonymize_value(key: str, value):
+    if isinstance(value, dict):
+        return {k: _anonymize_value(k, v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_anonymize_value(key, v) for v in value]
+    if isinstance(value, float) and _is_coordinate(key):
+        return round(value, COORD_DECIMALS)
+    return value
+
+
+def anonymize_query(query_string: str) -> str:
+    params = []
+    for key, value in parse_qsl(query_string, keep_blank_values=True):
+        if key == "profile":
+            continue
+        if _is_coordinate(key):
+            try:
+                value = str(round(float(value), COORD_DECIMALS))
+            except ValueError:
+                pass
+        params.append((key, value))
+    return urlencode(params)
+
+
+def anonymize_body(body: bytes):
+    if not body:
+        return None
+    if len(body) > MAX_BODY_BYTES:
+        return TRUNCATED_BODY
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    return _anonymize_value("", data)
+
+
+class _LogWriter:
+    """Appends log lines from a background thread so requests never wait on disk"""
+
+    def __init__(self, path: str):
+        # One file per worker process, bench.replay merges them by timestamp
+        self.path = f"{path}.{os.getpid()}"
+        self.queue: "queue.SimpleQueue[str]" = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        # The thread is a daemon, so lines still buffered at exit are written here
+        atexit.register(self.close)
+
+    def write(self, line: str) -> None:
+        self.queue.put(line)
+
+    def close(self) -> None:
+        """Write out everything queued so far and stop the thread"""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(CLOSE_TIMEOUT_SECONDS)
+
+    def _run(self) -> None:
+        with open(self.path, "a", buffering=1 << 16) as f:
+            while True:
+                try:
+                    line = self.queue.get(timeout=FLUSH_INTERVAL_SECONDS)
+                except queue.Empty:
+                    f.flush()
+                    continue
+                if line is None:
+                    f.flush()
+                    return
+                f.write(line)
+
+
+class RequestLogMiddleware:
+    """
+    Records anonymized requests as compact JSON lines:
+
+        [unix_ts, method, path, query, body]
+
+    Only paths under REQUEST_LOG_PREFIXES are logged and auth headers are never
+    kept. Replay the log with `python -m bench.replay`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.writer: Optional[_LogWriter] = None
+        self.lock = threading.Lock()
+
+    def _should_log(self, scope) -> bool:
+        if scope["type"] != "http" or not settings.REQUEST_LOG_PATH:
+            return False
+        if not any(scope["path"].startswith(p) for p in settings.REQUEST_LOG_PREFIXES):
+            return False
+        return random.random() < settings.REQUEST_LOG_SAMPLE_RATE
+
+    def _write(self, record: list) -> None:
+        if self.writer is None:
+            with self.lock:
+                if self.writer is None:
+                    self.writer = _LogWriter(settings.REQUEST_LOG_PATH)
+        self.writer.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    async def __call__(self, scope, receive, send):
+        if not self._should_log(scope):
+            await self.app(scope, receive, send)
+            return
+
+        timestamp = round(time.time(), 3)
+        chunks = []
+
+        async def recording_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                chunks.append(message.get("body", b""))
+            return message
+
+        try:
+            await self.app(scope, recording_receive, send)
+        finally:
+            self._write([
+                timestamp,
+                scope["method"],
+                scope["path"],
+                anonymize_query(scope.get("query_string", b"").decode("latin-1")),
+                anonymize_body(b"".join(chunks)),
+            ])
@@ -0,0 +1,45 @@
+from sqlalchemy.orm import Session
+from fastapi import HTTPException, status
+from app.model import SpeedProfile as SpeedProfileModel
+from app.schemas.speed_profile import SpeedProfileUpdate
+from app.graph.speeds import bucket_count, reload_speed_profiles
+
+def get_profiles(db: Session):
+    return db.query(SpeedProfileModel).order_by(SpeedProfileModel.profile_id).all()
+
+def upsert_profile(db: Session, profile_in: SpeedProfileUpdate) -> SpeedProfileModel:
+    buckets = bucket_count()
+    if len(profile_in.speeds_kmh) != buckets:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Expected {buckets} speeds, one per time-of-day bucket",
+        )
+
+    query = db.query(SpeedProfileModel)
+    if profile_in.highway_type is not None:
+        profile = query.filter(SpeedProfileModel.highway_type == profile_in.highway_type).first()
+    else:
+        profile = query.filter(SpeedProfileModel.route_id == profile_in.route_id).first()
+
+    if profile is None:
+        profile = SpeedProfileModel(highway_type=profile_in.highway_type, route_id=profile_in.route_id)
+        db.add(profile)
+    profile.speeds_kmh = profile_in.speeds_kmh
+    db.commit()
+    db.refresh(profile)
+
+    # This worker swaps now, the others on their next check
+    reload_speed_profiles()
+    return profile
+
+def delete_profile(db: Session, profile_id: int):
+    profile = db.get(SpeedProfileModel, profile_id)
+    if not profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Speed profile not found",
+        )
+    db.delete(profile)
+    db.commit()
+    reload_speed_profiles()
+    return {"detail": "Speed profile deleted"}
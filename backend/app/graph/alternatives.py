@@ -0,0 +1,285 @@
+"""
+k diverse journey alternatives over the network snapshot.
+
+The origin and destination are snapped onto their nearest ways, then one
+bounded walking search is grown from each. Everything is read off those two trees:
+
+- walk-only alternatives with the via-node method: every node v reached by
+  both trees gives the path origin -> v -> destination, kept when it is at
+  most ALTERNATIVE_STRETCH longer than the shortest walk;
+- transit alternatives: stops reached from the origin are boarding
+  candidates, stops reached from the destination are alighting candidates,
+  and every route serving both (in the right order) is one option.
+
+Options are ranked by total time and an option sharing more than
+ALTERNATIVE_MAX_OVERLAP of its time with a better one is dropped.
+"""
+import heapq
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.graph.snapping import Snap, get_snapper
+from app.graph.snapshot import NetworkSnapshot, build_csr
+
+EARTH_RADIUS_METERS = 6_371_000.0
+
+
+def meters_between(lng1, lat1, lng2, lat2):
+    """Equirectangular distance, plenty at walking scale (works on arrays)"""
+    x = np.radians(lng2 - lng1) * np.cos(np.radians((lat1 + lat2) / 2))
+    y = np.radians(lat2 - lat1)
+    return EARTH_RADIUS_METERS * np.sqrt(x * x + y * y)
+
+
+def stops_by_node(network: NetworkSnapshot):
+    stops = np.flatnonzero(network.stop_node >= 0).astype(np.int32)
+    return build_csr(network.node_count, network.stop_node[stops], stops)
+
+
+def route_stop_meters(network: NetworkSnapshot) -> np.ndarray:
+    """Cumulative straight-line meters along each route's stop sequence"""
+    stops = network.route_stop_stop
+    lng, lat = network.stop_lng[stops], network.stop_lat[stops]
+    hops = np.zeros(len(stops), dtype=np.float64)
+    if len(stops) > 1:
+        hops[1:] = meters_between(lng[:-1], lat[:-1], lng[1:], lat[1:])
+    # No hop into the first stop of a route
+    starts = network.route_stop_offsets[:-1]
+    hops[starts[starts < len(stops)]] = 0.0
+    cumulative = np.cumsum(hops)
+    route_of_entry = np.repeat(np.arange(len(network.route_id)), np.diff(network.route_stop_offsets))
+    return cumulative - cumulative[network.route_stop_offsets[route_of_entry]]
+
+
+def walking_tree(network: NetworkSnapshot, sources: Dict[int, float], limit: float):
+    """
+    Bounded Dijkstra over the walking graph, in meters, from `sources`
+    (node -> starting distance). Pedestrians ignore one-way restrictions,
+    so both adjacency directions are followed.
+    """
+    dist: Dict[int, float] = dict(sources)
+    pred: Dict[int, Tuple[int, int]] = {}
+    heap = [(d, node) for node, d in sources.items()]
+    heapq.heapify(heap)
+    adjacency = (
+        (network.out_offsets, network.out_target, network.out_edge),
+        (network.in_offsets, network.in_source, network.in_edge),
+    )
+    lengths = network.way_length
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        for offsets, neighbours, edges in adjacency:
+            start, end = offsets[u], offsets[u + 1]
+            if start == end:
+                continue
+            edge_ids = edges[start:end]
+            for v, e, length in zip(neighbours[start:end].tolist(), edge_ids.tolist(),
+                                    lengths[edge_ids].tolist()):
+                nd = d + length
+                if nd <= limit and nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    pred[v] = (u, e)
+                    heapq.heappush(heap, (nd, v))
+    return dist, pred
+
+
+def tree_path(pred: Dict[int, Tuple[int, int]], node: int) -> Tuple[List[int], List[int]]:
+    """(nodes, edges) from the tree root to `node`"""
+    nodes, edges = [node], []
+    while node in pred:
+        node, edge = pred[node]
+        nodes.append(node)
+        edges.append(edge)
+    nodes.reverse()
+    edges.reverse()
+    return nodes, edges
+
+
+class Option:
+    __slots__ = ("total_seconds", "walking_meters", "transfers", "legs", "costs")
+
+    def __init__(self, legs: list):
+        self.legs = legs
+        self.total_seconds = sum(leg["duration_seconds"] for leg in legs)
+        self.walking_meters = sum(leg["distance_meters"] for leg in legs if leg["mode"] == "walk")
+        self.transfers = max(sum(1 for leg in legs if leg["mode"] == "bus") - 1, 0)
+        # Time spent on each shared resource (a way walked, a route ridden)
+        self.costs: Dict[tuple, float] = {}
+        for leg in legs:
+            if leg["mode"] == "bus":
+                self.costs[("route", leg["route"])] = leg["duration_seconds"]
+            else:
+                seconds_per_meter = leg["duration_seconds"] / leg["distance_meters"] if leg["distance_meters"] else 0.0
+                for way, meters in zip(leg["ways"], leg["way_meters"]):
+                    self.costs[("way", way)] = self.costs.get(("way", way), 0.0) + meters * seconds_per_meter
+
+    def overlap(self, other: "Option") -> float:
+        """Share of this option's time spent on edges `other` also uses"""
+        if self.total_seconds <= 0:
+            return 1.0
+        shared = sum(cost for key, cost in self.costs.items() if key in other.costs)
+        return shared / self.total_seconds
+
+
+def walk_leg(network: NetworkSnapshot, edges: List[int], meters: float) -> dict:
+    """Walk over whole `edges`; `meters` also covers the partial ways at either end"""
+    way_meters = network.way_length[edges].tolist() if edges else []
+    return {
+        "mode": "walk",
+        "distance_meters": meters,
+        "duration_seconds": meters * 3.6 / settings.WALKING_SPEED_KMH,
+        "ways": edges,
+        "way_meters": way_meters,
+    }
+
+
+def ride_seconds(network: NetworkSnapshot, route: int, meters: float,
+                 departure_seconds: Optional[int] = None, profiles=None) -> float:
+    """Boarding wait plus the ride, from the speed profiles when there is a departure time"""
+    seconds = None
+    if profiles is not None and departure_seconds is not None:
+        seconds = profiles.route_eta(int(network.route_id[route]), meters, departure_seconds)
+    if seconds is None:
+        seconds = meters * 3.6 / settings.SPEED_PROFILE_DEFAULT_KMH
+    return settings.ALTERNATIVE_BOARDING_SECONDS + seconds
+
+
+def bus_leg(network: NetworkSnapshot, route: int, from_stop: int, to_stop: int, meters: float,
+            departure_seconds: Optional[int] = None, profiles=None) -> dict:
+    return {
+        "mode": "bus",
+        "route": route,
+        "from_stop": from_stop,
+        "to_stop": to_stop,
+        "distance_meters": meters,
+        "duration_seconds": ride_seconds(network, route, meters, departure_seconds, profiles),
+    }
+
+
+def _walk_options(network, forward, backward, offsets, k) -> List[Option]:
+    """
+    Via-node walking alternatives read off the two trees. Most vias give
+    small variations of a path already found, so each candidate is checked
+    against the ones kept (as pick_diverse does) before counting towards k.
+    """
+    (df, pf), (db, pb) = forward, backward
+    meeting = df.keys() & db.keys()
+    if not meeting:
+        return []
+    best = min(df[v] + db[v] for v in meeting)
+    bound = best * (1 + settings.ALTERNATIVE_STRETCH)
+    vias = sorted((df[v] + db[v], v) for v in meeting if df[v] + db[v] <= bound)
+
+    options, on_options = [], set()
+    for meters, via in vias:
+        # A via on a kept path shares the start or end of that path
+        if via in on_options:
+            continue
+        head_nodes, head_edges = tree_path(pf, via)
+        tail_nodes, tail_edges = tree_path(pb, via)
+        # Via paths that double back on themselves are not alternatives
+        if len(set(head_nodes) | set(tail_nodes)) != len(head_nodes) + len(tail_nodes) - 1:
+            continue
+        option = Option([walk_leg(network, head_edges + tail_edges[::-1], meters + offsets)])
+        if any(option.overlap(other) > settings.ALTERNATIVE_MAX_OVERLAP for other in options):
+            continue
+        options.append(option)
+        on_options.update(head_nodes)
+        on_options.update(tail_nodes)
+        if len(options) >= k:
+            break
+    return options
+
+
+def _transit_options(network, forward, backward, departure_seconds, profiles, origin_extra, target_extra):
+    (df, pf), (db, pb) = forward, backward
+    stop_offsets, stop_index = network.cached("stops_by_node", stops_by_node)
+    cumulative = network.cached("route_stop_meters", route_stop_meters)
+
+    def reached_stops(dist):
+        for node, meters in dist.items():
+            for stop in stop_index[stop_offsets[node]:stop_offsets[node + 1]].tolist():
+                yield stop, node, meters
+
+    boardings: Dict[int, list] = {}
+    for stop, node, meters in reached_stops(df):
+        routes, positions = network.stop_routes(stop)
+        for route, position in zip(routes.tolist(), positions.tolist()):
+            boardings.setdefault(route, []).append((position, stop, node, meters))
+
+    # Only the best boarding/alighting pair of each route becomes an option
+    walk_pace = 3.6 / settings.WALKING_SPEED_KMH
+    best: Dict[int, tuple] = {}
+    for stop, node, meters in reached_stops(db):
+        routes, positions = network.stop_routes(stop)
+        for route, position in zip(routes.tolist(), positions.tolist()):
+            base = network.route_stop_offsets[route]
+            for board_position, board_stop, board_node, board_meters in boardings.get(route, ()):
+                if board_position >= position:
+                    continue
+                ride_meters = float(cumulative[base + position] - cumulative[base + board_position])
+                seconds = (board_meters + meters) * walk_pace + ride_seconds(
+                    network, route, ride_meters, departure_seconds, profiles
+                )
+                if route not in best or seconds < best[route][0]:
+                    best[route] = (seconds, board_stop, board_node, stop, node, ride_meters)
+
+    options = []
+    for route, (_, board_stop, board_node, stop, node, ride_meters) in best.items():
+        options.append(Option([
+            walk_leg(network, tree_path(pf, board_node)[1], df[board_node] + origin_extra),
+            bus_leg(network, route, board_stop, stop, ride_meters, departure_seconds, profiles),
+            walk_leg(network, tree_path(pb, node)[1][::-1], db[node] + target_extra),
+        ]))
+    return options
+
+
+def _seeds(network: NetworkSnapshot, snap: Snap) -> Dict[int, float]:
+    """Search start: both ends of the snapped way, at their distance along it"""
+    source, target = int(network.way_source[snap.way]), int(network.way_target[snap.way])
+    seeds = {source: snap.source_cost}
+    seeds[target] = min(snap.target_cost, seeds.get(target, math.inf))
+    return seeds
+
+
+def journey_alternatives(
+    network: NetworkSnapshot,
+    start: Tuple[float, float],
+    end: Tuple[float, float],
+    max_walk_meters: float,
+    k: int,
+    departure_seconds: Optional[int] = None,
+    profiles=None,
+) -> List[Option]:
+    """Up to `k` diverse options from `start` to `end` ((lng, lat) pairs), fastest first"""
+    origin, target = get_snapper(network).snap_many([start, end])
+    if origin is None or target is None:
+        return []
+
+    limit = max_walk_meters * (1 + settings.ALTERNATIVE_STRETCH)
+    forward = walking_tree(network, _seeds(network, origin), limit)
+    backward = walking_tree(network, _seeds(network, target), limit)
+    origin_extra, target_extra = origin.distance_meters, target.distance_meters
+
+    candidates = _walk_options(network, forward, backward, origin_extra + target_extra, k)
+    candidates += _transit_options(
+        network, forward, backward, departure_seconds, profiles, origin_extra, target_extra
+    )
+    return pick_diverse(candidates, k)
+
+
+def pick_diverse(candidates: List[Option], k: int) -> List[Option]:
+    """The `k` fastest options that do not overlap too much with a faster one"""
+    candidates = sorted(candidates, key=lambda option: option.total_seconds)
+    chosen: List[Option] = []
+    for option in candidates:
+        if all(option.overlap(other) <= settings.ALTERNATIVE_MAX_OVERLAP for other in chosen):
+            chosen.append(option)
+            if len(chosen) == k:
+                break
+    return chosen
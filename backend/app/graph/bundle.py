@@ -0,0 +1,211 @@
+"""
+Offline network bundle for the mobile client.
+
+A gzipped, columnar JSON view of the current network snapshot: every stop,
+every route with its stop sequence and a simplified geometry (Google
+encoded polyline, the format map SDKs decode natively).
+
+    {"version": 1718000000, "full": true,
+     "stops": {"id": [...], "name": [...], "lat": [...], "lng": [...]},
+     "routes": {"id": [...], "name": [...], "type": [...], "stops": [[...]], "polyline": [...]}}
+
+Each published bundle is kept (in <snapshot>.bundles, or under
+NETWORK_BUNDLE_DIR) so a client holding an
+older version can be sent a delta: changed or added rows in the same
+columnar shape plus "removed_stops" / "removed_routes" ids. When the
+client's version is no longer kept it simply gets the full bundle.
+"""
+import gzip
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+import shapely
+
+from app.core.config import settings
+from app.core.fastjson import dumps
+from app.graph.snapshot import NetworkSnapshot
+
+EARTH_RADIUS_METERS = 6_371_000.0
+COORD_DECIMALS = 6
+
+STOP_COLUMNS = ("id", "name", "lat", "lng")
+ROUTE_COLUMNS = ("id", "name", "type", "stops", "polyline")
+
+
+def encode_polyline(lngs, lats) -> str:
+    """Google encoded polyline, precision 5"""
+    values = np.column_stack([
+        np.round(np.asarray(lats) * 1e5), np.round(np.asarray(lngs) * 1e5)
+    ]).astype(np.int64)
+    deltas = np.diff(values, axis=0, prepend=[[0, 0]]).ravel()
+    chars = []
+    for value in deltas.tolist():
+        value = ~(value << 1) if value < 0 else value << 1
+        while value >= 0x20:
+            chars.append(chr((0x20 | (value & 0x1F)) + 63))
+            value >>= 5
+        chars.append(chr(value + 63))
+    return "".join(chars)
+
+
+def _route_polylines(network: NetworkSnapshot) -> list:
+    """Each route's ways chained end to end, simplified in local meters"""
+    lat0 = float(np.mean(network.node_lat)) if network.node_count else 0.0
+    scale_y = np.radians(1.0) * EARTH_RADIUS_METERS
+    scale_x = scale_y * np.cos(np.radians(lat0))
+
+    lines = []
+    for route in range(len(network.route_id)):
+        points = []
+        for way in network.route_ways(route).tolist():
+            lng, lat = network.way_coords(way)
+            coords = np.column_stack([lng * scale_x, lat * scale_y])
+            if len(coords) == 0:
+                continue
+            if points:
+                last = points[-1][-1]
+                # Ways are stored source to target, follow the direction driven
+                if np.hypot(*(coords[-1] - last)) < np.hypot(*(coords[0] - last)):
+                    coords = coords[::-1]
+                if np.allclose(coords[0], last):
+                    coords = coords[1:]
+            points.append(coords)
+        coords = np.concatenate(points) if points else np.empty((0, 2))
+        lines.append(shapely.linestrings(coords) if len(coords) >= 2 else None)
+
+    simplified = shapely.simplify(np.array(lines, dtype=object), settings.NETWORK_BUNDLE_SIMPLIFY_METERS)
+    polylines = []
+    for line in simplified:
+        if line is None:
+            polylines.append("")
+            continue
+        coords = shapely.get_coordinates(line)
+        polylines.append(encode_polyline(coords[:, 0] / scale_x, coords[:, 1] / scale_y))
+    return polylines
+
+
+def build_bundle(network: NetworkSnapshot) -> dict:
+    stop_ids = network.stop_id.tolist()
+    return {
+        "version": network.version,
+        "full": True,
+        "stops": {
+            "id": stop_ids,
+            "name": [network.string(i) for i in network.stop_name.tolist()],
+            "lat": np.round(network.stop_lat, COORD_DECIMALS).tolist(),
+            "lng": np.round(network.stop_lng, COORD_DECIMALS).tolist(),
+        },
+        "routes": {
+            "id": network.route_id.tolist(),
+            "name": [network.string(i) for i in network.route_name.tolist()],
+            "type": [network.string(i) for i in network.route_type.tolist()],
+            "stops": [
+                [stop_ids[s] for s in network.route_stops(route).tolist()]
+                for route in range(len(network.route_id))
+            ],
+            "polyline": _route_polylines(network),
+        },
+    }
+
+
+def _rows(table: dict, columns) -> Dict[int, tuple]:
+    return {
+        row[0]: row
+        for row in zip(*(table[c] for c in columns))
+    }
+
+
+def _columns(rows, columns) -> dict:
+    return {c: [row[i] for row in rows] for i, c in enumerate(columns)}
+
+
+def _delta_table(new: dict, old: dict, columns):
+    new_rows, old_rows = _rows(new, columns), _rows(old, columns)
+    changed = [row for key, row in new_rows.items() if old_rows.get(key) != row]
+    removed = [key for key in old_rows if key not in new_rows]
+    return _columns(changed, columns), removed
+
+
+def build_delta(new: dict, old: dict) -> dict:
+    stops, removed_stops = _delta_table(new["stops"], old["stops"], STOP_COLUMNS)
+    routes, removed_routes = _delta_table(new["routes"], old["routes"], ROUTE_COLUMNS)
+    return {
+        "version": new["version"],
+        "since": old["version"],
+        "full": False,
+        "stops": stops,
+        "removed_stops": removed_stops,
+        "routes": routes,
+        "removed_routes": removed_routes,
+    }
+
+
+def _bundle_dir(network: NetworkSnapshot) -> str:
+    if settings.NETWORK_BUNDLE_DIR:
+        return os.path.join(settings.NETWORK_BUNDLE_DIR, os.path.basename(network.path))
+    return f"{network.path}.bundles"
+
+
+def _publish(directory: str, version: int, body: bytes) -> None:
+    """Keep the bundle for future deltas, pruning the oldest ones"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{version}.json.gz")
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+    versions = sorted(
+        int(name.split(".", 1)[0]) for name in os.listdir(directory) if name.endswith(".json.gz")
+    )
+    for old in versions[:-settings.NETWORK_BUNDLE_KEEP]:
+        try:
+            os.remove(os.path.join(directory, f"{old}.json.gz"))
+        except FileNotFoundError:
+            pass
+
+
+def _load_published(directory: str, version: int) -> Optional[dict]:
+    try:
+        with gzip.open(os.path.join(directory, f"{version}.json.gz"), "rb") as f:
+            return json.loads(f.read())
+    except FileNotFoundError:
+        return None
+
+
+class BundleCache:
+    """Compressed bundle and deltas for one snapshot, built on first request"""
+
+    def __init__(self, network: NetworkSnapshot):
+        self.version = network.version
+        self.directory = _bundle_dir(network)
+        self.bundle = build_bundle(network)
+        self.body = gzip.compress(dumps(self.bundle), compresslevel=9, mtime=0)
+        self._deltas: Dict[int, bytes] = {}
+        self._lock = threading.Lock()
+        _publish(self.directory, self.version, self.body)
+
+    @property
+    def nbytes(self) -> int:
+        # The decoded bundle is several times the compressed body
+        return len(self.body) * 8 + sum(len(body) for body in self._deltas.values())
+
+    def delta(self, since: int) -> Optional[bytes]:
+        """Gzipped delta from `since`, or None when that version is not kept"""
+        body = self._deltas.get(since)
+        if body is None:
+            old = _load_published(self.directory, since)
+            if old is None:
+                return None
+            body = gzip.compress(dumps(build_delta(self.bundle, old)), compresslevel=9, mtime=0)
+            with self._lock:
+                self._deltas[since] = body
+        return body
+
+
+def get_bundle(network: NetworkSnapshot) -> BundleCache:
+    return network.cached("bundle", BundleCache)
@@ -0,0 +1,264 @@
+"""
+Export osm_way, bus_stop, route, route_way and route_stop into a binary
+network snapshot.
+
+    python -m app.graph.export --output /var/lib/road_paari/network.snap
+    python -m app.graph.export --region 1 --output kathmandu.snap
+    python -m app.graph.export --regions-dir /var/lib/road_paari/regions
+
+The last form writes one snapshot per row of the region table plus the
+regions.json manifest the API dispatches requests with.
+
+Running it again while the API is up is safe: the new file is renamed over
+the old one and workers pick it up on their next check.
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import shapely
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.graph.snapshot import StringTable, build_csr, write_snapshot
+
+# Everything is filtered to one region when :region is set
+IN_REGION = "(CAST(:region AS SMALLINT) IS NULL OR region_id = :region)"
+
+WAYS_SQL = text(f"""
+    SELECT osm_id, name, highway_type, source, target, cost, reverse_cost, length_meters,
+           ST_X(ST_StartPoint(geom)), ST_Y(ST_StartPoint(geom)),
+           ST_X(ST_EndPoint(geom)), ST_Y(ST_EndPoint(geom)),
+           ST_AsBinary(geom)
+    FROM osm_way
+    WHERE source IS NOT NULL AND target IS NOT NULL AND {IN_REGION}
+    ORDER BY osm_id
+""")
+
+# Each stop is attached to the closer end of its nearest way
+STOPS_SQL = text(f"""
+    SELECT s.stop_id, s.name, ST_X(s.geom), ST_Y(s.geom),
+           CASE WHEN w.frac < 0.5 THEN w.source ELSE w.target END,
+           COALESCE(s.station_id, s.stop_id)
+    FROM bus_stop s
+    LEFT JOIN LATERAL (
+        SELECT source, target, ST_LineLocatePoint(geom, s.geom) AS frac
+        FROM osm_way
+        WHERE source IS NOT NULL AND {IN_REGION}
+        ORDER BY geom <-> s.geom
+        LIMIT 1
+    ) w ON TRUE
+    WHERE (CAST(:region AS SMALLINT) IS NULL OR s.region_id = :region)
+    ORDER BY s.stop_id
+""")
+
+ROUTES_SQL = text(f"SELECT route_id, route_name, route_type FROM route WHERE {IN_REGION} ORDER BY route_id")
+ROUTE_STOPS_SQL = text(f"""
+    SELECT route_id, stop_id, sequence FROM route_stop
+    WHERE route_id IN (SELECT route_id FROM route WHERE {IN_REGION})
+    ORDER BY route_id, sequence
+""")
+ROUTE_WAYS_SQL = text(f"""
+    SELECT route_id, way_id FROM route_way
+    WHERE route_id IN (SELECT route_id FROM route WHERE {IN_REGION})
+    ORDER BY route_id, sequence
+""")
+REGIONS_SQL = text("""
+    SELECT region_id, slug, name, min_lng, min_lat, max_lng, max_lat FROM region ORDER BY region_id
+""")
+
+
+def _members(rows, owner_ids: np.ndarray, lookup_ids: np.ndarray, extra: int = 0):
+    """
+    Turn ordered (owner_id, member_id, ...) rows into CSR offsets over owners
+    and member indexes, dropping rows whose owner or member is unknown. The
+    next `extra` columns come along as int32 arrays.
+    """
+    owners = np.array([r[0] for r in rows], dtype=np.int64)
+    members = np.array([r[1] for r in rows], dtype=np.int64)
+    owner_idx = np.searchsorted(owner_ids, owners)
+    member_idx = np.searchsorted(lookup_ids, members)
+    valid = (
+        (owner_idx < len(owner_ids)) & (member_idx < len(lookup_ids))
+    )
+    valid[valid] &= (owner_ids[owner_idx[valid]] == owners[valid])
+    valid[valid] &= (lookup_ids[member_idx[valid]] == members[valid])
+    columns = [np.array([r[2 + i] for r in rows], dtype=np.int32)[valid] for i in range(extra)]
+    # build_csr is a stable sort, so the SQL sequence order is kept
+    return build_csr(len(owner_ids), owner_idx[valid], member_idx[valid].astype(np.int32), *columns)
+
+
+def build_arrays(db, region: int = None) -> dict:
+    strings = StringTable()
+    params = {"region": region}
+
+    ways = db.execute(WAYS_SQL, params).fetchall()
+    way_id = np.array([w[0] for w in ways], dtype=np.int64)
+
+    # Graph nodes are the pgRouting vertices, located at the way endpoints
+    coords = {}
+    for w in ways:
+        coords.setdefault(w[3], (w[8], w[9]))
+        coords.setdefault(w[4], (w[10], w[11]))
+    node_id = np.array(sorted(coords), dtype=np.int64)
+    node_lng = np.array([coords[n][0] for n in node_id], dtype=np.float64)
+    node_lat = np.array([coords[n][1] for n in node_id], dtype=np.float64)
+
+    way_source = np.searchsorted(node_id, [w[3] for w in ways]).astype(np.int32)
+    way_target = np.searchsorted(node_id, [w[4] for w in ways]).astype(np.int32)
+    way_length = np.array([w[7] or 0.0 for w in ways], dtype=np.float32)
+    way_highway = np.array([strings.add(w[2]) for w in ways], dtype=np.int32)
+    way_name = np.array([strings.add(w[1]) for w in ways], dtype=np.int32)
+
+    shapes = shapely.from_wkb([bytes(w[12]) for w in ways])
+    coords, owner = shapely.get_coordinates(shapes, return_index=True)
+    way_coord_offsets = np.zeros(len(ways) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(owner, minlength=len(ways)), out=way_coord_offsets[1:])
+
+    # pgRouting convention: a negative cost means that direction is closed
+    cost = np.array([w[5] if w[5] is not None else w[7] or 0.0 for w in ways], dtype=np.float32)
+    reverse = np.array([w[6] if w[6] is not None else w[7] or 0.0 for w in ways], dtype=np.float32)
+    edge_index = np.arange(len(ways), dtype=np.int32)
+    forward, backward = cost >= 0, reverse >= 0
+    src = np.concatenate([way_source[forward], way_target[backward]])
+    dst = np.concatenate([way_target[forward], way_source[backward]])
+    edge = np.concatenate([edge_index[forward], edge_index[backward]])
+    edge_cost = np.concatenate([cost[forward], reverse[backward]])
+
+    out_offsets, out_target, out_edge, out_cost = build_csr(len(node_id), src, dst, edge, edge_cost)
+    in_offsets, in_source, in_edge, in_cost = build_csr(len(node_id), dst, src, edge, edge_cost)
+
+    stops = db.execute(STOPS_SQL, params).fetchall()
+    stop_id = np.array([s[0] for s in stops], dtype=np.int64)
+    stop_node = np.array(
+        [np.searchsorted(node_id, s[4]) if s[4] is not None else -1 for s in stops],
+        dtype=np.int32,
+    )
+    # Stops not clustered yet are stations of their own
+    station_id, stop_station = np.unique(
+        np.array([s[5] for s in stops], dtype=np.int64), return_inverse=True
+    )
+    stop_station = stop_station.astype(np.int32)
+    station_stop_offsets, station_stop_stop = build_csr(
+        len(station_id), stop_station, np.arange(len(stop_id), dtype=np.int32)
+    )
+
+    routes = db.execute(ROUTES_SQL, params).fetchall()
+    route_id = np.array([r[0] for r in routes], dtype=np.int64)
+    route_stop_offsets, route_stop_stop, route_stop_sequence = _members(
+        db.execute(ROUTE_STOPS_SQL, params).fetchall(), route_id, stop_id, extra=1
+    )
+    route_way_offsets, route_way_way = _members(
+        db.execute(ROUTE_WAYS_SQL, params).fetchall(), route_id, way_id
+    )
+
+    # Invert route -> stops into stop -> (route, position within route)
+    route_of_entry = np.repeat(np.arange(len(route_id), dtype=np.int32), np.diff(route_stop_offsets))
+    position = np.arange(len(route_stop_stop), dtype=np.int64) - route_stop_offsets[route_of_entry]
+    stop_route_offsets, stop_route_route, stop_route_position = build_csr(
+        len(stop_id), route_stop_stop, route_of_entry, position.astype(np.int32)
+    )
+
+    arrays = {
+        "node_id": node_id,
+        "node_lng": node_lng,
+        "node_lat": node_lat,
+        "out_offsets": out_offsets,
+        "out_target": out_target,
+        "out_edge": out_edge,
+        "out_cost": out_cost,
+        "in_offsets": in_offsets,
+        "in_source": in_source,
+        "in_edge": in_edge,
+        "in_cost": in_cost,
+        "way_id": way_id,
+        "way_source": way_source,
+        "way_target": way_target,
+        "way_length": way_length,
+        "way_highway": way_highway,
+        "way_name": way_name,
+        "way_coord_offsets": way_coord_offsets,
+        "way_coord_lng": coords[:, 0],
+        "way_coord_lat": coords[:, 1],
+        "stop_id": stop_id,
+        "stop_lng": np.array([s[2] for s in stops], dtype=np.float64),
+        "stop_lat": np.array([s[3] for s in stops], dtype=np.float64),
+        "stop_node": stop_node,
+        "stop_name": np.array([strings.add(s[1]) for s in stops], dtype=np.int32),
+        "station_id": station_id,
+        "stop_station": stop_station,
+        "station_stop_offsets": station_stop_offsets,
+        "station_stop_stop": station_stop_stop,
+        "route_id": route_id,
+        "route_name": np.array([strings.add(r[1]) for r in routes], dtype=np.int32),
+        "route_type": np.array([strings.add(r[2]) for r in routes], dtype=np.int32),
+        "route_stop_offsets": route_stop_offsets,
+        "route_stop_stop": route_stop_stop,
+        "route_stop_sequence": route_stop_sequence,
+        "route_way_offsets": route_way_offsets,
+        "route_way_way": route_way_way,
+        "stop_route_offsets": stop_route_offsets,
+        "stop_route_route": stop_route_route,
+        "stop_route_position": stop_route_position,
+    }
+    arrays.update(strings.arrays())
+    return arrays
+
+
+def export(db, output: str, region: int = None) -> None:
+    arrays = build_arrays(db, region)
+    version = int(time.time())
+    write_snapshot(output, version, arrays)
+    print(
+        f"Wrote snapshot {version} to {output}: {len(arrays['node_id'])} nodes, "
+        f"{len(arrays['out_target'])} edges, {len(arrays['stop_id'])} stops "
+        f"in {len(arrays['station_id'])} stations, "
+        f"{len(arrays['route_id'])} routes"
+    )
+
+
+def export_regions(db, directory: str) -> None:
+    """One snapshot per region plus the manifest, written last"""
+    os.makedirs(directory, exist_ok=True)
+    regions = []
+    for region_id, slug, name, min_lng, min_lat, max_lng, max_lat in db.execute(REGIONS_SQL):
+        filename = f"{slug}.snap"
+        export(db, os.path.join(directory, filename), region_id)
+        regions.append({
+            "region_id": region_id,
+            "slug": slug,
+            "name": name,
+            "bbox": [min_lng, min_lat, max_lng, max_lat],
+            "file": filename,
+        })
+
+    manifest = os.path.join(directory, "regions.json")
+    with open(f"{manifest}.tmp", "w") as f:
+        json.dump({"regions": regions}, f, indent=2)
+    os.replace(f"{manifest}.tmp", manifest)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the routing network snapshot")
+    parser.add_argument("--output", default=settings.NETWORK_SNAPSHOT_PATH)
+    parser.add_argument("--region", type=int, help="Only export this region_id")
+    parser.add_argument("--regions-dir", help="Export every region into this directory")
+    args = parser.parse_args()
+    if not args.output and not args.regions_dir:
+        parser.error("--output is required when NETWORK_SNAPSHOT_PATH is not set")
+
+    db = SessionLocal()
+    try:
+        if args.regions_dir:
+            export_regions(db, args.regions_dir)
+        else:
+            export(db, args.output, args.region)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+"""
+Transfer patterns between hub stations.
+
+    python -m app.graph.patterns [--hubs 300] [--max-rides 3]
+
+Most journeys start and end near one of a few hundred hub stations (the
+stations served by the most routes). For every ordered pair of hubs this
+job stores the optimal transfer patterns: the sequence of stations where a
+rider boards and alights,
+
+    [board_1, alight_1, board_2, alight_2, ...]
+
+one pattern per number of rides that beats every pattern with fewer rides
+(a walk between alight_i and board_i+1 is a transfer). Patterns come from
+a round-based search over routes, one round per ride, using walking
+transfers from app/graph/transfers.py when they are available.
+
+At query time a journey whose nearest station at both ends is a hub only
+evaluates its handful of stored patterns (best route per leg, walks from
+the transfer file) next to the ranked direct routes, so the full search
+is left to the long tail. The file sits next to the
+snapshot it was built from and is ignored once the snapshot changes.
+"""
+import argparse
+import math
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.graph.alternatives import Option, bus_leg, pick_diverse, ride_seconds, route_stop_meters, walk_leg
+from app.graph.ranking import haversine_meters, stops_within
+from app.graph.snapshot import (
+    MappedArrays, NetworkSnapshot, SnapshotError, SnapshotFile, get_network, write_snapshot,
+)
+from app.graph.transfers import Transfers, get_transfers
+
+MAGIC = b"RPPATSNP"
+FORMAT_VERSION = 1
+
+SECTIONS = {
+    # Hub station indexes, sorted
+    "hub_station": "<i4",
+    # Patterns of each (origin hub, destination hub) pair, origin-major
+    "pair_offsets": "<i8",
+    # Stations of each pattern, board/alight pairs in order
+    "pattern_offsets": "<i8",
+    "pattern_station": "<i4",
+}
+
+
+class TransferPatterns(MappedArrays):
+    SECTIONS = SECTIONS
+    MAGIC = MAGIC
+    FORMAT_VERSION = FORMAT_VERSION
+
+    def hub_index(self, station: int) -> Optional[int]:
+        i = int(np.searchsorted(self.hub_station, station))
+        if i < len(self.hub_station) and self.hub_station[i] == station:
+            return i
+        return None
+
+    def patterns(self, origin: int, destination: int) -> List[np.ndarray]:
+        """Stored patterns between two hub stations (station indexes)"""
+        o, d = self.hub_index(origin), self.hub_index(destination)
+        if o is None or d is None:
+            return []
+        pair = o * len(self.hub_station) + d
+        start, end = self.pair_offsets[pair], self.pair_offsets[pair + 1]
+        return [
+            self.pattern_station[self.pattern_offsets[p]:self.pattern_offsets[p + 1]]
+            for p in range(start, end)
+        ]
+
+
+def pick_hubs(network: NetworkSnapshot, count: int) -> np.ndarray:
+    """The `count` stations served by the most routes"""
+    routes = np.diff(network.stop_route_offsets)
+    per_station = np.bincount(network.stop_station, weights=routes, minlength=len(network.station_id))
+    served = np.flatnonzero(per_station > 0)
+    ranked = served[np.argsort(-per_station[served], kind="stable")]
+    return np.sort(ranked[:count]).astype(np.int32)
+
+
+def _station_walks(network: NetworkSnapshot, transfers: Optional[Transfers], station: int):
+    """Stations reachable on foot from any platform of `station`: {station: seconds}"""
+    walks: Dict[int, float] = {}
+    if transfers is None:
+        return walks
+    for stop in network.station_stops(station).tolist():
+        targets, seconds = transfers.transfers_from(stop)
+        for target, walk in zip(network.stop_station[targets].tolist(), seconds.tolist()):
+            if target != station and walk < walks.get(target, math.inf):
+                walks[target] = walk
+    return walks
+
+
+def _search(network: NetworkSnapshot, transfers: Optional[Transfers], origin: int, max_rides: int):
+    """
+    Round-based search from one station, minimising seconds. Round k holds
+    the stations reached with k rides for less than with any fewer, each
+    with its parent: ("ride", board_station) or ("walk", from_station).
+    """
+    cumulative = network.cached("route_stop_meters", route_stop_meters)
+    pace = 3.6 / settings.SPEED_PROFILE_DEFAULT_KMH
+    boarding = settings.ALTERNATIVE_BOARDING_SECONDS
+    best = np.full(len(network.station_id), math.inf)
+    best[origin] = 0.0
+    previous: Dict[int, Tuple[float, tuple]] = {origin: (0.0, None)}
+    rounds = [previous]
+
+    for _ in range(max_rides):
+        # Scan each route from the first position a marked station boards it at
+        first: Dict[int, int] = {}
+        for station in previous:
+            for stop in network.station_stops(station).tolist():
+                routes, positions = network.stop_routes(stop)
+                for route, position in zip(routes.tolist(), positions.tolist()):
+                    if position < first.get(route, math.inf):
+                        first[route] = position
+
+        labels: Dict[int, Tuple[float, tuple]] = {}
+        for route, start in first.items():
+            base = int(network.route_stop_offsets[route])
+            end = int(network.route_stop_offsets[route + 1])
+            stations = network.stop_station[network.route_stop_stop[base + start:end]].tolist()
+            meters = cumulative[base + start:end].tolist()
+            # Seconds on board, as if boarded at the route's first stop
+            on_board, board_station = math.inf, None
+            for station, along in zip(stations, meters):
+                if board_station is not None and board_station != station:
+                    arrival = on_board + boarding + along * pace
+                    if arrival < best[station] and arrival < labels.get(station, (math.inf,))[0]:
+                        labels[station] = (arrival, ("ride", board_station))
+                label = previous.get(station)
+                if label is not None and label[0] - along * pace < on_board:
+                    on_board, board_station = label[0] - along * pace, station
+        for station, (arrival, _) in labels.items():
+            best[station] = min(best[station], arrival)
+
+        walked: Dict[int, Tuple[float, tuple]] = {}
+        for station, (arrival, _) in labels.items():
+            for target, walk in _station_walks(network, transfers, station).items():
+                # A ride label is kept: walks are only ever one step from a ride
+                if target in labels:
+                    continue
+                total = arrival + walk
+                if total < best[target] and total < walked.get(target, (math.inf,))[0]:
+                    walked[target] = (total, ("walk", station))
+        for station, (total, _) in walked.items():
+            best[station] = min(best[station], total)
+            labels[station] = walked[station]
+
+        if not labels:
+            break
+        rounds.append(labels)
+        previous = labels
+    return rounds
+
+
+def _pattern(rounds: list, k: int, destination: int) -> List[int]:
+    stations: List[int] = []
+    station = destination
+    while k > 0:
+        _, (kind, parent) = rounds[k][station]
+        if kind == "walk":
+            station = parent
+            _, (kind, parent) = rounds[k][station]
+        stations[:0] = [parent, station]
+        station = parent
+        k -= 1
+    return stations
+
+
+def build_patterns(network: NetworkSnapshot, transfers: Optional[Transfers],
+                   hub_count: int, max_rides: int) -> dict:
+    hubs = pick_hubs(network, hub_count)
+    counts = np.zeros(len(hubs) * len(hubs), dtype=np.int64)
+    lengths, stations = [], []
+    for o, origin in enumerate(hubs.tolist()):
+        rounds = _search(network, transfers, origin, max_rides)
+        for d, destination in enumerate(hubs.tolist()):
+            if destination == origin:
+                continue
+            for k in range(1, len(rounds)):
+                if destination in rounds[k]:
+                    pattern = _pattern(rounds, k, destination)
+                    counts[o * len(hubs) + d] += 1
+                    lengths.append(len(pattern))
+                    stations.extend(pattern)
+        if o % 50 == 49:
+            print(f"{o + 1}/{len(hubs)} hubs searched")
+
+    pair_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=pair_offsets[1:])
+    pattern_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=pattern_offsets[1:])
+    return {
+        "hub_station": hubs,
+        "pair_offsets": pair_offsets,
+        "pattern_offsets": pattern_offsets,
+        "pattern_station": np.array(stations, dtype=np.int32),
+    }
+
+
+def _best_ride(network: NetworkSnapshot, board: int, alight: int, departure_seconds, profiles):
+    """Fastest direct route from one station to another: (seconds, route, from_stop, to_stop, meters)"""
+    cumulative = network.cached("route_stop_meters", route_stop_meters)
+    boardings: Dict[int, list] = {}
+    for stop in network.station_stops(board).tolist():
+        routes, positions = network.stop_routes(stop)
+        for route, position in zip(routes.tolist(), positions.tolist()):
+            boardings.setdefault(route, []).append((position, stop))
+
+    best = None
+    for stop in network.station_stops(alight).tolist():
+        routes, positions = network.stop_routes(stop)
+        for route, position in zip(routes.tolist(), positions.tolist()):
+            base = network.route_stop_offsets[route]
+            for board_position, board_stop in boardings.get(route, ()):
+                if board_position >= position:
+                    continue
+                meters = float(cumulative[base + position] - cumulative[base + board_position])
+                seconds = ride_seconds(network, route, meters, departure_seconds, profiles)
+                if best is None or seconds < best[0]:
+                    best = (seconds, route, board_stop, stop, meters)
+    return best
+
+
+def _transfer_walk(network: NetworkSnapshot, transfers: Optional[Transfers], alight_stop: int, board: int):
+    """Shortest stored walk from a stop to any platform of a station, as a walk leg"""
+    if network.stop_station[alight_stop] == board:
+        return walk_leg(network, [], 0.0)
+    if transfers is None:
+        return None
+    best = None
+    for stop in network.station_stops(board).tolist():
+        i = transfers.find(alight_stop, stop)
+        if i is not None and (best is None or transfers.transfer_meters[i] < transfers.transfer_meters[best]):
+            best = i
+    if best is None:
+        return None
+    return walk_leg(network, transfers.walk_path(best).tolist(), float(transfers.transfer_meters[best]))
+
+
+def _evaluate(network, transfers, pattern: np.ndarray, access: float, egress: float,
+              destination: int, departure_seconds, profiles) -> Optional[Option]:
+    legs = [walk_leg(network, [], access)]
+    stations = pattern.tolist()
+    for i in range(0, len(stations), 2):
+        ride = _best_ride(network, stations[i], stations[i + 1], departure_seconds, profiles)
+        if ride is None:
+            return None
+        _, route, board_stop, alight_stop, meters = ride
+        if i > 0:
+            walk = _transfer_walk(network, transfers, legs[-1]["to_stop"], stations[i])
+            if walk is None:
+                return None
+            if walk["distance_meters"] > 0:
+                legs.append(walk)
+        legs.append(bus_leg(network, route, board_stop, alight_stop, meters, departure_seconds, profiles))
+    if stations[-1] != destination:
+        walk = _transfer_walk(network, transfers, legs[-1]["to_stop"], destination)
+        if walk is None:
+            return None
+        legs.append(walk)
+    legs.append(walk_leg(network, [], egress))
+    return Option(legs)
+
+
+def _near_hubs(network: NetworkSnapshot, patterns: TransferPatterns, point: Tuple[float, float],
+               max_walk_meters: float, nearest: int) -> List[Tuple[int, float]]:
+    """
+    (hub station, meters to its nearest platform) for up to `nearest` hubs
+    within walking distance, or nothing when the station closest to the
+    point is not a hub: the rider would not walk past it to reach one
+    """
+    stops, meters = stops_within(network, point[0], point[1], max_walk_meters)
+    if len(stops) == 0:
+        return []
+    order = np.argsort(meters, kind="stable")
+    stations = network.stop_station[stops[order]].tolist()
+    if patterns.hub_index(stations[0]) is None:
+        return []
+    hubs: Dict[int, float] = {}
+    for station, along in zip(stations, meters[order].tolist()):
+        if station not in hubs and patterns.hub_index(station) is not None:
+            hubs[station] = along
+            if len(hubs) == nearest:
+                break
+    return list(hubs.items())
+
+
+def _direct_option(network: NetworkSnapshot, route: dict, start: Tuple[float, float],
+                   end: Tuple[float, float], departure_seconds, profiles) -> Option:
+    """A route ranked by app.graph.ranking as an option"""
+    board, alight = network.stop_index(route["from_stop_id"]), network.stop_index(route["to_stop_id"])
+    access = float(haversine_meters(start[0], start[1], network.stop_lng[board], network.stop_lat[board]))
+    egress = float(haversine_meters(end[0], end[1], network.stop_lng[alight], network.stop_lat[alight]))
+    return Option([
+        walk_leg(network, [], access),
+        bus_leg(network, network.route_index(route["route_id"]), board, alight, route["distance_meters"],
+                departure_seconds, profiles),
+        walk_leg(network, [], egress),
+    ])
+
+
+def hub_journeys(
+    network: NetworkSnapshot,
+    patterns: TransferPatterns,
+    start: Tuple[float, float],
+    end: Tuple[float, float],
+    max_walk_meters: float,
+    k: int,
+    departure_seconds: Optional[int] = None,
+    profiles=None,
+    direct_routes: Sequence[dict] = (),
+    nearest: int = 3,
+) -> Optional[List[Option]]:
+    """
+    Up to `k` options between the hubs within walking distance of `start`
+    and `end` ((lng, lat) pairs), or None when the station closest to
+    either end is not a hub and the full search has to run. The
+    `direct_routes` ranked for the same trip compete with the patterns, so
+    a direct ride from a stop next to the hub is never lost.
+    """
+    if len(patterns.hub_station) == 0:
+        return None
+    origins = _near_hubs(network, patterns, start, max_walk_meters, nearest)
+    destinations = _near_hubs(network, patterns, end, max_walk_meters, nearest)
+    if not origins or not destinations:
+        return None
+
+    transfers = get_transfers(network)
+    candidates = []
+    for origin, access in origins:
+        for destination, egress in destinations:
+            if origin == destination:
+                continue
+            for pattern in patterns.patterns(origin, destination):
+                option = _evaluate(
+                    network, transfers, pattern, access, egress, destination, departure_seconds, profiles
+                )
+                if option is not None:
+                    candidates.append(option)
+    if not candidates:
+        return None
+    candidates += [
+        _direct_option(network, route, start, end, departure_seconds, profiles) for route in direct_routes
+    ]
+    return pick_diverse(candidates, k)
+
+
+def patterns_path(network: NetworkSnapshot) -> Optional[str]:
+    """TRANSFER_PATTERNS_PATH, or <region snapshot>.patterns when running regions"""
+    if settings.NETWORK_REGIONS_DIR:
+        return f"{network.path}.patterns"
+    return settings.TRANSFER_PATTERNS_PATH
+
+
+def get_transfer_patterns(network: Optional[NetworkSnapshot] = None) -> Optional[TransferPatterns]:
+    """
+    Patterns for a snapshot (the current one by default), or None when not
+    configured or computed for another snapshot version
+    """
+    network = network or get_network()
+    if network is None:
+        return None
+    path = patterns_path(network)
+    if not path:
+        return None
+    try:
+        current = network.cached("transfer_patterns", lambda n: SnapshotFile(path, TransferPatterns)).get()
+    except SnapshotError:
+        return None
+    if current is None or current.version != network.version:
+        return None
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute transfer patterns between hub stations")
+    parser.add_argument("--snapshot", default=settings.NETWORK_SNAPSHOT_PATH)
+    parser.add_argument("--output", help="Defaults to TRANSFER_PATTERNS_PATH, or <snapshot>.patterns with regions")
+    parser.add_argument("--hubs", type=int, default=settings.PATTERN_HUB_COUNT)
+    parser.add_argument("--max-rides", type=int, default=settings.PATTERN_MAX_RIDES)
+    args = parser.parse_args()
+    if not args.snapshot:
+        parser.error("--snapshot is required when NETWORK_SNAPSHOT_PATH is not set")
+
+    network = NetworkSnapshot(args.snapshot)
+    args.output = args.output or patterns_path(network)
+    if not args.output:
+        parser.error("--output is required when TRANSFER_PATTERNS_PATH is not set")
+    transfers = get_transfers(network)
+    if transfers is None:
+        print("No transfers for this snapshot, patterns will only change routes within a station")
+
+    started = time.perf_counter()
+    arrays = build_patterns(network, transfers, args.hubs, args.max_rides)
+    write_snapshot(args.output, network.version, arrays, SECTIONS, MAGIC, FORMAT_VERSION)
+    print(
+        f"Wrote {len(arrays['pattern_offsets']) - 1} patterns between {len(arrays['hub_station'])} hubs "
+        f"to {args.output} in {time.perf_counter() - started:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Vectorized ranking of direct journeys.
+
+Every stop within walking distance of the origin is a boarding candidate
+and every stop within walking distance of the destination an alighting
+candidate. Both are expanded to the routes serving them and paired per
+route in stop order, and all pairs are costed in one pass over flat
+arrays:
+
+    cost = WALK_RELUCTANCE * walking seconds + ride seconds + ALTERNATIVE_BOARDING_SECONDS
+
+Walks are haversine distances, rides the cumulative meters between the
+two positions on the route (at the route's speed profile pace when there
+is a departure time). Only the best pair of each route is kept, and only
+the top k are turned into response dicts, so large candidate sets cost
+little more than small ones.
+"""
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.graph.alternatives import route_stop_meters
+from app.graph.snapshot import NetworkSnapshot
+
+EARTH_RADIUS_METERS = 6_371_000.0
+
+
+class DirectCandidates(NamedTuple):
+    """Parallel arrays, one entry per (route, boarding stop, alighting stop)"""
+    route: np.ndarray
+    board_stop: np.ndarray
+    alight_stop: np.ndarray
+    board_position: np.ndarray
+    alight_position: np.ndarray
+    walk_meters: np.ndarray
+
+
+def haversine_meters(lng1, lat1, lng2, lat2):
+    """Great-circle distance (works on arrays)"""
+    lng1, lat1, lng2, lat2 = (np.radians(v) for v in (lng1, lat1, lng2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def stops_within(network: NetworkSnapshot, lng: float, lat: float, meters: float):
+    """(stop indexes, meters) of the stops within `meters` of a point"""
+    # A bounding box first, so the haversine only runs on nearby stops
+    dlat = np.degrees(meters / EARTH_RADIUS_METERS)
+    dlng = dlat / max(np.cos(np.radians(lat)), 1e-6)
+    near = np.flatnonzero(
+        (np.abs(network.stop_lat - lat) <= dlat) & (np.abs(network.stop_lng - lng) <= dlng)
+    )
+    distance = haversine_meters(lng, lat, network.stop_lng[near], network.stop_lat[near])
+    keep = distance <= meters
+    return near[keep], distance[keep]
+
+
+def _ranges(starts: np.ndarray, counts: np.ndarray):
+    """Concatenated ranges [start, start + count), with the range each item came from"""
+    counts = counts.astype(np.int64)
+    owner = np.repeat(np.arange(len(counts)), counts)
+    first = np.cumsum(counts) - counts
+    items = np.repeat(starts.astype(np.int64), counts) + np.arange(int(counts.sum())) - np.repeat(first, counts)
+    return items, owner
+
+
+def direct_candidates(
+    network: NetworkSnapshot,
+    start: Tuple[float, float],
+    end: Tuple[float, float],
+    max_walk_meters: float,
+) -> DirectCandidates:
+    """Every route ridden from a stop near `start` to a later stop near `end` ((lng, lat) pairs)"""
+    board_stops, board_walk = stops_within(network, start[0], start[1], max_walk_meters)
+    alight_stops, alight_walk = stops_within(network, end[0], end[1], max_walk_meters)
+
+    offsets = network.stop_route_offsets
+    board, board_owner = _ranges(offsets[board_stops], offsets[board_stops + 1] - offsets[board_stops])
+    alight, alight_owner = _ranges(offsets[alight_stops], offsets[alight_stops + 1] - offsets[alight_stops])
+    board_route = network.stop_route_route[board]
+    alight_route = network.stop_route_route[alight]
+
+    # Alightings grouped by route, so each boarding pairs with one slice
+    order = np.argsort(alight_route, kind="stable")
+    alight, alight_owner, alight_route = alight[order], alight_owner[order], alight_route[order]
+    lo = np.searchsorted(alight_route, board_route, side="left")
+    hi = np.searchsorted(alight_route, board_route, side="right")
+    a, b = _ranges(lo, hi - lo)
+
+    board_position = network.stop_route_position[board[b]]
+    alight_position = network.stop_route_position[alight[a]]
+    forward = alight_position > board_position
+    a, b = a[forward], b[forward]
+    return DirectCandidates(
+        route=board_route[b],
+        board_stop=board_stops[board_owner[b]],
+        alight_stop=alight_stops[alight_owner[a]],
+        board_position=board_position[forward],
+        alight_position=alight_position[forward],
+        walk_meters=board_walk[board_owner[b]] + alight_walk[alight_owner[a]],
+    )
+
+
+def _route_pace(network: NetworkSnapshot, routes: np.ndarray,
+                departure_seconds: Optional[int], profiles) -> np.ndarray:
+    """Seconds per meter ridden on each route"""
+    pace = np.full(len(routes), 3.6 / settings.SPEED_PROFILE_DEFAULT_KMH)
+    if profiles is None or departure_seconds is None or len(routes) == 0:
+        return pace
+    # route_eta is linear in the distance: one call per distinct route
+    unique, inverse = np.unique(routes, return_inverse=True)
+    route_pace = pace[:len(unique)].copy()
+    for i, route in enumerate(unique.tolist()):
+        seconds = profiles.route_eta(int(network.route_id[route]), 1.0, departure_seconds)
+        if seconds is not None:
+            route_pace[i] = seconds
+    return route_pace[inverse]
+
+
+def rank_direct_routes(
+    network: NetworkSnapshot,
+    start: Tuple[float, float],
+    end: Tuple[float, float],
+    max_walk_meters: float,
+    k: int,
+    departure_seconds: Optional[int] = None,
+    profiles=None,
+) -> List[dict]:
+    """Up to `k` direct routes (BusRoute fields), lowest generalized cost first"""
+    candidates = direct_candidates(network, start, end, max_walk_meters)
+    if len(candidates.route) == 0 or k <= 0:
+        return []
+
+    cumulative = network.cached("route_stop_meters", route_stop_meters)
+    base = network.route_stop_offsets[candidates.route]
+    ride_meters = cumulative[base + candidates.alight_position] - cumulative[base + candidates.board_position]
+    ride = ride_meters * _route_pace(network, candidates.route, departure_seconds, profiles)
+    walk = candidates.walk_meters * (3.6 / settings.WALKING_SPEED_KMH)
+    cost = settings.WALK_RELUCTANCE * walk + ride + settings.ALTERNATIVE_BOARDING_SECONDS
+
+    # Cheapest pair of each route, then the k cheapest routes
+    order = np.lexsort((cost, candidates.route))
+    routes = candidates.route[order]
+    best = order[np.r_[True, routes[1:] != routes[:-1]]]
+    if len(best) > k:
+        best = best[np.argpartition(cost[best], k - 1)[:k]]
+    best = best[np.argsort(cost[best], kind="stable")]
+
+    timed = profiles is not None and departure_seconds is not None
+    sequence = network.route_stop_sequence
+    content = []
+    for i in best.tolist():
+        route = int(candidates.route[i])
+        base = int(network.route_stop_offsets[route])
+        content.append({
+            "route_id": int(network.route_id[route]),
+            "route_name": network.string(int(network.route_name[route])),
+            "route_type": network.string(int(network.route_type[route])),
+            "is_direct": True,
+            "start_sequence": int(sequence[base + candidates.board_position[i]]),
+            "end_sequence": int(sequence[base + candidates.alight_position[i]]),
+            "distance_meters": float(ride_meters[i]),
+            "estimated_time_seconds": float(ride[i]) if timed else None,
+            "from_stop_id": int(network.stop_id[candidates.board_stop[i]]),
+            "to_stop_id": int(network.stop_id[candidates.alight_stop[i]]),
+            "walking_meters": float(candidates.walk_meters[i]),
+            "generalized_cost_seconds": float(cost[i]),
+        })
+    return content
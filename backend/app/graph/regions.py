@@ -0,0 +1,176 @@
+"""
+One network snapshot per region (city).
+
+`python -m app.graph.export --regions-dir DIR` writes a snapshot per row of
+the region table and a regions.json manifest. With NETWORK_REGIONS_DIR
+pointing at DIR, requests are dispatched to a region by bounding box and
+each region's snapshot (and everything derived from it: snapping tree,
+speed arrays, bundles) is loaded on first use.
+
+Loaded regions are kept in LRU order. When their combined memory goes over
+REGION_MEMORY_BUDGET_MB the least recently used ones are dropped; requests
+still holding one keep it alive until they finish, and it is reloaded from
+the file the next time it is needed. A quiet city costs nothing.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.graph.snapshot import NetworkSnapshot, SnapshotFile, get_network
+
+MANIFEST = "regions.json"
+
+
+class Region:
+    __slots__ = ("region_id", "slug", "name", "bbox", "path")
+
+    def __init__(self, entry: dict, directory: str):
+        self.region_id = entry["region_id"]
+        self.slug = entry["slug"]
+        self.name = entry.get("name")
+        self.bbox = entry["bbox"]  # min_lng, min_lat, max_lng, max_lat
+        self.path = os.path.join(directory, entry["file"])
+
+    def contains(self, lng: float, lat: float) -> bool:
+        min_lng, min_lat, max_lng, max_lat = self.bbox
+        return min_lng <= lng <= max_lng and min_lat <= lat <= max_lat
+
+    @property
+    def area(self) -> float:
+        min_lng, min_lat, max_lng, max_lat = self.bbox
+        return (max_lng - min_lng) * (max_lat - min_lat)
+
+
+class RegionRegistry:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.regions: List[Region] = []
+        self.by_id: Dict[int, Region] = {}
+        self._manifest_mtime = None
+        self._last_check = 0.0
+        self._loaded: "OrderedDict[int, SnapshotFile]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._manifest_lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if self._manifest_mtime is not None and now - self._last_check < settings.NETWORK_SNAPSHOT_CHECK_SECONDS:
+            return
+
+        with self._manifest_lock:
+            if self._manifest_mtime is not None and now - self._last_check < settings.NETWORK_SNAPSHOT_CHECK_SECONDS:
+                return
+            self._last_check = now
+            path = os.path.join(self.directory, MANIFEST)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                return
+            if mtime == self._manifest_mtime:
+                return
+            with open(path) as f:
+                entries = json.load(f)["regions"]
+            regions = [Region(entry, self.directory) for entry in entries]
+            # Smallest first, so a city inside a wider region wins
+            regions.sort(key=lambda region: region.area)
+            self.regions = regions
+            self.by_id = {region.region_id: region for region in regions}
+            self._manifest_mtime = mtime
+
+    def region_at(self, lng: float, lat: float) -> Optional[Region]:
+        self._refresh()
+        for region in self.regions:
+            if region.contains(lng, lat):
+                return region
+        return None
+
+    def region(self, region_id: Optional[int]) -> Optional[Region]:
+        self._refresh()
+        if region_id is None:
+            region_id = settings.REGION_DEFAULT_ID
+        if region_id is None and self.by_id:
+            region_id = min(self.by_id)
+        return self.by_id.get(region_id)
+
+    def network(self, region: Region) -> Optional[NetworkSnapshot]:
+        with self._lock:
+            slot = self._loaded.get(region.region_id)
+            if slot is None or slot.path != region.path:
+                slot = self._loaded[region.region_id] = SnapshotFile(region.path)
+            self._loaded.move_to_end(region.region_id)
+
+        network = slot.get()
+        self._evict(keep=region.region_id)
+        return network
+
+    def _evict(self, keep: int) -> None:
+        budget = settings.REGION_MEMORY_BUDGET_MB * 1024 * 1024
+        with self._lock:
+            total = sum(slot.current.memory_bytes() for slot in self._loaded.values() if slot.current)
+            for region_id in list(self._loaded):
+                if total <= budget:
+                    break
+                if region_id == keep:
+                    continue
+                slot = self._loaded.pop(region_id)
+                if slot.current is not None:
+                    total -= slot.current.memory_bytes()
+
+    def loaded(self) -> list:
+        with self._lock:
+            return [
+                {
+                    "region_id": region_id,
+                    "version": slot.current.version,
+                    "memory_bytes": slot.current.memory_bytes(),
+                }
+                for region_id, slot in self._loaded.items() if slot.current is not None
+            ]
+
+
+_registry: Optional[RegionRegistry] = None
+
+
+def get_registry() -> Optional[RegionRegistry]:
+    global _registry
+    directory = settings.NETWORK_REGIONS_DIR
+    if not directory:
+        return None
+    if _registry is None or _registry.directory != directory:
+        _registry = RegionRegistry(directory)
+    return _registry
+
+
+def get_region_network(region_id: Optional[int] = None) -> Optional[NetworkSnapshot]:
+    """Snapshot of a region (the default one when None), loaded on demand"""
+    registry = get_registry()
+    region = registry.region(region_id) if registry else None
+    if region is None:
+        return None
+    return registry.network(region)
+
+
+def region_id_at(lng: float, lat: float) -> Optional[int]:
+    registry = get_registry()
+    if registry is None:
+        return None
+    region = registry.region_at(lng, lat)
+    return region.region_id if region else None
+
+
+def network_at(lng: float, lat: float) -> Optional[NetworkSnapshot]:
+    """
+    Snapshot serving a point: the region whose box contains it, or the one
+    global snapshot when regions are not configured
+    """
+    registry = get_registry()
+    if registry is None:
+        return get_network()
+    region = registry.region_at(lng, lat)
+    if region is None:
+        return None
+    return registry.network(region)
@@ -0,0 +1,139 @@
+"""
+Snapping GPS points onto the way network.
+
+The way shapes from the network snapshot are projected to local meters
+and indexed once per snapshot in a shapely STRtree. A snap returns the
+nearest way, the fractional position along it (0 at the source node) and
+the virtual costs from the snapped point to either end, which is what a
+search needs to start or finish part way along an edge.
+
+Batches are snapped with one vectorized tree query, and recent points
+are answered from an LRU so a user re-planning from the same spot does
+not search again.
+"""
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+from shapely import STRtree
+
+from app.core.config import settings
+from app.graph.snapshot import NetworkSnapshot, get_network
+
+EARTH_RADIUS_METERS = 6_371_000.0
+# ~1 m, closer than phone GPS can tell apart anyway
+CACHE_DECIMALS = 5
+
+
+class Snap(NamedTuple):
+    way: int             # way index in the snapshot
+    fraction: float      # 0 at the way's source node, 1 at its target
+    distance_meters: float
+    source_cost: float   # meters from the snapped point back to the source node
+    target_cost: float   # meters on to the target node
+    lng: float           # the snapped point
+    lat: float
+
+
+class Snapper:
+    def __init__(self, network: NetworkSnapshot):
+        self.network = network
+        # Equirectangular projection around the network centre
+        lat0 = float(np.mean(network.node_lat)) if network.node_count else 0.0
+        self._scale_y = np.radians(1.0) * EARTH_RADIUS_METERS
+        self._scale_x = self._scale_y * np.cos(np.radians(lat0))
+
+        counts = np.diff(network.way_coord_offsets)
+        # Degenerate shapes cannot be snapped onto
+        self.way_of_line = np.flatnonzero(counts >= 2)
+        keep = np.repeat(counts >= 2, counts)
+        owner = np.repeat(np.arange(len(self.way_of_line)), counts[self.way_of_line])
+        x, y = self._project(network.way_coord_lng[keep], network.way_coord_lat[keep])
+        self.lines = shapely.linestrings(np.column_stack([x, y]), indices=owner)
+        self.tree = STRtree(self.lines)
+
+        self._cache: "OrderedDict[tuple, Optional[Snap]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        """Rough footprint: shapely stores each vertex plus a small header per line"""
+        return len(self.network.way_coord_lng) * 16 + len(self.lines) * 200 + len(self._cache) * 200
+
+    def _project(self, lng, lat):
+        return np.asarray(lng) * self._scale_x, np.asarray(lat) * self._scale_y
+
+    def _snap_uncached(self, lngs: np.ndarray, lats: np.ndarray) -> List[Optional[Snap]]:
+        results: List[Optional[Snap]] = [None] * len(lngs)
+        if len(self.lines) == 0 or len(lngs) == 0:
+            return results
+
+        points = shapely.points(*self._project(lngs, lats))
+        point_index, line_index = self.tree.query_nearest(
+            points, max_distance=settings.SNAP_MAX_DISTANCE_METERS, all_matches=False
+        )
+        if len(point_index) == 0:
+            return results
+
+        lines, points = self.lines[line_index], points[point_index]
+        distance = shapely.distance(points, lines)
+        fraction = shapely.line_locate_point(lines, points, normalized=True)
+        snapped = shapely.get_coordinates(shapely.line_interpolate_point(lines, fraction, normalized=True))
+        ways = self.way_of_line[line_index]
+        length = self.network.way_length[ways].astype(np.float64)
+
+        for i, p in enumerate(point_index.tolist()):
+            results[p] = Snap(
+                way=int(ways[i]),
+                fraction=float(fraction[i]),
+                distance_meters=float(distance[i]),
+                source_cost=float(fraction[i] * length[i]),
+                target_cost=float((1 - fraction[i]) * length[i]),
+                lng=float(snapped[i, 0] / self._scale_x),
+                lat=float(snapped[i, 1] / self._scale_y),
+            )
+        return results
+
+    def snap_many(self, points: Sequence[Tuple[float, float]]) -> List[Optional[Snap]]:
+        """Snap (lng, lat) points; None for points too far from any way"""
+        keys = [(round(lng, CACHE_DECIMALS), round(lat, CACHE_DECIMALS)) for lng, lat in points]
+        results: List[Optional[Snap]] = [None] * len(keys)
+        missing = []
+        with self._cache_lock:
+            for i, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    results[i] = self._cache[key]
+                else:
+                    missing.append(i)
+        if not missing:
+            return results
+
+        lngs = np.array([points[i][0] for i in missing], dtype=np.float64)
+        lats = np.array([points[i][1] for i in missing], dtype=np.float64)
+        snaps = self._snap_uncached(lngs, lats)
+        with self._cache_lock:
+            for i, snap in zip(missing, snaps):
+                results[i] = snap
+                self._cache[keys[i]] = snap
+            while len(self._cache) > settings.SNAP_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return results
+
+    def snap(self, lng: float, lat: float) -> Optional[Snap]:
+        return self.snap_many([(lng, lat)])[0]
+
+
+def nearest_node(network: NetworkSnapshot, snap: Snap) -> int:
+    """Node index of the snapped way's closer end"""
+    return int(network.way_source[snap.way] if snap.fraction < 0.5 else network.way_target[snap.way])
+
+
+def get_snapper(network: Optional[NetworkSnapshot] = None) -> Optional[Snapper]:
+    """Snapper for the current snapshot, built on first use"""
+    network = network or get_network()
+    if network is None:
+        return None
+    return network.cached("snapper", Snapper)
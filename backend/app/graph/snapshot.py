@@ -0,0 +1,347 @@
+"""
+Binary network snapshot.
+
+Layout: a fixed header, a section table, then 64-byte aligned little-endian
+arrays. The graph is stored in CSR form in both directions (out_* and in_*),
+ids are sorted so lookups are a binary search, and every name is an index
+into one shared string table.
+
+Workers mmap the file read-only, so all processes share the same physical
+pages and opening a snapshot costs only the header parse.
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+MAGIC = b"RPNETSNP"
+FORMAT_VERSION = 4
+HEADER = struct.Struct("<8sIIQ")      # magic, format version, section count, network version
+SECTION = struct.Struct("<24s8sQQ")   # name, dtype, byte offset, item count
+ALIGN = 64
+
+SECTIONS = {
+    # Graph nodes (pgRouting vertex ids), sorted by id
+    "node_id": "<i8",
+    "node_lng": "<f8",
+    "node_lat": "<f8",
+    # Forward and reverse adjacency, one entry per traversable direction
+    "out_offsets": "<i8",
+    "out_target": "<i4",
+    "out_edge": "<i4",
+    "out_cost": "<f4",
+    "in_offsets": "<i8",
+    "in_source": "<i4",
+    "in_edge": "<i4",
+    "in_cost": "<f4",
+    # osm_way rows, sorted by osm_id
+    "way_id": "<i8",
+    "way_source": "<i4",
+    "way_target": "<i4",
+    "way_length": "<f4",
+    "way_highway": "<i4",
+    "way_name": "<i4",
+    # Way shapes, source to target
+    "way_coord_offsets": "<i8",
+    "way_coord_lng": "<f8",
+    "way_coord_lat": "<f8",
+    # bus_stop rows, sorted by stop_id
+    "stop_id": "<i8",
+    "stop_lng": "<f8",
+    "stop_lat": "<f8",
+    "stop_node": "<i4",
+    "stop_name": "<i4",
+    # Stations (bus_stop.station_id), sorted by id, and their platform stops
+    "station_id": "<i8",
+    "stop_station": "<i4",
+    "station_stop_offsets": "<i8",
+    "station_stop_stop": "<i4",
+    # route rows, sorted by route_id, with their stops and ways in sequence
+    "route_id": "<i8",
+    "route_name": "<i4",
+    "route_type": "<i4",
+    "route_stop_offsets": "<i8",
+    "route_stop_stop": "<i4",
+    # route_stop.sequence of each entry, as stored (GTFS numbering may skip)
+    "route_stop_sequence": "<i4",
+    "route_way_offsets": "<i8",
+    "route_way_way": "<i4",
+    # Routes serving each stop, with the stop's position within the route
+    "stop_route_offsets": "<i8",
+    "stop_route_route": "<i4",
+    "stop_route_position": "<i4",
+    # String table
+    "string_offsets": "<i8",
+    "string_blob": "|u1",
+}
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class StringTable:
+    """Deduplicating string table used while building a snapshot"""
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.values: list = []
+
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        if value not in self.index:
+            self.index[value] = len(self.values)
+            self.values.append(value)
+        return self.index[value]
+
+    def arrays(self) -> dict:
+        encoded = [v.encode("utf-8") for v in self.values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return {
+            "string_offsets": offsets,
+            "string_blob": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        }
+
+
+def build_csr(count: int, keys: np.ndarray, *columns: np.ndarray):
+    """Group `columns` by `keys` (0..count-1) into CSR offsets plus sorted columns"""
+    order = np.argsort(keys, kind="stable")
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=count), out=offsets[1:])
+    return (offsets,) + tuple(column[order] for column in columns)
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def write_snapshot(path: str, version: int, arrays: dict, sections: dict = SECTIONS,
+                   magic: bytes = MAGIC, format_version: int = FORMAT_VERSION) -> None:
+    """
+    Write arrays to `path`. The file is written next to the target and
+    renamed into place, so readers never see a partial snapshot.
+    """
+    missing = set(sections) - set(arrays)
+    if missing:
+        raise SnapshotError(f"Missing snapshot sections: {', '.join(sorted(missing))}")
+
+    names = sorted(arrays)
+    offset = _align(HEADER.size + SECTION.size * len(names))
+    entries = []
+    for name in names:
+        array = np.ascontiguousarray(arrays[name], dtype=sections.get(name))
+        entries.append((name, array, offset))
+        offset = _align(offset + array.nbytes)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(magic, format_version, len(entries), version))
+        for name, array, array_offset in entries:
+            f.write(SECTION.pack(name.encode(), array.dtype.str.encode(), array_offset, array.size))
+        for name, array, array_offset in entries:
+            f.seek(array_offset)
+            f.write(array.tobytes())
+        f.truncate(offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class MappedArrays:
+    """Read-only, memory-mapped view of a file written by write_snapshot"""
+
+    SECTIONS = SECTIONS
+    MAGIC = MAGIC
+    FORMAT_VERSION = FORMAT_VERSION
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, format_version, count, version = HEADER.unpack_from(self._mmap, 0)
+        if magic != self.MAGIC:
+            raise SnapshotError(f"{path} is not a {type(self).__name__} file")
+        if format_version != self.FORMAT_VERSION:
+            raise SnapshotError(
+                f"{path} has format version {format_version}, expected {self.FORMAT_VERSION}"
+            )
+        self.version = version
+        self.nbytes = self.stat.st_size
+
+        self.arrays: Dict[str, np.ndarray] = {}
+        for i in range(count):
+            raw_name, dtype, offset, items = SECTION.unpack_from(
+                self._mmap, HEADER.size + i * SECTION.size
+            )
+            name = raw_name.rstrip(b"\0").decode()
+            self.arrays[name] = np.frombuffer(
+                self._mmap, dtype=np.dtype(dtype.rstrip(b"\0").decode()), count=items, offset=offset
+            )
+        for name in self.SECTIONS:
+            if name not in self.arrays:
+                raise SnapshotError(f"{path} is missing section {name}")
+            setattr(self, name, self.arrays[name])
+
+
+class NetworkSnapshot(MappedArrays):
+    """Read-only, memory-mapped view of a network snapshot"""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._derived: dict = {}
+        self._derived_lock = threading.Lock()
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_id)
+
+    def string(self, index: int) -> Optional[str]:
+        if index < 0:
+            return None
+        start, end = self.string_offsets[index], self.string_offsets[index + 1]
+        return self.string_blob[start:end].tobytes().decode("utf-8")
+
+    @staticmethod
+    def _lookup(ids: np.ndarray, value: int) -> Optional[int]:
+        i = int(np.searchsorted(ids, value))
+        if i < len(ids) and ids[i] == value:
+            return i
+        return None
+
+    def node_index(self, node_id: int) -> Optional[int]:
+        return self._lookup(self.node_id, node_id)
+
+    def way_index(self, way_id: int) -> Optional[int]:
+        return self._lookup(self.way_id, way_id)
+
+    def stop_index(self, stop_id: int) -> Optional[int]:
+        return self._lookup(self.stop_id, stop_id)
+
+    def station_index(self, station_id: int) -> Optional[int]:
+        return self._lookup(self.station_id, station_id)
+
+    def route_index(self, route_id: int) -> Optional[int]:
+        return self._lookup(self.route_id, route_id)
+
+    def way_coords(self, way: int):
+        start, end = self.way_coord_offsets[way], self.way_coord_offsets[way + 1]
+        return self.way_coord_lng[start:end], self.way_coord_lat[start:end]
+
+    def station_stops(self, station: int) -> np.ndarray:
+        """Stop indexes (platforms) of a station"""
+        return self.station_stop_stop[self.station_stop_offsets[station]:self.station_stop_offsets[station + 1]]
+
+    def route_stops(self, route: int) -> np.ndarray:
+        """Stop indexes served by a route, in sequence"""
+        return self.route_stop_stop[self.route_stop_offsets[route]:self.route_stop_offsets[route + 1]]
+
+    def route_ways(self, route: int) -> np.ndarray:
+        return self.route_way_way[self.route_way_offsets[route]:self.route_way_offsets[route + 1]]
+
+    def stop_routes(self, stop: int):
+        """(route indexes, positions within those routes) serving a stop"""
+        start, end = self.stop_route_offsets[stop], self.stop_route_offsets[stop + 1]
+        return self.stop_route_route[start:end], self.stop_route_position[start:end]
+
+    def cached(self, name: str, builder: Callable[["NetworkSnapshot"], object]):
+        """
+        Structures derived from a snapshot live and die with it, so a
+        swapped-in snapshot never sees data built from the old one.
+        """
+        value = self._derived.get(name)
+        if value is None:
+            with self._derived_lock:
+                value = self._derived.get(name)
+                if value is None:
+                    value = builder(self)
+                    self._derived[name] = value
+        return value
+
+    def memory_bytes(self) -> int:
+        """Mapped file plus everything derived from it so far"""
+        return self.nbytes + sum(_sizeof(v) for v in list(self._derived.values()))
+
+
+def _sizeof(value) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(_sizeof(v) for v in value)
+    return getattr(value, "nbytes", 0)
+
+
+def _same_file(snapshot: MappedArrays, stat: os.stat_result) -> bool:
+    return (snapshot.stat.st_ino, snapshot.stat.st_mtime_ns) == (stat.st_ino, stat.st_mtime_ns)
+
+
+class SnapshotFile:
+    """
+    The current snapshot at `path`, re-checked every
+    NETWORK_SNAPSHOT_CHECK_SECONDS. When the export command has renamed a
+    new file into place it is mapped and swapped in; requests still
+    holding the old one keep a valid mapping until they finish.
+    """
+
+    def __init__(self, path: str, cls=NetworkSnapshot):
+        self.path = path
+        self.cls = cls
+        self.current = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        current = self.current
+        return current.nbytes if current is not None else 0
+
+    def get(self):
+        now = time.monotonic()
+        current = self.current
+        if current is not None and now - self._last_check < settings.NETWORK_SNAPSHOT_CHECK_SECONDS:
+            return current
+
+        with self._lock:
+            if self.current is not None and now - self._last_check < settings.NETWORK_SNAPSHOT_CHECK_SECONDS:
+                return self.current
+            self._last_check = now
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return self.current
+            if self.current is None or not _same_file(self.current, stat):
+                self.current = self.cls(self.path)
+            return self.current
+
+
+_default: Optional[SnapshotFile] = None
+
+
+def get_network(region: Optional[int] = None) -> Optional[NetworkSnapshot]:
+    """
+    Current network snapshot, or None when none is configured.
+
+    With NETWORK_REGIONS_DIR set, this is the snapshot of `region` (or the
+    default region), loaded on first use; see app/graph/regions.py.
+    """
+    global _default
+    if settings.NETWORK_REGIONS_DIR:
+        from app.graph.regions import get_region_network
+        return get_region_network(region)
+
+    path = settings.NETWORK_SNAPSHOT_PATH
+    if not path:
+        return None
+    if _default is None or _default.path != path:
+        _default = SnapshotFile(path)
+    return _default.get()
@@ -0,0 +1,206 @@
+"""
+Time-dependent travel times from speed profiles.
+
+A speed profile gives a speed (km/h) for every SPEED_PROFILE_BUCKET_MINUTES
+bucket of the day, either for a highway type or for one route. They are
+turned into per-edge travel time arrays over the network snapshot,
+bucket-major so one departure bucket is a single contiguous row:
+
+    edge_seconds[bucket, way]
+
+Updating a profile in the speed_profile table never touches osm_way.
+Workers notice the change on their next check, build a complete new set
+of arrays off to the side and swap it in with one reference assignment,
+so a request sees either the old costs or the new ones, never a mix.
+
+Only what is computed in memory follows the departure time: route ETAs and
+the ride legs of journey alternatives, transfer patterns and ranked direct
+routes. Walking costs are time-independent, and the SQL side
+(the walking route functions, find_complete_journey) still uses static costs.
+
+get_speed_profiles() may query the database and rebuild the arrays, so call
+it from a worker thread, never on the event loop.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.database import read_session
+from app.graph.snapshot import NetworkSnapshot, get_network
+
+PROFILE_STATE_SQL = text("SELECT count(*), max(updated_at) FROM speed_profile")
+PROFILES_SQL = text("SELECT highway_type, route_id, speeds_kmh FROM speed_profile")
+
+SECONDS_PER_DAY = 24 * 3600
+
+
+def bucket_count() -> int:
+    return 24 * 60 // settings.SPEED_PROFILE_BUCKET_MINUTES
+
+
+def seconds_of_day(departure: datetime) -> int:
+    """Seconds after local midnight; naive datetimes are taken as local time"""
+    if departure.tzinfo is not None:
+        departure = departure.astimezone(ZoneInfo(settings.SERVICE_TIMEZONE))
+    return departure.hour * 3600 + departure.minute * 60 + departure.second
+
+
+class SpeedProfiles:
+    """One immutable set of time-dependent costs for one snapshot"""
+
+    def __init__(self, network: NetworkSnapshot, state: tuple, edge_seconds: np.ndarray,
+                 route_pace: Dict[int, np.ndarray]):
+        self.network = network
+        self.state = state
+        self.edge_seconds = edge_seconds
+        # Seconds per meter by bucket for routes with their own profile
+        self.route_pace = route_pace
+        self.buckets = edge_seconds.shape[0]
+        self.bucket_seconds = SECONDS_PER_DAY // self.buckets
+
+    def bucket(self, seconds: float) -> int:
+        return int(seconds // self.bucket_seconds) % self.buckets
+
+    def travel_seconds(self, ways: np.ndarray, departure_seconds: float, route: Optional[int] = None) -> float:
+        """
+        Time to traverse `ways` in order leaving at `departure_seconds`.
+        Each edge is costed in the bucket the vehicle reaches it in, so a
+        long ride that runs into rush hour slows down part way.
+        """
+        pace = self.route_pace.get(route)
+        lengths = self.network.way_length
+        t = float(departure_seconds)
+        for way in ways:
+            if pace is not None:
+                t += float(lengths[way]) * float(pace[self.bucket(t)])
+            else:
+                t += float(self.edge_seconds[self.bucket(t), way])
+        return t - departure_seconds
+
+    def route_eta(self, route_id: int, distance_meters: float, departure_seconds: float) -> Optional[float]:
+        """
+        ETA for `distance_meters` along a route: the route's time-dependent
+        pace over its ways at that departure, applied to the distance.
+        """
+        if distance_meters is None:
+            return None
+        route = self.network.route_index(route_id)
+        if route is None:
+            return None
+        ways = self.network.route_ways(route)
+        length = float(self.network.way_length[ways].sum()) if len(ways) else 0.0
+        if length <= 0:
+            pace = self.route_pace.get(route)
+            if pace is None:
+                return distance_meters * 3.6 / settings.SPEED_PROFILE_DEFAULT_KMH
+            return distance_meters * float(pace[self.bucket(departure_seconds)])
+        return distance_meters * self.travel_seconds(ways, departure_seconds, route) / length
+
+
+def _resample(speeds, buckets: int) -> np.ndarray:
+    """Stretch a profile recorded with another bucket size to `buckets`"""
+    speeds = np.asarray(speeds, dtype=np.float32)
+    if len(speeds) == buckets:
+        return speeds
+    return speeds[np.arange(buckets) * len(speeds) // buckets]
+
+
+def build_speed_profiles(network: NetworkSnapshot, rows, state: tuple) -> SpeedProfiles:
+    buckets = bucket_count()
+    default = np.full(buckets, settings.SPEED_PROFILE_DEFAULT_KMH, dtype=np.float32)
+
+    highway_speeds, route_pace = {}, {}
+    for highway_type, route_id, speeds in rows:
+        if not speeds:
+            continue
+        speeds = _resample(speeds, buckets)
+        if highway_type is not None:
+            highway_speeds[highway_type] = speeds
+        else:
+            route = network.route_index(route_id)
+            if route is not None:
+                route_pace[route] = (3.6 / speeds).astype(np.float32)
+
+    # One speed row per distinct highway string, then gathered per way
+    codes, way_code = np.unique(network.way_highway, return_inverse=True)
+    table = np.empty((len(codes), buckets), dtype=np.float32)
+    for i, code in enumerate(codes):
+        table[i] = highway_speeds.get(network.string(int(code)), default)
+
+    edge_seconds = np.empty((buckets, len(network.way_id)), dtype=np.float32)
+    np.divide(network.way_length * np.float32(3.6), table[way_code].T, out=edge_seconds)
+    return SpeedProfiles(network, state, edge_seconds, route_pace)
+
+
+# Bumped by reload_speed_profiles() so every snapshot's slot re-reads
+_generation = 0
+
+
+class _ProfileSlot:
+    """The current SpeedProfiles of one snapshot"""
+
+    def __init__(self, network: NetworkSnapshot):
+        self.network = network
+        self.current: Optional[SpeedProfiles] = None
+        self.generation = -1
+        self.last_check = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return self.current.edge_seconds.nbytes if self.current is not None else 0
+
+    def _fresh(self, now: float) -> bool:
+        return (
+            self.current is not None and self.generation == _generation
+            and now - self.last_check < settings.SPEED_PROFILE_CHECK_SECONDS
+        )
+
+    def get(self) -> SpeedProfiles:
+        now = time.monotonic()
+        if self._fresh(now):
+            return self.current
+        with self.lock:
+            if self._fresh(now):
+                return self.current
+            generation = _generation
+            current = self.current
+            with read_session("speed_profiles") as db:
+                state = tuple(db.execute(PROFILE_STATE_SQL).fetchone())
+                if current is None or current.state != state:
+                    if state[0]:
+                        rows = db.execute(PROFILES_SQL).fetchall()
+                        current = build_speed_profiles(self.network, rows, state)
+                    else:
+                        current = SpeedProfiles(self.network, state, np.empty((bucket_count(), 0), np.float32), {})
+            # Published with one assignment, readers see old or new
+            self.current = current
+            self.generation = generation
+            self.last_check = now
+            return current
+
+
+def get_speed_profiles(network: Optional[NetworkSnapshot] = None) -> Optional[SpeedProfiles]:
+    """
+    Costs for a snapshot (the current one by default), or None without a
+    snapshot or profiles. The speed_profile table is re-checked every
+    SPEED_PROFILE_CHECK_SECONDS.
+    """
+    network = network or get_network()
+    if network is None:
+        return None
+    current = network.cached("speed_profiles", _ProfileSlot).get()
+    # Without any profile the static costs are the better estimate
+    return current if current.state[0] else None
+
+
+def reload_speed_profiles() -> None:
+    """Make the next get_speed_profiles() re-read the table"""
+    global _generation
+    _generation += 1
@@ -0,0 +1,213 @@
+"""
+Stop-to-stop walking transfers.
+
+    python -m app.graph.transfers [--radius 400]
+
+Runs a bounded walking search from every platform stop of the current
+network snapshot and records each stop reached within
+TRANSFER_RADIUS_METERS with its walking time (at least
+TRANSFER_MIN_SECONDS) and path. The
+result goes to the stop_transfer table and to a memory-mappable file
+(TRANSFERS_PATH), so transfer lookups at query time are array reads:
+
+    transfers.walk_seconds(from_stop, to_stop)
+
+The file is bound to the snapshot version it was computed from (stop
+indexes change between snapshots) and is ignored until they match again.
+With regions, run it once per region snapshot; the file goes next to it.
+"""
+import argparse
+import time
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.database import engine
+from app.graph.alternatives import stops_by_node, tree_path, walking_tree
+from app.graph.snapshot import (
+    MappedArrays, NetworkSnapshot, SnapshotError, SnapshotFile, get_network, write_snapshot,
+)
+from app.importers.gtfs import copy_rows
+
+MAGIC = b"RPXFRSNP"
+FORMAT_VERSION = 2
+
+SECTIONS = {
+    # Transfers from each snapshot stop index, sorted by target stop
+    "transfer_offsets": "<i8",
+    "transfer_to": "<i4",
+    "transfer_seconds": "<f4",
+    "transfer_meters": "<f4",
+    # Way indexes walked by each transfer, in order
+    "transfer_path_offsets": "<i8",
+    "transfer_path_way": "<i4",
+}
+
+
+class Transfers(MappedArrays):
+    SECTIONS = SECTIONS
+    MAGIC = MAGIC
+    FORMAT_VERSION = FORMAT_VERSION
+
+    def transfers_from(self, stop: int):
+        """(target stop indexes, walking seconds) reachable from a stop"""
+        start, end = self.transfer_offsets[stop], self.transfer_offsets[stop + 1]
+        return self.transfer_to[start:end], self.transfer_seconds[start:end]
+
+    def find(self, from_stop: int, to_stop: int) -> Optional[int]:
+        start, end = self.transfer_offsets[from_stop], self.transfer_offsets[from_stop + 1]
+        i = start + int(np.searchsorted(self.transfer_to[start:end], to_stop))
+        if i < end and self.transfer_to[i] == to_stop:
+            return i
+        return None
+
+    def walk_seconds(self, from_stop: int, to_stop: int) -> Optional[float]:
+        i = self.find(from_stop, to_stop)
+        return float(self.transfer_seconds[i]) if i is not None else None
+
+    def walk_path(self, transfer: int) -> np.ndarray:
+        """Way indexes walked by a transfer (an index from find())"""
+        start, end = self.transfer_path_offsets[transfer], self.transfer_path_offsets[transfer + 1]
+        return self.transfer_path_way[start:end]
+
+
+def build_transfers(network: NetworkSnapshot, radius: float) -> dict:
+    stop_offsets, stop_index = stops_by_node(network)
+    walk_pace = 3.6 / settings.WALKING_SPEED_KMH
+
+    counts = np.zeros(len(network.stop_id), dtype=np.int64)
+    reached = [None] * len(network.stop_id)
+    # One search per platform node: platforms of one station are still tens
+    # of metres apart, and each transfer is measured from its own platform.
+    # Platforms sharing a node share the search.
+    for node in np.flatnonzero(np.diff(stop_offsets) > 0).tolist():
+        dist, pred = walking_tree(network, {node: 0.0}, radius)
+        found = []
+        for target_node, d in dist.items():
+            targets = stop_index[stop_offsets[target_node]:stop_offsets[target_node + 1]].tolist()
+            if targets:
+                ways = tree_path(pred, target_node)[1]
+                found.extend((target, d, ways) for target in targets)
+        found.sort(key=lambda item: item[0])
+        for stop in stop_index[stop_offsets[node]:stop_offsets[node + 1]].tolist():
+            reached[stop] = found
+
+    to, meters, path_lengths, path_ways = [], [], [], []
+    for stop in range(len(network.stop_id)):
+        for target, d, ways in reached[stop] or ():
+            if target == stop:
+                continue
+            counts[stop] += 1
+            to.append(target)
+            meters.append(d)
+            path_lengths.append(len(ways))
+            path_ways.extend(ways)
+
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    path_offsets = np.zeros(len(path_lengths) + 1, dtype=np.int64)
+    np.cumsum(path_lengths, out=path_offsets[1:])
+    meters = np.array(meters, dtype=np.float32)
+    # Changing platforms takes time even when they share a node
+    seconds = np.maximum(meters * np.float32(walk_pace), np.float32(settings.TRANSFER_MIN_SECONDS))
+    return {
+        "transfer_offsets": offsets,
+        "transfer_to": np.array(to, dtype=np.int32),
+        "transfer_seconds": seconds,
+        "transfer_meters": meters,
+        "transfer_path_offsets": path_offsets,
+        "transfer_path_way": np.array(path_ways, dtype=np.int32),
+    }
+
+
+def _table_rows(network: NetworkSnapshot, arrays: dict):
+    offsets = arrays["transfer_offsets"]
+    path_offsets = arrays["transfer_path_offsets"]
+    for stop in range(len(offsets) - 1):
+        from_stop_id = int(network.stop_id[stop])
+        for i in range(offsets[stop], offsets[stop + 1]):
+            ways = network.way_id[arrays["transfer_path_way"][path_offsets[i]:path_offsets[i + 1]]]
+            yield (
+                from_stop_id,
+                int(network.stop_id[arrays["transfer_to"][i]]),
+                float(arrays["transfer_seconds"][i]),
+                float(arrays["transfer_meters"][i]),
+                "{" + ",".join(str(w) for w in ways.tolist()) + "}",
+            )
+
+
+def write_table(network: NetworkSnapshot, arrays: dict) -> int:
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute("TRUNCATE stop_transfer")
+        count = copy_rows(
+            cursor,
+            "stop_transfer",
+            ["from_stop_id", "to_stop_id", "walk_seconds", "distance_meters", "path_way_ids"],
+            _table_rows(network, arrays),
+        )
+        raw.commit()
+        return count
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+
+def transfers_path(network: NetworkSnapshot) -> Optional[str]:
+    """TRANSFERS_PATH, or <region snapshot>.transfers when running regions"""
+    if settings.NETWORK_REGIONS_DIR:
+        return f"{network.path}.transfers"
+    return settings.TRANSFERS_PATH
+
+
+def get_transfers(network: Optional[NetworkSnapshot] = None) -> Optional[Transfers]:
+    """
+    Transfers for a snapshot (the current one by default), or None when not
+    configured or computed for another snapshot version
+    """
+    network = network or get_network()
+    if network is None:
+        return None
+    path = transfers_path(network)
+    if not path:
+        return None
+    try:
+        current = network.cached("transfers", lambda n: SnapshotFile(path, Transfers)).get()
+    except SnapshotError:
+        return None
+    if current is None or current.version != network.version:
+        return None
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute stop-to-stop walking transfers")
+    parser.add_argument("--snapshot", default=settings.NETWORK_SNAPSHOT_PATH)
+    parser.add_argument("--output", help="Defaults to TRANSFERS_PATH, or <snapshot>.transfers with regions")
+    parser.add_argument("--radius", type=float, default=settings.TRANSFER_RADIUS_METERS)
+    parser.add_argument("--skip-table", action="store_true", help="Only write the file")
+    args = parser.parse_args()
+    if not args.snapshot:
+        parser.error("--snapshot is required when NETWORK_SNAPSHOT_PATH is not set")
+
+    network = NetworkSnapshot(args.snapshot)
+    args.output = args.output or transfers_path(network)
+    if not args.output:
+        parser.error("--output is required when TRANSFERS_PATH is not set")
+    started = time.perf_counter()
+    arrays = build_transfers(network, args.radius)
+    write_snapshot(args.output, network.version, arrays, SECTIONS, MAGIC, FORMAT_VERSION)
+    print(
+        f"Wrote {len(arrays['transfer_to'])} transfers between {len(network.stop_id)} stops "
+        f"to {args.output} in {time.perf_counter() - started:.1f}s"
+    )
+    if not args.skip_table:
+        print(f"stop_transfer: {write_table(network, arrays)} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""
+GTFS static feed importer.
+
+    python -m app.importers.gtfs feed.zip [--region 2]
+
+Files are streamed straight out of the zip (nothing is extracted) and
+loaded with COPY, so memory stays flat however large stop_times.txt is;
+only the stop, route and trip id maps are held in memory.
+
+stops.txt and routes.txt are upserted into bus_stop / route under stable
+ids (gtfs_stop_map / gtfs_route_map). The schedule tables (trip, stop_time,
+frequency) hold a single feed and are replaced on every import. Each
+route's longest trip becomes its route_stop sequence and, when it has a
+shape, its geometry. Stops are then re-clustered into stations
+(app/importers/stations.py).
+"""
+import argparse
+import csv
+import io
+import os
+import time
+import zipfile
+from typing import Optional
+
+from app.core.database import engine
+
+# GTFS ids are strings, ours are BIGINT. Imported rows get ids far above
+# any OSM id so the two sources never collide.
+GTFS_ID_OFFSET = 9_000_000_000_000_000
+
+COPY_CHUNK_BYTES = 1 << 20
+
+ROUTE_TYPES = {
+    "0": "tram", "1": "subway", "2": "rail", "3": "bus", "4": "ferry",
+    "5": "cable_tram", "6": "aerial_lift", "7": "funicular",
+    "11": "trolleybus", "12": "monorail",
+}
+
+_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_value(value) -> str:
+    if value is None:
+        return r"\N"
+    return str(value).translate(_ESCAPES)
+
+
+class CopyStream(io.RawIOBase):
+    """File-like object that renders rows to COPY text as psycopg2 reads it"""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = bytearray()
+        self.count = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._buffer += ("\t".join(_copy_value(v) for v in row) + "\n").encode("utf-8")
+            self.count += 1
+        if size < 0:
+            size = len(self._buffer)
+        chunk = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return chunk
+
+
+def copy_rows(cursor, table: str, columns, rows) -> int:
+    stream = CopyStream(rows)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN", stream, size=COPY_CHUNK_BYTES
+    )
+    return stream.count
+
+
+def _seconds(value: str):
+    """GTFS time (H:MM:SS, may pass 24:00:00) to seconds after midnight"""
+    if not value:
+        return None
+    hours, minutes, seconds = value.strip().split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+class GTFSFeed:
+    def __init__(self, path: str):
+        self.zip = zipfile.ZipFile(path)
+        # Some feeds nest the .txt files in a folder inside the zip
+        self.names = {os.path.basename(n): n for n in self.zip.namelist()}
+
+    def has(self, name: str) -> bool:
+        return name in self.names
+
+    def rows(self, name: str):
+        """Yield the rows of a feed file as dicts, streamed from the zip"""
+        if name not in self.names:
+            return
+        with self.zip.open(self.names[name]) as raw:
+            reader = csv.reader(io.TextIOWrapper(raw, encoding="utf-8-sig", newline=""))
+            header = [h.strip() for h in next(reader, [])]
+            for row in reader:
+                yield dict(zip(header, row))
+
+
+class IdMap:
+    """Stable feed id -> BIGINT id map, remembering the pairs assigned in this run"""
+
+    def __init__(self, existing: dict):
+        self.ids = existing
+        self.next_id = max(existing.values(), default=GTFS_ID_OFFSET) + 1
+        self.new = []
+
+    def get(self, feed_id: str):
+        return self.ids.get(feed_id)
+
+    def assign(self, feed_id: str) -> int:
+        internal = self.ids.get(feed_id)
+        if internal is None:
+            internal = self.ids[feed_id] = self.next_id
+            self.next_id += 1
+            self.new.append((feed_id, internal))
+        return internal
+
+
+class GTFSImporter:
+    def __init__(self, cursor, feed: GTFSFeed, region: Optional[int] = None):
+        self.cursor = cursor
+        self.feed = feed
+        self.region = region
+        self.stop_ids = IdMap(self._load_map("gtfs_stop_map", "feed_stop_id", "stop_id"))
+        self.route_ids = IdMap(self._load_map("gtfs_route_map", "feed_route_id", "route_id"))
+        self.trip_ids = {}
+
+    def _load_map(self, table: str, key: str, value: str) -> dict:
+        self.cursor.execute(f"SELECT {key}, {value} FROM {table}")
+        return dict(self.cursor.fetchall())
+
+    def import_stops(self) -> int:
+        def rows():
+            for row in self.feed.rows("stops.txt"):
+                # Stations and entrances are not boarding points
+                if row.get("location_type", "") not in ("", "0"):
+                    continue
+                stop_id = self.stop_ids.assign(row["stop_id"])
+                lng, lat = float(row["stop_lon"]), float(row["stop_lat"])
+                yield stop_id, row.get("stop_name") or None, f"SRID=4326;POINT({lng} {lat})"
+
+        self.cursor.execute(
+            "CREATE TEMP TABLE _gtfs_stop (stop_id BIGINT, name TEXT, geom geometry(POINT, 4326)) "
+            "ON COMMIT DROP"
+        )
+        count = copy_rows(self.cursor, "_gtfs_stop", ["stop_id", "name", "geom"], rows())
+        # Feeds do repeat ids; the last row wins, as one upsert cannot touch a row twice
+        self.cursor.execute("""
+            INSERT INTO bus_stop (stop_id, name, geom, region_id)
+            SELECT DISTINCT ON (stop_id) stop_id, name, geom, %s FROM _gtfs_stop
+            ORDER BY stop_id, ctid DESC
+            ON CONFLICT (stop_id) DO UPDATE
+            SET name = EXCLUDED.name, geom = EXCLUDED.geom,
+                region_id = COALESCE(EXCLUDED.region_id, bus_stop.region_id)
+        """, (self.region,))
+        copy_rows(self.cursor, "gtfs_stop_map", ["feed_stop_id", "stop_id"], self.stop_ids.new)
+        return count
+
+    def import_routes(self) -> int:
+        def rows():
+            for row in self.feed.rows("routes.txt"):
+                route_id = self.route_ids.assign(row["route_id"])
+                name = row.get("route_long_name") or row.get("route_short_name") or None
+                route_type = row.get("route_type", "3")
+                # Extended types 700-799 are all bus services
+                if route_type.isdigit() and 700 <= int(route_type) < 800:
+                    route_type = "3"
+                yield route_id, name, ROUTE_TYPES.get(route_type, route_type)
+
+        self.cursor.execute(
+            "CREATE TEMP TABLE _gtfs_route (route_id BIGINT, route_name TEXT, route_type TEXT) "
+            "ON COMMIT DROP"
+        )
+        count = copy_rows(self.cursor, "_gtfs_route", ["route_id", "route_name", "route_type"], rows())
+        self.cursor.execute("""
+            INSERT INTO route (route_id, route_name, route_type, region_id)
+            SELECT DISTINCT ON (route_id) route_id, route_name, route_type, %s FROM _gtfs_route
+            ORDER BY route_id, ctid DESC
+            ON CONFLICT (route_id) DO UPDATE
+            SET route_name = EXCLUDED.route_name, route_type = EXCLUDED.route_type,
+                region_id = COALESCE(EXCLUDED.region_id, route.region_id)
+        """, (self.region,))
+        copy_rows(self.cursor, "gtfs_route_map", ["feed_route_id", "route_id"], self.route_ids.new)
+        return count
+
+    def import_trips(self) -> int:
+        self.cursor.execute("TRUNCATE stop_time, frequency, trip")
+
+        def rows():
+            for row in self.feed.rows("trips.txt"):
+                route_id = self.route_ids.get(row["route_id"])
+                if route_id is None:
+                    continue
+                trip_id = len(self.trip_ids) + 1
+                self.trip_ids[row["trip_id"]] = trip_id
+                direction = row.get("direction_id")
+                yield (
+                    trip_id, row["trip_id"], route_id, row.get("service_id") or None,
+                    row.get("trip_headsign") or None,
+                    int(direction) if direction else None,
+                    row.get("shape_id") or None,
+                )
+
+        return copy_rows(
+            self.cursor, "trip",
+            ["trip_id", "feed_trip_id", "route_id", "service_id", "headsign", "direction_id", "shape_id"],
+            rows(),
+        )
+
+    def import_stop_times(self) -> int:
+        def rows():
+            for row in self.feed.rows("stop_times.txt"):
+                trip_id = self.trip_ids.get(row["trip_id"])
+                stop_id = self.stop_ids.get(row["stop_id"])
+                if trip_id is None or stop_id is None:
+                    continue
+                arrival = _seconds(row.get("arrival_time", ""))
+                departure = _seconds(row.get("departure_time", ""))
+                yield (
+                    trip_id, int(row["stop_sequence"]), stop_id,
+                    arrival if arrival is not None else departure,
+                    departure if departure is not None else arrival,
+                )
+
+        # Building the secondary index once afterwards beats updating it per row
+        self.cursor.execute("DROP INDEX IF EXISTS ix_stop_time_stop_id")
+        count = copy_rows(
+            self.cursor, "stop_time",
+            ["trip_id", "stop_sequence", "stop_id", "arrival_seconds", "departure_seconds"],
+            rows(),
+        )
+        self.cursor.execute("CREATE INDEX ix_stop_time_stop_id ON stop_time (stop_id)")
+        return count
+
+    def import_frequencies(self) -> int:
+        def rows():
+            for row in self.feed.rows("frequencies.txt"):
+                trip_id = self.trip_ids.get(row["trip_id"])
+                if trip_id is None:
+                    continue
+                yield (
+                    trip_id, _seconds(row["start_time"]), _seconds(row["end_time"]),
+                    int(row["headway_secs"]), row.get("exact_times") == "1",
+                )
+
+        return copy_rows(
+            self.cursor, "frequency",
+            ["trip_id", "start_seconds", "end_seconds", "headway_seconds", "exact_times"],
+            rows(),
+        )
+
+    def import_shapes(self) -> int:
+        def rows():
+            for row in self.feed.rows("shapes.txt"):
+                yield (
+                    row["shape_id"], int(row["shape_pt_sequence"]),
+                    float(row["shape_pt_lon"]), float(row["shape_pt_lat"]),
+                )
+
+        self.cursor.execute(
+            "CREATE TEMP TABLE _gtfs_shape_point "
+            "(shape_id TEXT, seq INTEGER, lng DOUBLE PRECISION, lat DOUBLE PRECISION) ON COMMIT DROP"
+        )
+        count = copy_rows(self.cursor, "_gtfs_shape_point", ["shape_id", "seq", "lng", "lat"], rows())
+        self.cursor.execute("""
+            DELETE FROM gtfs_shape WHERE shape_id IN (SELECT DISTINCT shape_id FROM _gtfs_shape_point);
+            INSERT INTO gtfs_shape (shape_id, geom, length_meters)
+            SELECT shape_id, line, ST_Length(line::geography)
+            FROM (
+                SELECT shape_id,
+                       ST_MakeLine(ST_SetSRID(ST_MakePoint(lng, lat), 4326) ORDER BY seq) AS line
+                FROM _gtfs_shape_point
+                GROUP BY shape_id
+            ) s
+        """)
+        return count
+
+    def build_route_patterns(self) -> None:
+        """Each route's longest trip defines its stop sequence and geometry"""
+        self.cursor.execute("""
+            CREATE TEMP TABLE _gtfs_pattern ON COMMIT DROP AS
+            SELECT DISTINCT ON (t.route_id) t.route_id, t.trip_id, t.shape_id
+            FROM trip t
+            JOIN (SELECT trip_id, count(*) AS n FROM stop_time GROUP BY trip_id) c USING (trip_id)
+            ORDER BY t.route_id, c.n DESC, t.trip_id;
+
+            DELETE FROM route_stop WHERE route_id IN (SELECT route_id FROM _gtfs_pattern);
+            INSERT INTO route_stop (route_id, stop_id, sequence)
+            SELECT p.route_id, st.stop_id,
+                   row_number() OVER (PARTITION BY p.route_id ORDER BY st.stop_sequence)
+            FROM _gtfs_pattern p
+            JOIN stop_time st USING (trip_id);
+
+            UPDATE route r SET geom = ST_Multi(s.geom)
+            FROM _gtfs_pattern p
+            JOIN gtfs_shape s USING (shape_id)
+            WHERE r.route_id = p.route_id;
+        """)
+
+
+def import_feed(path: str, region: Optional[int] = None) -> None:
+    # stations.py reuses copy_rows from this module
+    from app.importers.stations import assign_stations
+
+    feed = GTFSFeed(path)
+    for required in ("stops.txt", "routes.txt", "trips.txt", "stop_times.txt"):
+        if not feed.has(required):
+            raise SystemExit(f"{path} has no {required}")
+
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        importer = GTFSImporter(cursor, feed, region)
+        steps = [
+            ("stops", importer.import_stops),
+            ("routes", importer.import_routes),
+            ("trips", importer.import_trips),
+            ("stop_times", importer.import_stop_times),
+            ("frequencies", importer.import_frequencies),
+            ("shapes", importer.import_shapes),
+            ("stations", lambda: assign_stations(cursor)),
+        ]
+        for name, step in steps:
+            started = time.perf_counter()
+            count = step()
+            print(f"{name}: {count} rows in {time.perf_counter() - started:.1f}s")
+        importer.build_route_patterns()
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a GTFS static feed")
+    parser.add_argument("feed", help="Path to the GTFS zip")
+    parser.add_argument("--region", type=int, help="region_id for the imported stops and routes")
+    args = parser.parse_args()
+    import_feed(args.feed, args.region)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Stop clustering into stations.
+
+    python -m app.importers.stations [--distance 30]
+
+OSM and GTFS often carry several bus_stop points a few metres apart for one
+physical stop (one per side of the road, one per operator). They are
+merged by leader clustering: in stop_id order, each stop not yet in a
+station seeds one and takes the free stops within STATION_CLUSTER_METERS
+of it. Merging every pair closer than the threshold instead would chain a
+row of stops along a street into one long station. A grid hash keeps the
+lookups to the seed's own and neighbouring cells.
+
+Every stop gets a station (a lone stop is a station of one). The station
+keeps its seed, the smallest child stop_id, as its id so ids stay stable
+across runs, and bus_stop keeps its own rows as the station's platforms.
+The GTFS importer runs this after loading stops.
+"""
+import argparse
+import time
+from collections import Counter
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.database import engine
+from app.importers.gtfs import copy_rows
+
+EARTH_RADIUS_METERS = 6_371_000.0
+
+STOPS_SQL = """
+    SELECT stop_id, name, ST_X(geom), ST_Y(geom), region_id
+    FROM bus_stop
+    WHERE geom IS NOT NULL
+    ORDER BY stop_id
+"""
+
+
+def cluster_stops(lngs: np.ndarray, lats: np.ndarray, distance: float) -> np.ndarray:
+    """
+    Seed index of each stop's cluster. Stops are taken in order; an
+    unclustered stop becomes a seed and takes every unclustered stop within
+    `distance` meters of it, so no station spans more than 2 * `distance`.
+    """
+    count = len(lngs)
+    if count == 0 or distance <= 0:
+        return np.arange(count)
+
+    lat0 = float(np.mean(lats))
+    y = np.radians(lats) * EARTH_RADIUS_METERS
+    x = np.radians(lngs) * EARTH_RADIUS_METERS * np.cos(np.radians(lat0))
+    cell_x = np.floor(x / distance).astype(np.int64)
+    cell_y = np.floor(y / distance).astype(np.int64)
+
+    cells = {}
+    for i, key in enumerate(zip(cell_x.tolist(), cell_y.tolist())):
+        cells.setdefault(key, []).append(i)
+    cells = {key: np.array(members) for key, members in cells.items()}
+
+    limit = distance * distance
+    seeds = np.full(count, -1, dtype=np.int64)
+    for i in range(count):
+        if seeds[i] >= 0:
+            continue
+        seeds[i] = i
+        cx, cy = int(cell_x[i]), int(cell_y[i])
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                others = cells.get((cx + dx, cy + dy))
+                if others is None:
+                    continue
+                free = others[seeds[others] < 0]
+                near = free[(x[free] - x[i]) ** 2 + (y[free] - y[i]) ** 2 <= limit]
+                seeds[near] = i
+    return seeds
+
+
+def _station_rows(stops: list, roots: np.ndarray):
+    children = {}
+    for i, root in enumerate(roots.tolist()):
+        children.setdefault(root, []).append(i)
+    for root, members in children.items():
+        names = Counter(stops[i][1] for i in members if stops[i][1])
+        lng = float(np.mean([stops[i][2] for i in members]))
+        lat = float(np.mean([stops[i][3] for i in members]))
+        yield (
+            stops[root][0],
+            names.most_common(1)[0][0] if names else None,
+            stops[root][4],
+            f"SRID=4326;POINT({lng} {lat})",
+        )
+
+
+def assign_stations(cursor, distance: Optional[float] = None) -> int:
+    """Rebuild the station table and bus_stop.station_id; returns the station count"""
+    distance = settings.STATION_CLUSTER_METERS if distance is None else distance
+    cursor.execute(STOPS_SQL)
+    stops = cursor.fetchall()
+    roots = cluster_stops(
+        np.array([s[2] for s in stops], dtype=np.float64),
+        np.array([s[3] for s in stops], dtype=np.float64),
+        distance,
+    )
+
+    cursor.execute("CREATE TEMP TABLE _stop_station (stop_id BIGINT, station_id BIGINT) ON COMMIT DROP")
+    copy_rows(
+        cursor, "_stop_station", ["stop_id", "station_id"],
+        ((stop[0], stops[root][0]) for stop, root in zip(stops, roots.tolist())),
+    )
+    cursor.execute("UPDATE bus_stop SET station_id = NULL WHERE station_id IS NOT NULL")
+    cursor.execute("DELETE FROM station")
+    count = copy_rows(cursor, "station", ["station_id", "name", "region_id", "geom"], _station_rows(stops, roots))
+    cursor.execute("""
+        UPDATE bus_stop s SET station_id = t.station_id
+        FROM _stop_station t
+        WHERE s.stop_id = t.stop_id
+    """)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster nearby bus stops into stations")
+    parser.add_argument("--distance", type=float, default=settings.STATION_CLUSTER_METERS,
+                        help="Merge stops closer than this many meters")
+    args = parser.parse_args()
+
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        started = time.perf_counter()
+        count = assign_stations(cursor, args.distance)
+        raw.commit()
+        print(f"stations: {count} rows in {time.perf_counter() - started:.1f}s")
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,11 @@ from fastapi.staticfiles import StaticFiles
 
 from app.api.endpoints import routing
 from app.api.endpoints.user import router as user_router
+from app.api.endpoints.speed_profile import router as speed_profile_router
 from app.api.endpoints import auth #pois
+from app.api.endpoints import profiling
+from app.core.compression import CompressionMiddleware
+from app.core.request_log import RequestLogMiddleware
 
 app = FastAPI(
     title="Road Paari API",
@@ -14,7 +18,11 @@ app = FastAPI(
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Configure for Flutter app
+# gzip/br/zstd, caches compressed route data
+app.add_middleware(CompressionMiddleware)
+
+# Configure for Flutter app. Added after (so outside) the compression cache,
+# which then never stores or replays CORS headers
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -26,6 +34,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Records anonymized routing requests when REQUEST_LOG_PATH is set
+app.add_middleware(RequestLogMiddleware)
+
 # Include routers
 app.include_router(
     routing.router,
@@ -34,9 +45,11 @@ app.include_router(
 )
 
 app.include_router(user_router)
+app.include_router(speed_profile_router, prefix="/api")
 
 # app.include_router(pois.router, prefix="/api/pois", tags=["pois"])
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
+app.include_router(profiling.router, prefix="/api/profiling", tags=["profiling"])
 
 @app.get("/")
 def root():
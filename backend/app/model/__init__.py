@@ -1,5 +1,13 @@
 from app.model.user import User
 from app.model.poi import POI, POICategory
 from app.model.notification import Notification
+from app.model.transport import OSMNode, OSMWay, Route, RouteWay, RouteStop, BusStop
+from app.model.schedule import GTFSStopMap, GTFSRouteMap, Trip, StopTime, Frequency, GTFSShape
+from app.model.speed_profile import SpeedProfile
+from app.model.transfer import StopTransfer
+from app.model.region import Region
+from app.model.station import Station
 
-__all__ = ["User", "POI", "POICategory", "Notification", "OSMNode", "OSMWay", "Route", "RouteWay", "BusStop"]
\ No newline at end of file
+__all__ = ["User", "POI", "POICategory", "Notification", "OSMNode", "OSMWay", "Route", "RouteWay", "RouteStop", "BusStop",
+           "GTFSStopMap", "GTFSRouteMap", "Trip", "StopTime", "Frequency", "GTFSShape",
+           "SpeedProfile", "StopTransfer", "Region", "Station"]
\ No newline at end of file
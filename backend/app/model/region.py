@@ -0,0 +1,15 @@
+from sqlalchemy import Column, SmallInteger, Text, Float
+from app.core.database import Base
+
+class Region(Base):
+    """A city served by its own network snapshot (see app/graph/regions.py)"""
+    __tablename__ = "region"
+
+    region_id = Column(SmallInteger, primary_key=True)
+    slug = Column(Text, unique=True, nullable=False)
+    name = Column(Text)
+    # Bounding box used to dispatch requests
+    min_lng = Column(Float, nullable=False)
+    min_lat = Column(Float, nullable=False)
+    max_lng = Column(Float, nullable=False)
+    max_lat = Column(Float, nullable=False)
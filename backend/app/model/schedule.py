@@ -0,0 +1,55 @@
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, Float, Text, Boolean, ForeignKey
+from geoalchemy2 import Geometry
+from app.core.database import Base
+
+# Schedule data imported from GTFS feeds (app/importers/gtfs.py).
+# Stops and routes go into bus_stop / route, these tables hold the rest.
+
+class GTFSStopMap(Base):
+    __tablename__ = "gtfs_stop_map"
+
+    feed_stop_id = Column(Text, primary_key=True)
+    stop_id = Column(BigInteger, nullable=False, unique=True)
+
+class GTFSRouteMap(Base):
+    __tablename__ = "gtfs_route_map"
+
+    feed_route_id = Column(Text, primary_key=True)
+    route_id = Column(BigInteger, nullable=False, unique=True)
+
+class Trip(Base):
+    __tablename__ = "trip"
+
+    trip_id = Column(BigInteger, primary_key=True)
+    feed_trip_id = Column(Text, nullable=False, unique=True)
+    route_id = Column(BigInteger, nullable=False, index=True)
+    service_id = Column(Text)
+    headsign = Column(Text)
+    direction_id = Column(SmallInteger)
+    shape_id = Column(Text)
+
+class StopTime(Base):
+    __tablename__ = "stop_time"
+
+    trip_id = Column(BigInteger, ForeignKey("trip.trip_id"), primary_key=True)
+    stop_sequence = Column(Integer, primary_key=True)
+    stop_id = Column(BigInteger, nullable=False, index=True)
+    # Seconds after midnight of the service day, may exceed 24h
+    arrival_seconds = Column(Integer)
+    departure_seconds = Column(Integer)
+
+class Frequency(Base):
+    __tablename__ = "frequency"
+
+    trip_id = Column(BigInteger, ForeignKey("trip.trip_id"), primary_key=True)
+    start_seconds = Column(Integer, primary_key=True)
+    end_seconds = Column(Integer, nullable=False)
+    headway_seconds = Column(Integer, nullable=False)
+    exact_times = Column(Boolean, default=False)
+
+class GTFSShape(Base):
+    __tablename__ = "gtfs_shape"
+
+    shape_id = Column(Text, primary_key=True)
+    length_meters = Column(Float)
+    geom = Column(Geometry("LINESTRING", srid=4326))
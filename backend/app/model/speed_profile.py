@@ -0,0 +1,16 @@
+from sqlalchemy import Column, DateTime, Integer, BigInteger, Float, Text, CheckConstraint, func
+from sqlalchemy.dialects.postgresql import ARRAY
+from app.core.database import Base
+
+class SpeedProfile(Base):
+    """Speed (km/h) per time-of-day bucket for a highway type or one route"""
+    __tablename__ = "speed_profile"
+    __table_args__ = (
+        CheckConstraint("(highway_type IS NULL) <> (route_id IS NULL)", name="ck_speed_profile_target"),
+    )
+
+    profile_id = Column(Integer, primary_key=True)
+    highway_type = Column(Text, unique=True)
+    route_id = Column(BigInteger, unique=True)
+    speeds_kmh = Column(ARRAY(Float), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
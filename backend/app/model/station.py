@@ -0,0 +1,14 @@
+from sqlalchemy import Column, BigInteger, SmallInteger, Text, ForeignKey
+from geoalchemy2 import Geometry
+from app.core.database import Base
+
+class Station(Base):
+    """Nearby bus_stop rows merged into one stop, written by app/importers/stations.py"""
+    __tablename__ = "station"
+
+    # The smallest child stop_id, stable across runs
+    station_id = Column(BigInteger, primary_key=True)
+    name = Column(Text)
+    region_id = Column(SmallInteger, ForeignKey("region.region_id"), index=True)
+    # Centroid of the child stops
+    geom = Column(Geometry("POINT", srid=4326))
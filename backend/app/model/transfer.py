@@ -0,0 +1,14 @@
+from sqlalchemy import Column, BigInteger, Float
+from sqlalchemy.dialects.postgresql import ARRAY
+from app.core.database import Base
+
+class StopTransfer(Base):
+    """Walking transfer between two nearby stops, written by app/graph/transfers.py"""
+    __tablename__ = "stop_transfer"
+
+    from_stop_id = Column(BigInteger, primary_key=True)
+    to_stop_id = Column(BigInteger, primary_key=True)
+    walk_seconds = Column(Float, nullable=False)
+    distance_meters = Column(Float, nullable=False)
+    # osm_way ids walked, in order
+    path_way_ids = Column(ARRAY(BigInteger), nullable=False)
@@ -1,7 +1,7 @@
-from sqlalchemy import Column, Integer, BigInteger, String, Text, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, SmallInteger, BigInteger, Float, Text, Boolean, ForeignKey
 from sqlalchemy.orm import relationship
 from geoalchemy2 import Geometry
-from core.database import Base
+from app.core.database import Base
 
 class OSMNode(Base):
     __tablename__ = "osm_node"
@@ -17,16 +17,17 @@ class OSMWay(Base):
     osm_id = Column(BigInteger, primary_key=True)
     name = Column(Text)
     highway_type = Column(Text)
+    region_id = Column(SmallInteger, ForeignKey("region.region_id"), index=True)
     geom = Column(Geometry("LINESTRING", srid=4326))
 
     # pgRouting columns
     source = Column(Integer, index=True)
     target = Column(Integer, index=True)
-    cost = Column(float)
-    reverse_cost = Column(float)
+    cost = Column(Float)
+    reverse_cost = Column(Float)
     
     # Additional columns for multi-modal routing
-    length_meters = Column(float)
+    length_meters = Column(Float)
 
 class Route(Base):
     __tablename__ = "route"
@@ -34,6 +35,7 @@ class Route(Base):
     route_id = Column(BigInteger, primary_key=True)
     route_name = Column(Text)
     route_type = Column(Text)
+    region_id = Column(SmallInteger, ForeignKey("region.region_id"), index=True)
     geom = Column(Geometry("MULTILINESTRING", srid=4326))
 
 class RouteWay(Base):
@@ -43,9 +45,19 @@ class RouteWay(Base):
     way_id = Column(BigInteger, ForeignKey("osm_way.osm_id"), primary_key=True)
     sequence = Column(Integer)
 
+class RouteStop(Base):
+    __tablename__ = "route_stop"
+
+    route_id = Column(BigInteger, ForeignKey("route.route_id"), primary_key=True)
+    stop_id = Column(BigInteger, ForeignKey("bus_stop.stop_id"), index=True)
+    sequence = Column(Integer, primary_key=True)
+
 class BusStop(Base):
     __tablename__ = "bus_stop"
 
     stop_id = Column(BigInteger, primary_key=True)
     name = Column(Text)
+    region_id = Column(SmallInteger, ForeignKey("region.region_id"), index=True)
+    # Parent station; the stop itself is one of its platforms
+    station_id = Column(BigInteger, ForeignKey("station.station_id"), index=True)
     geom = Column(Geometry("POINT", srid=4326))
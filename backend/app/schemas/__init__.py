@@ -2,10 +2,12 @@ from app.schemas.user import User, UserCreate, UserUpdate, UserPasswordUpdate, U
 from app.schemas.token import Token, TokenPayload
 from app.schemas.poi import POI, POICreate, POIUpdate, POICategory, POICategoryCreate
 from app.schemas.notif import Notification, NotificationCreate
+from app.schemas.speed_profile import SpeedProfile, SpeedProfileUpdate
 
 __all__ = [
     "User", "UserCreate", "UserUpdate", "UserPasswordUpdate", "UserInDB",
     "Token", "TokenPayload",
     "POI", "POICreate", "POIUpdate", "POICategory", "POICategoryCreate",
-    "Notification", "NotificationCreate"
+    "Notification", "NotificationCreate",
+    "SpeedProfile", "SpeedProfileUpdate"
 ]
\ No newline at end of file
@@ -0,0 +1,27 @@
+from pydantic import BaseModel, model_validator
+from typing import List, Optional
+from datetime import datetime
+
+class SpeedProfileBase(BaseModel):
+    highway_type: Optional[str] = None
+    route_id: Optional[int] = None
+    # One speed per SPEED_PROFILE_BUCKET_MINUTES bucket, starting at midnight
+    speeds_kmh: List[float]
+
+    @model_validator(mode="after")
+    def check_target(self):
+        if (self.highway_type is None) == (self.route_id is None):
+            raise ValueError("Set exactly one of highway_type or route_id")
+        if any(speed <= 0 for speed in self.speeds_kmh):
+            raise ValueError("Speeds must be positive")
+        return self
+
+class SpeedProfileUpdate(SpeedProfileBase):
+    pass
+
+class SpeedProfile(SpeedProfileBase):
+    profile_id: int
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
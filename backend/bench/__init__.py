@@ -0,0 +1,10 @@
+"""
+Routing benchmarks.
+
+    python -m bench.network --database-url postgresql://localhost/road_paari_bench --reset
+    uvicorn app.main:app --workers 4           # DATABASE_URL pointing at the same database
+    python -m bench.run --manifest bench_network.json --output results.json
+
+The generator only writes to a local, throwaway PostGIS database. The routing
+SQL functions (find_nearest_stops, ...) must be installed in it.
+"""
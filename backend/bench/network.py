@@ -0,0 +1,292 @@
+"""
+Synthetic city network generator.
+
+Builds a jittered street grid with arterial roads every few blocks, bus routes
+running along the arterials and stops on arterial intersections, and loads it
+into the transport schema (created by the migrations in backend/migrations).
+A JSON manifest describing the network is written for bench.run.
+"""
+import argparse
+import io
+import json
+import math
+import random
+from urllib.parse import urlparse
+
+from sqlalchemy import create_engine
+
+from app.core.migrations import migrate
+
+# Kathmandu, so distances and SRID math look like production
+CENTER_LAT = 27.7172
+CENTER_LNG = 85.3240
+METERS_PER_DEG_LAT = 111320.0
+
+LOCAL_HOSTS = {"", "localhost", "127.0.0.1", "::1"}
+
+# Dropped by --reset; schema_migration goes too so the migrations run again
+TABLES = [
+    "route_stop", "route_way", "bus_stop", "station", "route", "osm_way", "osm_node", "region",
+    "schema_migration",
+]
+
+ROUTE_TYPES = ["bus", "minibus", "microbus"]
+
+STOP_ID_OFFSET = 1_000_000
+COPY_BATCH_ROWS = 50_000
+
+
+class SyntheticNetwork:
+    """Grid plus arterials, generated deterministically from a seed"""
+
+    def __init__(self, size: int, spacing: float, arterial_every: int,
+                 routes: int, stops: int, seed: int):
+        self.size = size
+        self.spacing = spacing
+        self.arterial_every = arterial_every
+        self.rng = random.Random(seed)
+        self.params = {
+            "size": size, "spacing": spacing, "arterial_every": arterial_every,
+            "routes": routes, "stops": stops, "seed": seed,
+        }
+        self.meters_per_deg_lng = METERS_PER_DEG_LAT * math.cos(math.radians(CENTER_LAT))
+
+        self.nodes = {}        # node_id -> (lng, lat)
+        self.ways = []         # (way_id, name, highway, source, target, length)
+        self.way_between = {}  # (node_a, node_b) -> way index
+        self.stops = {}        # node_id -> (stop_id, lng, lat)
+        self.routes = []       # (route_id, name, type, [way indexes], [stop ids])
+
+        self._build_grid()
+        self._place_stops(stops)
+        self._build_routes(routes)
+
+    def node_id(self, row: int, col: int) -> int:
+        return row * self.size + col + 1
+
+    def _is_arterial(self, index: int) -> bool:
+        return index % self.arterial_every == 0
+
+    def _build_grid(self):
+        half = (self.size - 1) * self.spacing / 2
+        jitter = self.spacing * 0.15
+        for row in range(self.size):
+            for col in range(self.size):
+                x = col * self.spacing - half + self.rng.uniform(-jitter, jitter)
+                y = row * self.spacing - half + self.rng.uniform(-jitter, jitter)
+                self.nodes[self.node_id(row, col)] = (
+                    CENTER_LNG + x / self.meters_per_deg_lng,
+                    CENTER_LAT + y / METERS_PER_DEG_LAT,
+                )
+
+        for row in range(self.size):
+            for col in range(self.size):
+                if col + 1 < self.size:
+                    self._add_way(row, col, row, col + 1, self._is_arterial(row), f"Row {row} Marg")
+                if row + 1 < self.size:
+                    self._add_way(row, col, row + 1, col, self._is_arterial(col), f"Col {col} Marg")
+
+    def _add_way(self, r1, c1, r2, c2, arterial, name):
+        a, b = self.node_id(r1, c1), self.node_id(r2, c2)
+        length = self.distance(self.nodes[a], self.nodes[b])
+        self.way_between[(a, b)] = self.way_between[(b, a)] = len(self.ways)
+        self.ways.append((
+            len(self.ways) + 1, name, "primary" if arterial else "residential", a, b, length
+        ))
+
+    def distance(self, p, q) -> float:
+        dx = (p[0] - q[0]) * self.meters_per_deg_lng
+        dy = (p[1] - q[1]) * METERS_PER_DEG_LAT
+        return math.hypot(dx, dy)
+
+    def _arterial_nodes(self):
+        return [
+            self.node_id(row, col)
+            for row in range(self.size)
+            for col in range(self.size)
+            if self._is_arterial(row) or self._is_arterial(col)
+        ]
+
+    def _place_stops(self, count: int):
+        candidates = self._arterial_nodes()
+        chosen = self.rng.sample(candidates, min(count, len(candidates)))
+        offset = 8.0  # stops sit a few metres off the intersection
+        for i, node in enumerate(sorted(chosen)):
+            lng, lat = self.nodes[node]
+            self.stops[node] = (
+                STOP_ID_OFFSET + i + 1,
+                lng + offset / self.meters_per_deg_lng,
+                lat + offset / METERS_PER_DEG_LAT,
+            )
+
+    def _build_routes(self, count: int):
+        lines = [i for i in range(self.size) if self._is_arterial(i)]
+        route_id = 0
+        attempts = 0
+        while len(self.routes) < count and attempts < count * 20:
+            attempts += 1
+            r1, r2 = self.rng.choice(lines), self.rng.choice(lines)
+            c1, c2 = self.rng.choice(lines), self.rng.choice(lines)
+            if abs(r1 - r2) + abs(c1 - c2) < self.size // 3:
+                continue
+
+            # Along row r1 to column c2, then along column c2 to row r2
+            path = [(r1, c) for c in _span(c1, c2)] + [(r, c2) for r in _span(r1, r2)[1:]]
+            nodes = [self.node_id(r, c) for r, c in path]
+            way_indexes = [self.way_between[(a, b)] for a, b in zip(nodes, nodes[1:])]
+            stop_ids = [self.stops[n][0] for n in nodes if n in self.stops]
+            if len(stop_ids) < 2:
+                continue
+
+            route_id += 1
+            route_type = self.rng.choice(ROUTE_TYPES)
+            self.routes.append((route_id, f"Route {route_id}", route_type, way_indexes, stop_ids))
+
+    def bbox(self):
+        lngs = [p[0] for p in self.nodes.values()]
+        lats = [p[1] for p in self.nodes.values()]
+        return [min(lngs), min(lats), max(lngs), max(lats)]
+
+    def manifest(self) -> dict:
+        return {
+            "params": self.params,
+            "bbox": self.bbox(),
+            "stops": [[stop_id, lng, lat] for stop_id, lng, lat in self.stops.values()],
+            "stop_nodes": [[stop_id, node] for node, (stop_id, _, _) in self.stops.items()],
+            "routes": [[route_id, stop_ids] for route_id, _, _, _, stop_ids in self.routes],
+        }
+
+    # Rows for COPY, in column order of the tables above
+    def node_rows(self):
+        for node_id, (lng, lat) in self.nodes.items():
+            yield (node_id, None, node_id in self.stops, _point(lng, lat))
+
+    def way_rows(self):
+        for way_id, name, highway, source, target, length in self.ways:
+            geom = _linestring([self.nodes[source], self.nodes[target]])
+            yield (way_id, name, highway, geom, source, target, length, length, length)
+
+    def route_rows(self):
+        for route_id, name, route_type, way_indexes, _ in self.routes:
+            parts = ",".join(
+                "(" + _coords([self.nodes[self.ways[i][3]], self.nodes[self.ways[i][4]]]) + ")"
+                for i in way_indexes
+            )
+            yield (route_id, name, route_type, f"SRID=4326;MULTILINESTRING({parts})")
+
+    def route_way_rows(self):
+        for route_id, _, _, way_indexes, _ in self.routes:
+            for seq, i in enumerate(way_indexes, start=1):
+                yield (route_id, self.ways[i][0], seq)
+
+    def stop_rows(self):
+        for stop_id, lng, lat in self.stops.values():
+            yield (stop_id, f"Stop {stop_id - STOP_ID_OFFSET}", _point(lng, lat))
+
+    def route_stop_rows(self):
+        for route_id, _, _, _, stop_ids in self.routes:
+            for seq, stop_id in enumerate(stop_ids, start=1):
+                yield (route_id, stop_id, seq)
+
+
+def _span(a: int, b: int):
+    step = 1 if b >= a else -1
+    return list(range(a, b + step, step))
+
+
+def _coords(points) -> str:
+    return ",".join(f"{lng:.7f} {lat:.7f}" for lng, lat in points)
+
+
+def _point(lng: float, lat: float) -> str:
+    return f"SRID=4326;POINT({lng:.7f} {lat:.7f})"
+
+
+def _linestring(points) -> str:
+    return f"SRID=4326;LINESTRING({_coords(points)})"
+
+
+def _copy(cursor, table: str, columns, rows):
+    """Stream rows into `table` with COPY, in batches"""
+    statement = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    buffer = io.StringIO()
+    count = 0
+    for row in rows:
+        buffer.write("\t".join(r"\N" if v is None else str(v) for v in row))
+        buffer.write("\n")
+        count += 1
+        if count % COPY_BATCH_ROWS == 0:
+            buffer.seek(0)
+            cursor.copy_expert(statement, buffer)
+            buffer = io.StringIO()
+    if buffer.tell():
+        buffer.seek(0)
+        cursor.copy_expert(statement, buffer)
+
+
+def check_local(database_url: str):
+    host = urlparse(database_url).hostname or ""
+    if host not in LOCAL_HOSTS:
+        raise SystemExit(
+            f"Refusing to write a synthetic network to non-local database host '{host}'"
+        )
+
+
+def load(network: SyntheticNetwork, database_url: str, reset: bool):
+    check_local(database_url)
+    engine = create_engine(database_url)
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        if reset:
+            cursor.execute(f"DROP TABLE IF EXISTS {', '.join(TABLES)} CASCADE")
+            raw.commit()
+        migrate(raw, verbose=False)
+        _copy(cursor, "osm_node", ["osm_id", "name", "is_stop", "geom"], network.node_rows())
+        _copy(cursor, "osm_way",
+              ["osm_id", "name", "highway_type", "geom", "source", "target",
+               "cost", "reverse_cost", "length_meters"],
+              network.way_rows())
+        _copy(cursor, "route", ["route_id", "route_name", "route_type", "geom"], network.route_rows())
+        _copy(cursor, "route_way", ["route_id", "way_id", "sequence"], network.route_way_rows())
+        _copy(cursor, "bus_stop", ["stop_id", "name", "geom"], network.stop_rows())
+        _copy(cursor, "route_stop", ["route_id", "stop_id", "sequence"], network.route_stop_rows())
+        raw.commit()
+
+        # ANALYZE cannot run inside the load transaction
+        raw.set_isolation_level(0)
+        cursor.execute("ANALYZE")
+    finally:
+        raw.close()
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic routing network")
+    parser.add_argument("--database-url", required=True, help="Local throwaway PostGIS database")
+    parser.add_argument("--size", type=int, default=100, help="Grid intersections per side")
+    parser.add_argument("--spacing", type=float, default=120.0, help="Block size in meters")
+    parser.add_argument("--arterial-every", type=int, default=8, help="Blocks between arterials")
+    parser.add_argument("--routes", type=int, default=150)
+    parser.add_argument("--stops", type=int, default=1500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--reset", action="store_true", help="Drop the transport tables first")
+    parser.add_argument("--manifest", default="bench_network.json")
+    args = parser.parse_args()
+
+    network = SyntheticNetwork(
+        args.size, args.spacing, args.arterial_every, args.routes, args.stops, args.seed
+    )
+    load(network, args.database_url, args.reset)
+
+    with open(args.manifest, "w") as f:
+        json.dump(network.manifest(), f)
+
+    print(
+        f"Loaded {len(network.nodes)} nodes, {len(network.ways)} ways, "
+        f"{len(network.routes)} routes, {len(network.stops)} stops"
+    )
+
+
+if __name__ == "__main__":
+    main()
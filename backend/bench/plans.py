@@ -0,0 +1,152 @@
+"""
+Query plan check for the routing functions.
+
+Applies the migrations, then calls each routing function once with
+arguments taken from a bench.network manifest while auto_explain logs the
+plan of every statement run inside the functions. With enable_seqscan off
+the planner only picks a sequential scan when no index can serve the
+query, so any "Seq Scan" left in a plan is a missing index. The same
+setting makes the planner walk a whole index instead of the table, so an
+Index Scan or Index Only Scan with neither an "Index Cond" nor a KNN
+"Order By" counts as a full scan too. Exits 1 and lists the offending
+relations when one is found.
+
+    python -m bench.plans --database-url postgresql://localhost/routing_bench --load
+
+LOAD 'auto_explain' needs a superuser (or auto_explain in
+session_preload_libraries), which a local throwaway database has.
+"""
+import argparse
+import json
+import sys
+
+from sqlalchemy import create_engine
+
+from app.core.migrations import migrate
+from bench.network import SyntheticNetwork, check_local, load
+
+SESSION_SQL = """
+    LOAD 'auto_explain';
+    SET auto_explain.log_min_duration = 0;
+    SET auto_explain.log_nested_statements = on;
+    SET auto_explain.log_format = json;
+    SET auto_explain.log_level = notice;
+    SET client_min_messages = notice;
+    SET enable_seqscan = off;
+"""
+
+WALK_METERS = 500.0
+# Only scale the estimates; the plans are the same at any speed
+WALKING_KMH = 4.5
+BUS_KMH = 20.0
+
+
+def calls(manifest: dict):
+    """(label, SQL, params) for every routing function the API uses"""
+    stops = {stop_id: (lng, lat) for stop_id, lng, lat in manifest["stops"]}
+    nodes = dict(manifest["stop_nodes"])
+    route_id, stop_ids = max(manifest["routes"], key=lambda r: len(r[1]))
+    start, end = stop_ids[0], stop_ids[-1]
+    near = stop_ids[1] if len(stop_ids) > 2 else end
+    (s_lng, s_lat), (e_lng, e_lat), (n_lng, n_lat) = stops[start], stops[end], stops[near]
+    return [
+        ("find_nearest_stops", "SELECT * FROM find_nearest_stops(%s, %s, %s, %s)",
+         (s_lat, s_lng, WALK_METERS, 5)),
+        ("find_routes_between_stops", "SELECT * FROM find_routes_between_stops(%s, %s)",
+         (start, end)),
+        ("get_route_geometry", "SELECT * FROM get_route_geometry(%s, %s, %s, %s)",
+         (route_id, BUS_KMH, start, end)),
+        ("find_complete_journey", "SELECT find_complete_journey(%s, %s, %s, %s, %s)",
+         (s_lat, s_lng, e_lat, e_lng, WALK_METERS)),
+        ("calculate_walking_route", "SELECT * FROM calculate_walking_route(%s, %s, %s, %s, %s)",
+         (s_lat, s_lng, n_lat, n_lng, WALKING_KMH)),
+        ("calculate_walking_route_between_nodes",
+         "SELECT * FROM calculate_walking_route_between_nodes(%s, %s, %s, %s, %s, %s, %s)",
+         (nodes[start], nodes[near], s_lat, s_lng, n_lat, n_lng, WALKING_KMH)),
+        ("get_routes_at_stop", "SELECT * FROM get_routes_at_stop(%s)", (start,)),
+    ]
+
+
+def _plans(notices):
+    for notice in notices:
+        _, found, text = notice.partition("plan:")
+        if not found:
+            continue
+        try:
+            yield json.loads(text)
+        except ValueError:
+            continue
+
+
+INDEX_SCANS = ("Index Scan", "Index Only Scan")
+
+
+def full_scans(plan) -> list:
+    """Relations read in full (Seq Scan, or an index scan without a condition) in an auto_explain plan"""
+    found = []
+    if isinstance(plan, dict):
+        node = plan.get("Node Type")
+        if node == "Seq Scan":
+            found.append(plan.get("Relation Name", "?"))
+        elif node in INDEX_SCANS and "Index Cond" not in plan and "Order By" not in plan:
+            found.append(f"{plan.get('Relation Name', '?')} ({node} on {plan.get('Index Name', '?')})")
+        for value in plan.values():
+            found.extend(full_scans(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            found.extend(full_scans(value))
+    return found
+
+
+def check(raw, manifest: dict) -> dict:
+    """Function name -> relations it reads in full"""
+    cursor = raw.cursor()
+    cursor.execute(SESSION_SQL)
+    notices = raw.notices
+    failures = {}
+    for label, sql, params in calls(manifest):
+        del notices[:]
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        scans = sorted({relation for plan in _plans(notices) for relation in full_scans(plan)})
+        if scans:
+            failures[label] = scans
+        print(f"{label}: {', '.join(scans) if scans else 'ok'}")
+    raw.rollback()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail when a routing function plans a full scan")
+    parser.add_argument("--database-url", required=True, help="Local throwaway PostGIS database")
+    parser.add_argument("--manifest", default="bench_network.json")
+    parser.add_argument("--load", action="store_true",
+                        help="Load a fresh default bench.network first and write its manifest")
+    args = parser.parse_args()
+    check_local(args.database_url)
+
+    if args.load:
+        network = SyntheticNetwork(100, 120.0, 8, 150, 1500, 1)
+        load(network, args.database_url, reset=True)
+        with open(args.manifest, "w") as f:
+            json.dump(network.manifest(), f)
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+
+    engine = create_engine(args.database_url)
+    raw = engine.raw_connection()
+    try:
+        migrate(raw, verbose=False)
+        failures = check(raw, manifest)
+    finally:
+        raw.close()
+        engine.dispose()
+
+    if failures:
+        for label, relations in failures.items():
+            print(f"Full scan in {label}: {', '.join(relations)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
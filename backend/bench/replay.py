@@ -0,0 +1,131 @@
+"""
+Replay a request log recorded by app.core.request_log.RequestLogMiddleware.
+
+    python -m bench.replay requests.log.* --speed 5 --output replay.json
+
+Inter-arrival times from the log are kept, divided by --speed. With
+--speed max, requests are sent as fast as --workers allows.
+"""
+import argparse
+import http.client
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from bench.run import Client
+from bench.stats import git_revision, summarize
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+# app.core.request_log.TRUNCATED_BODY: the body was too large to log
+TRUNCATED_BODY = "<truncated>"
+
+
+def endpoint_name(method: str, path: str) -> str:
+    return f"{method} {_ID_SEGMENT.sub('/{id}', path)}"
+
+
+def load_log(paths):
+    """Records sorted by time, and how many were skipped for a truncated body"""
+    records, skipped = [], 0
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if record[4] == TRUNCATED_BODY:
+                    skipped += 1
+                    continue
+                records.append(record)
+    records.sort(key=lambda r: r[0])
+    return records, skipped
+
+
+def replay(client: Client, records, speed, workers: int) -> dict:
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    client_errors = defaultdict(int)
+    lock = threading.Lock()
+
+    def send(method, path, body):
+        name = endpoint_name(method, path.split("?", 1)[0])
+        start = time.perf_counter()
+        try:
+            status = client.request(method, path, body)
+        except (OSError, http.client.HTTPException):
+            status = None
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            if status is None or status >= 500:
+                errors[name] += 1
+            else:
+                latencies[name].append(elapsed)
+                if status >= 400:
+                    client_errors[name] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        first_ts = records[0][0] if records else 0
+        for ts, method, path, query, body in records:
+            if speed is not None:
+                delay = started + (ts - first_ts) / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(send, method, f"{path}?{query}" if query else path, body)
+    wall = time.perf_counter() - started
+
+    endpoints = {}
+    for name in sorted(set(latencies) | set(errors)):
+        summary = summarize(latencies[name], errors[name], wall)
+        summary["client_errors"] = client_errors[name]
+        endpoints[name] = summary
+    overall = summarize(
+        [v for values in latencies.values() for v in values], sum(errors.values()), wall
+    )
+    return {"wall_seconds": round(wall, 3), "overall": overall, "endpoints": endpoints}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded request log")
+    parser.add_argument("logs", nargs="+", help="Log files (one per worker process)")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--speed", default="1", help="Time multiplier, e.g. 1, 5 or max")
+    parser.add_argument("--workers", type=int, default=64, help="Max in-flight requests")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", default="replay_results.json")
+    args = parser.parse_args()
+
+    speed = None if args.speed == "max" else float(args.speed)
+    records, skipped = load_log(args.logs)
+    if skipped:
+        print(f"Skipped {skipped} requests whose body was too large to log")
+    client = Client(args.base_url, args.timeout)
+    result = replay(client, records, speed, args.workers)
+
+    for name, summary in result["endpoints"].items():
+        print(
+            f"{name:45} n={summary['requests']:<7} p50={summary['p50_ms']}ms "
+            f"p95={summary['p95_ms']}ms p99={summary['p99_ms']}ms "
+            f"errors={summary['error_rate']:.2%}"
+        )
+
+    report = {
+        "git_revision": git_revision(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "base_url": args.base_url,
+        "speed": args.speed,
+        "log_records": len(records),
+        "skipped_truncated": skipped,
+        **result,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
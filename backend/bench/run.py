@@ -0,0 +1,189 @@
+"""
+Latency and throughput benchmarks for the routing endpoints.
+
+Requests are generated deterministically from the network manifest written by
+bench.network, then replayed against a running API at each concurrency level.
+"""
+import argparse
+import http.client
+import json
+import math
+import platform
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlparse
+
+from bench.stats import git_revision, summarize
+
+METERS_PER_DEG_LAT = 111320.0
+
+
+class Client:
+    """Keep-alive HTTP client, one connection per thread"""
+
+    def __init__(self, base_url: str, timeout: float):
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def request(self, method: str, path: str, body=None) -> int:
+        headers = {"Accept-Encoding": "identity"}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        conn = self._connection()
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            raise
+
+
+def _near(rng: random.Random, lng: float, lat: float, radius: float):
+    """Random point within `radius` meters of (lng, lat)"""
+    angle = rng.uniform(0, 2 * math.pi)
+    dist = radius * math.sqrt(rng.random())
+    dlat = dist * math.sin(angle) / METERS_PER_DEG_LAT
+    dlng = dist * math.cos(angle) / (METERS_PER_DEG_LAT * math.cos(math.radians(lat)))
+    return lng + dlng, lat + dlat
+
+
+def build_requests(manifest: dict, scenario: str, count: int, seed: int):
+    rng = random.Random(f"{seed}:{scenario}")
+    stops = {stop_id: (lng, lat) for stop_id, lng, lat in manifest["stops"]}
+    routes = manifest["routes"]
+    requests = []
+
+    for _ in range(count):
+        route_id, stop_ids = rng.choice(routes)
+        i, j = sorted(rng.sample(range(len(stop_ids)), 2))
+        start_stop, end_stop = stop_ids[i], stop_ids[j]
+
+        if scenario == "nearest-stops":
+            lng, lat = _near(rng, *stops[start_stop], 300)
+            query = urlencode({"lat": lat, "lng": lng, "max_distance": 500, "limit": 5})
+            requests.append(("GET", f"/api/routing/nearest-stops?{query}", None))
+        elif scenario == "routes-between-stops":
+            query = urlencode({"start_stop_id": start_stop, "end_stop_id": end_stop})
+            requests.append(("GET", f"/api/routing/routes-between-stops?{query}", None))
+        elif scenario == "route-details":
+            path = f"/api/routing/route-details/{route_id}"
+            if rng.random() < 0.5:
+                path += "?" + urlencode({"start_stop_id": start_stop, "end_stop_id": end_stop})
+            requests.append(("GET", path, None))
+        elif scenario == "plan-journey":
+            s_lng, s_lat = _near(rng, *stops[start_stop], 250)
+            e_lng, e_lat = _near(rng, *stops[end_stop], 250)
+            body = {
+                "start": {"lat": s_lat, "lng": s_lng},
+                "end": {"lat": e_lat, "lng": e_lng},
+            }
+            requests.append(("POST", "/api/routing/plan-journey?max_walk_distance=500", body))
+        else:
+            raise ValueError(f"Unknown scenario {scenario}")
+
+    return requests
+
+
+def run_level(client: Client, requests, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    slices = [requests[i::concurrency] for i in range(concurrency)]
+
+    def worker(batch):
+        nonlocal errors
+        local_latencies = []
+        local_errors = 0
+        for method, path, body in batch:
+            start = time.perf_counter()
+            try:
+                status = client.request(method, path, body)
+            except (OSError, http.client.HTTPException):
+                status = None
+            elapsed = (time.perf_counter() - start) * 1000
+            # 404 is a valid "no route" answer for some synthetic pairs
+            if status is not None and (status < 400 or status == 404):
+                local_latencies.append(elapsed)
+            else:
+                local_errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors += local_errors
+
+    threads = [threading.Thread(target=worker, args=(batch,)) for batch in slices]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+SCENARIOS = ["nearest-stops", "routes-between-stops", "route-details", "plan-journey"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the routing endpoints")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--manifest", default="bench_network.json")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma separated levels")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per level")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args()
+
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+
+    client = Client(args.base_url, args.timeout)
+    levels = [int(c) for c in args.concurrency.split(",")]
+    results = {}
+
+    for scenario in args.scenarios.split(","):
+        requests = build_requests(manifest, scenario, args.requests + args.warmup, args.seed)
+        run_level(client, requests[:args.warmup], 1)
+        results[scenario] = {}
+        for level in levels:
+            summary = run_level(client, requests[args.warmup:], level)
+            results[scenario][str(level)] = summary
+            print(
+                f"{scenario:22} c={level:<4} p50={summary['p50_ms']}ms "
+                f"p99={summary['p99_ms']}ms {summary['throughput_rps']} req/s "
+                f"errors={summary['errors']}"
+            )
+
+    report = {
+        "git_revision": git_revision(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "base_url": args.base_url,
+        "network": manifest["params"],
+        "requests_per_level": args.requests,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+-- Transport schema: the OSM street graph (pgRouting), bus routes and stops,
+-- and the region / station tables used by the network snapshots.
+-- Written with IF NOT EXISTS so it also adopts databases created by hand.
+
+CREATE EXTENSION IF NOT EXISTS postgis;
+CREATE EXTENSION IF NOT EXISTS pgrouting;
+
+CREATE TABLE IF NOT EXISTS region (
+    region_id SMALLINT PRIMARY KEY,
+    slug TEXT NOT NULL UNIQUE,
+    name TEXT,
+    min_lng DOUBLE PRECISION NOT NULL,
+    min_lat DOUBLE PRECISION NOT NULL,
+    max_lng DOUBLE PRECISION NOT NULL,
+    max_lat DOUBLE PRECISION NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS osm_node (
+    osm_id BIGINT PRIMARY KEY,
+    name TEXT,
+    is_stop BOOLEAN DEFAULT FALSE,
+    geom geometry(POINT, 4326)
+);
+
+CREATE TABLE IF NOT EXISTS osm_way (
+    osm_id BIGINT PRIMARY KEY,
+    name TEXT,
+    highway_type TEXT,
+    geom geometry(LINESTRING, 4326),
+    source INTEGER,
+    target INTEGER,
+    cost DOUBLE PRECISION,
+    reverse_cost DOUBLE PRECISION,
+    length_meters DOUBLE PRECISION
+);
+ALTER TABLE osm_way ADD COLUMN IF NOT EXISTS region_id SMALLINT REFERENCES region (region_id);
+
+CREATE TABLE IF NOT EXISTS route (
+    route_id BIGINT PRIMARY KEY,
+    route_name TEXT,
+    route_type TEXT,
+    geom geometry(MULTILINESTRING, 4326)
+);
+ALTER TABLE route ADD COLUMN IF NOT EXISTS region_id SMALLINT REFERENCES region (region_id);
+
+CREATE TABLE IF NOT EXISTS route_way (
+    route_id BIGINT REFERENCES route (route_id),
+    way_id BIGINT REFERENCES osm_way (osm_id),
+    sequence INTEGER,
+    PRIMARY KEY (route_id, way_id)
+);
+
+CREATE TABLE IF NOT EXISTS station (
+    station_id BIGINT PRIMARY KEY,
+    name TEXT,
+    region_id SMALLINT REFERENCES region (region_id),
+    geom geometry(POINT, 4326)
+);
+
+CREATE TABLE IF NOT EXISTS bus_stop (
+    stop_id BIGINT PRIMARY KEY,
+    name TEXT,
+    geom geometry(POINT, 4326)
+);
+ALTER TABLE bus_stop ADD COLUMN IF NOT EXISTS region_id SMALLINT REFERENCES region (region_id);
+ALTER TABLE bus_stop ADD COLUMN IF NOT EXISTS station_id BIGINT REFERENCES station (station_id);
+
+CREATE TABLE IF NOT EXISTS route_stop (
+    route_id BIGINT REFERENCES route (route_id),
+    stop_id BIGINT REFERENCES bus_stop (stop_id),
+    sequence INTEGER,
+    PRIMARY KEY (route_id, sequence)
+);
@@ -0,0 +1,21 @@
+-- GiST on every geometry column, and B-trees on the join / graph columns the
+-- routing functions and the snapshot export filter on.
+
+CREATE INDEX IF NOT EXISTS osm_node_geom_idx ON osm_node USING GIST (geom);
+CREATE INDEX IF NOT EXISTS osm_way_geom_idx ON osm_way USING GIST (geom);
+CREATE INDEX IF NOT EXISTS route_geom_idx ON route USING GIST (geom);
+CREATE INDEX IF NOT EXISTS station_geom_idx ON station USING GIST (geom);
+CREATE INDEX IF NOT EXISTS bus_stop_geom_idx ON bus_stop USING GIST (geom);
+-- find_nearest_stops measures in meters on the geography
+CREATE INDEX IF NOT EXISTS bus_stop_geog_idx ON bus_stop USING GIST ((geom::geography));
+
+CREATE INDEX IF NOT EXISTS osm_way_source_idx ON osm_way (source);
+CREATE INDEX IF NOT EXISTS osm_way_target_idx ON osm_way (target);
+CREATE INDEX IF NOT EXISTS route_way_way_idx ON route_way (way_id);
+CREATE INDEX IF NOT EXISTS route_stop_stop_idx ON route_stop (stop_id);
+CREATE INDEX IF NOT EXISTS bus_stop_station_idx ON bus_stop (station_id);
+
+CREATE INDEX IF NOT EXISTS osm_way_region_idx ON osm_way (region_id);
+CREATE INDEX IF NOT EXISTS route_region_idx ON route (region_id);
+CREATE INDEX IF NOT EXISTS bus_stop_region_idx ON bus_stop (region_id);
+CREATE INDEX IF NOT EXISTS station_region_idx ON station (region_id);
@@ -0,0 +1,295 @@
+-- Routing functions called by app/api/endpoints/routing.py. Column order
+-- matches how the endpoints read the rows. Stops are matched at station
+-- level: a stop id stands for every platform of its station.
+--
+-- Functions are dropped first because CREATE OR REPLACE cannot change the
+-- result columns of a hand-made earlier version.
+
+DROP FUNCTION IF EXISTS find_complete_journey;
+DROP FUNCTION IF EXISTS find_nearest_stops;
+DROP FUNCTION IF EXISTS find_routes_between_stops;
+DROP FUNCTION IF EXISTS get_route_geometry;
+DROP FUNCTION IF EXISTS calculate_walking_route;
+DROP FUNCTION IF EXISTS get_routes_at_stop;
+
+
+-- Stops within p_max_dist meters, nearest first (GiST on geom::geography)
+CREATE FUNCTION find_nearest_stops(
+    p_lat DOUBLE PRECISION,
+    p_lng DOUBLE PRECISION,
+    p_max_dist DOUBLE PRECISION,
+    p_limit INTEGER
+)
+RETURNS TABLE (
+    stop_id BIGINT,
+    stop_name TEXT,
+    distance_meters DOUBLE PRECISION,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION
+)
+LANGUAGE sql STABLE PARALLEL SAFE AS $$
+    SELECT s.stop_id, s.name, ST_Distance(s.geom::geography, p.geog), ST_Y(s.geom), ST_X(s.geom)
+    FROM bus_stop s,
+         (SELECT ST_SetSRID(ST_MakePoint(p_lng, p_lat), 4326)::geography AS geog) p
+    WHERE ST_DWithin(s.geom::geography, p.geog, p_max_dist)
+    ORDER BY s.geom::geography <-> p.geog
+    LIMIT p_limit
+$$;
+
+
+-- Routes serving both stations in order, with the distance ridden along
+-- the stop sequence
+CREATE FUNCTION find_routes_between_stops(p_start BIGINT, p_end BIGINT)
+RETURNS TABLE (
+    route_id BIGINT,
+    route_name TEXT,
+    route_type TEXT,
+    is_direct BOOLEAN,
+    start_sequence INTEGER,
+    end_sequence INTEGER,
+    distance_meters DOUBLE PRECISION
+)
+LANGUAGE sql STABLE AS $$
+    WITH start_platforms AS (
+        SELECT p_start AS stop_id
+        UNION
+        SELECT p.stop_id FROM bus_stop s JOIN bus_stop p ON p.station_id = s.station_id
+        WHERE s.stop_id = p_start
+    ),
+    end_platforms AS (
+        SELECT p_end AS stop_id
+        UNION
+        SELECT p.stop_id FROM bus_stop s JOIN bus_stop p ON p.station_id = s.station_id
+        WHERE s.stop_id = p_end
+    ),
+    pairs AS (
+        SELECT DISTINCT ON (a.route_id) a.route_id, a.sequence AS start_sequence, b.sequence AS end_sequence
+        FROM route_stop a
+        JOIN start_platforms sp ON sp.stop_id = a.stop_id
+        JOIN route_stop b ON b.route_id = a.route_id AND b.sequence > a.sequence
+        JOIN end_platforms ep ON ep.stop_id = b.stop_id
+        ORDER BY a.route_id, b.sequence - a.sequence
+    ),
+    ridden AS (
+        SELECT p.route_id, sum(ST_Distance(s1.geom::geography, s2.geom::geography)) AS meters
+        FROM pairs p
+        JOIN route_stop h1 ON h1.route_id = p.route_id
+                          AND h1.sequence >= p.start_sequence AND h1.sequence < p.end_sequence
+        JOIN route_stop h2 ON h2.route_id = p.route_id AND h2.sequence = h1.sequence + 1
+        JOIN bus_stop s1 ON s1.stop_id = h1.stop_id
+        JOIN bus_stop s2 ON s2.stop_id = h2.stop_id
+        GROUP BY p.route_id
+    )
+    SELECT r.route_id, r.route_name, r.route_type, TRUE, p.start_sequence, p.end_sequence, d.meters
+    FROM pairs p
+    JOIN route r ON r.route_id = p.route_id
+    JOIN ridden d ON d.route_id = p.route_id
+    ORDER BY d.meters
+$$;
+
+
+-- A route, or its part between two of its stops: shape as GeoJSON text and
+-- the stops as a JSON array. The ETA assumes SPEED_PROFILE_DEFAULT_KMH
+-- (20 km/h); the API refines it from the speed profiles.
+CREATE FUNCTION get_route_geometry(
+    p_route_id BIGINT,
+    p_start_stop BIGINT DEFAULT NULL,
+    p_end_stop BIGINT DEFAULT NULL
+)
+RETURNS TABLE (
+    route_id BIGINT,
+    route_name TEXT,
+    route_type TEXT,
+    total_distance_meters DOUBLE PRECISION,
+    estimated_time_seconds DOUBLE PRECISION,
+    geom_json TEXT,
+    stops JSON
+)
+LANGUAGE sql STABLE AS $$
+    WITH bounds AS (
+        SELECT COALESCE(
+                   (SELECT min(rs.sequence) FROM route_stop rs
+                    WHERE rs.route_id = p_route_id AND rs.stop_id = p_start_stop),
+                   (SELECT min(rs.sequence) FROM route_stop rs WHERE rs.route_id = p_route_id)
+               ) AS lo,
+               COALESCE(
+                   (SELECT max(rs.sequence) FROM route_stop rs
+                    WHERE rs.route_id = p_route_id AND rs.stop_id = p_end_stop),
+                   (SELECT max(rs.sequence) FROM route_stop rs WHERE rs.route_id = p_route_id)
+               ) AS hi
+    ),
+    route_stops AS (
+        SELECT rs.sequence, s.stop_id, s.name, s.geom,
+               ST_Distance(s.geom::geography, (lag(s.geom) OVER (ORDER BY rs.sequence))::geography) AS hop
+        FROM route_stop rs
+        JOIN bus_stop s ON s.stop_id = rs.stop_id
+        CROSS JOIN bounds b
+        WHERE rs.route_id = p_route_id AND rs.sequence BETWEEN b.lo AND b.hi
+    ),
+    shape AS (
+        SELECT r.route_id, r.route_name, r.route_type,
+               CASE
+                   WHEN p_start_stop IS NULL AND p_end_stop IS NULL THEN r.geom
+                   WHEN GeometryType(ST_LineMerge(r.geom)) <> 'LINESTRING' THEN r.geom
+                   ELSE (
+                       SELECT ST_LineSubstring(m.line, LEAST(m.a, m.b), GREATEST(m.a, m.b))
+                       FROM (
+                           SELECT ST_LineMerge(r.geom) AS line,
+                                  ST_LineLocatePoint(ST_LineMerge(r.geom),
+                                      (SELECT geom FROM route_stops ORDER BY sequence LIMIT 1)) AS a,
+                                  ST_LineLocatePoint(ST_LineMerge(r.geom),
+                                      (SELECT geom FROM route_stops ORDER BY sequence DESC LIMIT 1)) AS b
+                       ) m
+                   )
+               END AS geom
+        FROM route r
+        WHERE r.route_id = p_route_id
+    )
+    SELECT sh.route_id, sh.route_name, sh.route_type, d.meters, d.meters * 3.6 / 20.0,
+           ST_AsGeoJSON(COALESCE(sh.geom, (SELECT ST_MakeLine(geom ORDER BY sequence) FROM route_stops))),
+           (SELECT COALESCE(json_agg(json_build_object(
+                       'sequence', sequence,
+                       'stop_id', stop_id,
+                       'stop_name', name,
+                       'latitude', ST_Y(geom),
+                       'longitude', ST_X(geom)
+                   ) ORDER BY sequence), '[]'::json)
+            FROM route_stops)
+    FROM shape sh
+    CROSS JOIN LATERAL (
+        SELECT COALESCE(ST_Length(sh.geom::geography), (SELECT COALESCE(sum(hop), 0) FROM route_stops)) AS meters
+    ) d
+$$;
+
+
+-- Nearest stops at both ends and the routes linking them, as one JSON
+-- document (keys read by plan-journey)
+CREATE FUNCTION find_complete_journey(
+    p_start_lat DOUBLE PRECISION,
+    p_start_lng DOUBLE PRECISION,
+    p_end_lat DOUBLE PRECISION,
+    p_end_lng DOUBLE PRECISION,
+    p_max_walk DOUBLE PRECISION
+)
+RETURNS JSON
+LANGUAGE sql STABLE AS $$
+    WITH start_stops AS (
+        SELECT * FROM find_nearest_stops(p_start_lat, p_start_lng, p_max_walk, 5)
+    ),
+    end_stops AS (
+        SELECT * FROM find_nearest_stops(p_end_lat, p_end_lng, p_max_walk, 5)
+    ),
+    direct AS (
+        SELECT DISTINCT ON (r.route_id)
+               r.route_id, r.route_name, r.route_type, r.is_direct, r.start_sequence, r.end_sequence,
+               r.distance_meters, a.distance_meters + b.distance_meters AS walk_meters
+        FROM start_stops a
+        CROSS JOIN end_stops b
+        CROSS JOIN LATERAL find_routes_between_stops(a.stop_id, b.stop_id) r
+        ORDER BY r.route_id, a.distance_meters + b.distance_meters + r.distance_meters
+    )
+    SELECT json_build_object(
+        'nearest_start_stops',
+        (SELECT COALESCE(json_agg(s ORDER BY s.distance_meters), '[]'::json) FROM start_stops s),
+        'nearest_end_stops',
+        (SELECT COALESCE(json_agg(s ORDER BY s.distance_meters), '[]'::json) FROM end_stops s),
+        'direct_routes',
+        (SELECT COALESCE(json_agg(json_build_object(
+                    'route_id', d.route_id,
+                    'route_name', d.route_name,
+                    'route_type', d.route_type,
+                    'is_direct', d.is_direct,
+                    'start_sequence', d.start_sequence,
+                    'end_sequence', d.end_sequence,
+                    'distance_meters', d.distance_meters
+                ) ORDER BY d.walk_meters + d.distance_meters), '[]'::json)
+         FROM direct d),
+        'has_direct_route', EXISTS (SELECT 1 FROM direct)
+    )
+$$;
+
+
+-- Walking path between two points over osm_way (pgRouting, undirected),
+-- one row per way. cost is in seconds at WALKING_SPEED_KMH (4.5 km/h).
+CREATE FUNCTION calculate_walking_route(
+    p_s_lat DOUBLE PRECISION,
+    p_s_lng DOUBLE PRECISION,
+    p_e_lat DOUBLE PRECISION,
+    p_e_lng DOUBLE PRECISION
+)
+RETURNS TABLE (
+    seq INTEGER,
+    way_id BIGINT,
+    way_name TEXT,
+    length_meters DOUBLE PRECISION,
+    cost DOUBLE PRECISION,
+    geom_json TEXT
+)
+LANGUAGE plpgsql STABLE AS $$
+#variable_conflict use_column
+DECLARE
+    v_start geometry := ST_SetSRID(ST_MakePoint(p_s_lng, p_s_lat), 4326);
+    v_end geometry := ST_SetSRID(ST_MakePoint(p_e_lng, p_e_lat), 4326);
+    v_source BIGINT;
+    v_target BIGINT;
+    v_box geometry;
+BEGIN
+    -- The closer end of the nearest way, as in the network snapshot export
+    SELECT CASE WHEN ST_LineLocatePoint(w.geom, v_start) < 0.5 THEN w.source ELSE w.target END
+    INTO v_source
+    FROM osm_way w
+    WHERE w.source IS NOT NULL
+    ORDER BY w.geom <-> v_start
+    LIMIT 1;
+
+    SELECT CASE WHEN ST_LineLocatePoint(w.geom, v_end) < 0.5 THEN w.source ELSE w.target END
+    INTO v_target
+    FROM osm_way w
+    WHERE w.source IS NOT NULL
+    ORDER BY w.geom <-> v_end
+    LIMIT 1;
+
+    IF v_source IS NULL OR v_target IS NULL OR v_source = v_target THEN
+        RETURN;
+    END IF;
+
+    -- Only ways around the two points (~1 km margin) take part in the search
+    v_box := ST_Expand(ST_Envelope(ST_Collect(v_start, v_end)), 0.01);
+
+    RETURN QUERY
+    SELECT d.seq::INTEGER, w.osm_id, w.name, w.length_meters, d.cost * 3.6 / 4.5, ST_AsGeoJSON(w.geom)
+    FROM pgr_dijkstra(
+        format(
+            'SELECT osm_id AS id, source, target, length_meters AS cost, length_meters AS reverse_cost '
+            'FROM osm_way WHERE source IS NOT NULL AND geom && %L::geometry',
+            v_box
+        ),
+        v_source, v_target, directed => false
+    ) d
+    JOIN osm_way w ON w.osm_id = d.edge
+    ORDER BY d.seq;
+END;
+$$;
+
+
+-- Routes serving any platform of a stop's station
+CREATE FUNCTION get_routes_at_stop(p_stop_id BIGINT)
+RETURNS TABLE (
+    route_id BIGINT,
+    route_name TEXT,
+    route_type TEXT,
+    stop_sequence INTEGER
+)
+LANGUAGE sql STABLE AS $$
+    WITH platforms AS (
+        SELECT p_stop_id AS stop_id
+        UNION
+        SELECT p.stop_id FROM bus_stop s JOIN bus_stop p ON p.station_id = s.station_id
+        WHERE s.stop_id = p_stop_id
+    )
+    SELECT DISTINCT ON (r.route_id) r.route_id, r.route_name, r.route_type, rs.sequence
+    FROM route_stop rs
+    JOIN platforms pl ON pl.stop_id = rs.stop_id
+    JOIN route r ON r.route_id = rs.route_id
+    ORDER BY r.route_id, rs.sequence
+$$;
@@ -0,0 +1,134 @@
+-- Region filter for the routing functions. With one snapshot per city the
+-- API passes the request's region so nearest stops and routes never come
+-- from another city; NULL (the default) searches everything, as before.
+
+DROP FUNCTION IF EXISTS find_complete_journey;
+DROP FUNCTION IF EXISTS find_nearest_stops;
+DROP FUNCTION IF EXISTS find_routes_between_stops;
+
+
+-- Stops within p_max_dist meters, nearest first (GiST on geom::geography)
+CREATE FUNCTION find_nearest_stops(
+    p_lat DOUBLE PRECISION,
+    p_lng DOUBLE PRECISION,
+    p_max_dist DOUBLE PRECISION,
+    p_limit INTEGER,
+    p_region INTEGER DEFAULT NULL
+)
+RETURNS TABLE (
+    stop_id BIGINT,
+    stop_name TEXT,
+    distance_meters DOUBLE PRECISION,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION
+)
+LANGUAGE sql STABLE PARALLEL SAFE AS $$
+    SELECT s.stop_id, s.name, ST_Distance(s.geom::geography, p.geog), ST_Y(s.geom), ST_X(s.geom)
+    FROM bus_stop s,
+         (SELECT ST_SetSRID(ST_MakePoint(p_lng, p_lat), 4326)::geography AS geog) p
+    WHERE ST_DWithin(s.geom::geography, p.geog, p_max_dist)
+      AND (p_region IS NULL OR s.region_id = p_region)
+    ORDER BY s.geom::geography <-> p.geog
+    LIMIT p_limit
+$$;
+
+
+-- Routes serving both stations in order, with the distance ridden along
+-- the stop sequence
+CREATE FUNCTION find_routes_between_stops(p_start BIGINT, p_end BIGINT, p_region INTEGER DEFAULT NULL)
+RETURNS TABLE (
+    route_id BIGINT,
+    route_name TEXT,
+    route_type TEXT,
+    is_direct BOOLEAN,
+    start_sequence INTEGER,
+    end_sequence INTEGER,
+    distance_meters DOUBLE PRECISION
+)
+LANGUAGE sql STABLE AS $$
+    WITH start_platforms AS (
+        SELECT p_start AS stop_id
+        UNION
+        SELECT p.stop_id FROM bus_stop s JOIN bus_stop p ON p.station_id = s.station_id
+        WHERE s.stop_id = p_start
+    ),
+    end_platforms AS (
+        SELECT p_end AS stop_id
+        UNION
+        SELECT p.stop_id FROM bus_stop s JOIN bus_stop p ON p.station_id = s.station_id
+        WHERE s.stop_id = p_end
+    ),
+    pairs AS (
+        SELECT DISTINCT ON (a.route_id) a.route_id, a.sequence AS start_sequence, b.sequence AS end_sequence
+        FROM route_stop a
+        JOIN start_platforms sp ON sp.stop_id = a.stop_id
+        JOIN route_stop b ON b.route_id = a.route_id AND b.sequence > a.sequence
+        JOIN end_platforms ep ON ep.stop_id = b.stop_id
+        JOIN route r ON r.route_id = a.route_id
+        WHERE p_region IS NULL OR r.region_id = p_region
+        ORDER BY a.route_id, b.sequence - a.sequence
+    ),
+    ridden AS (
+        SELECT p.route_id, sum(ST_Distance(s1.geom::geography, s2.geom::geography)) AS meters
+        FROM pairs p
+        JOIN route_stop h1 ON h1.route_id = p.route_id
+                          AND h1.sequence >= p.start_sequence AND h1.sequence < p.end_sequence
+        JOIN route_stop h2 ON h2.route_id = p.route_id AND h2.sequence = h1.sequence + 1
+        JOIN bus_stop s1 ON s1.stop_id = h1.stop_id
+        JOIN bus_stop s2 ON s2.stop_id = h2.stop_id
+        GROUP BY p.route_id
+    )
+    SELECT r.route_id, r.route_name, r.route_type, TRUE, p.start_sequence, p.end_sequence, d.meters
+    FROM pairs p
+    JOIN route r ON r.route_id = p.route_id
+    JOIN ridden d ON d.route_id = p.route_id
+    ORDER BY d.meters
+$$;
+
+
+-- Nearest stops at both ends and the routes linking them, as one JSON
+-- document (keys read by plan-journey)
+CREATE FUNCTION find_complete_journey(
+    p_start_lat DOUBLE PRECISION,
+    p_start_lng DOUBLE PRECISION,
+    p_end_lat DOUBLE PRECISION,
+    p_end_lng DOUBLE PRECISION,
+    p_max_walk DOUBLE PRECISION,
+    p_region INTEGER DEFAULT NULL
+)
+RETURNS JSON
+LANGUAGE sql STABLE AS $$
+    WITH start_stops AS (
+        SELECT * FROM find_nearest_stops(p_start_lat, p_start_lng, p_max_walk, 5, p_region)
+    ),
+    end_stops AS (
+        SELECT * FROM find_nearest_stops(p_end_lat, p_end_lng, p_max_walk, 5, p_region)
+    ),
+    direct AS (
+        SELECT DISTINCT ON (r.route_id)
+               r.route_id, r.route_name, r.route_type, r.is_direct, r.start_sequence, r.end_sequence,
+               r.distance_meters, a.distance_meters + b.distance_meters AS walk_meters
+        FROM start_stops a
+        CROSS JOIN end_stops b
+        CROSS JOIN LATERAL find_routes_between_stops(a.stop_id, b.stop_id, p_region) r
+        ORDER BY r.route_id, a.distance_meters + b.distance_meters + r.distance_meters
+    )
+    SELECT json_build_object(
+        'nearest_start_stops',
+        (SELECT COALESCE(json_agg(s ORDER BY s.distance_meters), '[]'::json) FROM start_stops s),
+        'nearest_end_stops',
+        (SELECT COALESCE(json_agg(s ORDER BY s.distance_meters), '[]'::json) FROM end_stops s),
+        'direct_routes',
+        (SELECT COALESCE(json_agg(json_build_object(
+                    'route_id', d.route_id,
+                    'route_name', d.route_name,
+                    'route_type', d.route_type,
+                    'is_direct', d.is_direct,
+                    'start_sequence', d.start_sequence,
+                    'end_sequence', d.end_sequence,
+                    'distance_meters', d.distance_meters
+                ) ORDER BY d.walk_meters + d.distance_meters), '[]'::json)
+         FROM direct d),
+        'has_direct_route', EXISTS (SELECT 1 FROM direct)
+    )
+$$;
@@ -0,0 +1,39 @@
+-- find_nearest_stops lists one platform per station (the nearest), with
+-- the station id, so several platforms of one station cannot crowd out
+-- other stops. find_complete_journey picks the column up through SELECT *.
+
+DROP FUNCTION IF EXISTS find_nearest_stops;
+
+
+-- Nearest platform of each station within p_max_dist meters, nearest first
+-- (GiST on geom::geography); a stop without a station is its own station
+CREATE FUNCTION find_nearest_stops(
+    p_lat DOUBLE PRECISION,
+    p_lng DOUBLE PRECISION,
+    p_max_dist DOUBLE PRECISION,
+    p_limit INTEGER,
+    p_region INTEGER DEFAULT NULL
+)
+RETURNS TABLE (
+    stop_id BIGINT,
+    stop_name TEXT,
+    distance_meters DOUBLE PRECISION,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    station_id BIGINT
+)
+LANGUAGE sql STABLE PARALLEL SAFE AS $$
+    SELECT n.stop_id, n.name, n.meters, n.lat, n.lng, n.station
+    FROM (
+        SELECT DISTINCT ON (COALESCE(s.station_id, s.stop_id))
+               s.stop_id, s.name, ST_Distance(s.geom::geography, p.geog) AS meters,
+               ST_Y(s.geom) AS lat, ST_X(s.geom) AS lng, COALESCE(s.station_id, s.stop_id) AS station
+        FROM bus_stop s,
+             (SELECT ST_SetSRID(ST_MakePoint(p_lng, p_lat), 4326)::geography AS geog) p
+        WHERE ST_DWithin(s.geom::geography, p.geog, p_max_dist)
+          AND (p_region IS NULL OR s.region_id = p_region)
+        ORDER BY COALESCE(s.station_id, s.stop_id), s.geom::geography <-> p.geog
+    ) n
+    ORDER BY n.meters
+    LIMIT p_limit
+$$;
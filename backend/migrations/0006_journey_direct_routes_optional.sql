@@ -0,0 +1,56 @@
+-- find_complete_journey can skip its direct-route search: plan-journey
+-- does not read it when the journey is answered in memory. The nearest
+-- stops are still returned for the response and the walking segments.
+
+DROP FUNCTION IF EXISTS find_complete_journey;
+
+
+-- Nearest stops at both ends and, with p_direct_routes, the routes linking
+-- them, as one JSON document (keys read by plan-journey)
+CREATE FUNCTION find_complete_journey(
+    p_start_lat DOUBLE PRECISION,
+    p_start_lng DOUBLE PRECISION,
+    p_end_lat DOUBLE PRECISION,
+    p_end_lng DOUBLE PRECISION,
+    p_max_walk DOUBLE PRECISION,
+    p_region INTEGER DEFAULT NULL,
+    p_direct_routes BOOLEAN DEFAULT TRUE
+)
+RETURNS JSON
+LANGUAGE sql STABLE AS $$
+    WITH start_stops AS (
+        SELECT * FROM find_nearest_stops(p_start_lat, p_start_lng, p_max_walk, 5, p_region)
+    ),
+    end_stops AS (
+        SELECT * FROM find_nearest_stops(p_end_lat, p_end_lng, p_max_walk, 5, p_region)
+    ),
+    direct AS (
+        -- A constant filter: the planner gates the whole join on it
+        SELECT DISTINCT ON (r.route_id)
+               r.route_id, r.route_name, r.route_type, r.is_direct, r.start_sequence, r.end_sequence,
+               r.distance_meters, a.distance_meters + b.distance_meters AS walk_meters
+        FROM start_stops a
+        CROSS JOIN end_stops b
+        CROSS JOIN LATERAL find_routes_between_stops(a.stop_id, b.stop_id, p_region) r
+        WHERE p_direct_routes
+        ORDER BY r.route_id, a.distance_meters + b.distance_meters + r.distance_meters
+    )
+    SELECT json_build_object(
+        'nearest_start_stops',
+        (SELECT COALESCE(json_agg(s ORDER BY s.distance_meters), '[]'::json) FROM start_stops s),
+        'nearest_end_stops',
+        (SELECT COALESCE(json_agg(s ORDER BY s.distance_meters), '[]'::json) FROM end_stops s),
+        'direct_routes',
+        (SELECT COALESCE(json_agg(json_build_object(
+                    'route_id', d.route_id,
+                    'route_name', d.route_name,
+                    'route_type', d.route_type,
+                    'is_direct', d.is_direct,
+                    'start_sequence', d.start_sequence,
+                    'end_sequence', d.end_sequence,
+                    'distance_meters', d.distance_meters
+                ) ORDER BY d.walk_meters + d.distance_meters), '[]'::json)
+         FROM direct d),
+        'has_direct_route', EXISTS (SELECT 1 FROM direct)
+    )
+$$;
@@ -0,0 +1,146 @@
+-- Speeds for the SQL time estimates come from the API settings instead of
+-- constants in the function bodies, so WALKING_SPEED_KMH and
+-- SPEED_PROFILE_DEFAULT_KMH apply on both sides.
+
+DROP FUNCTION IF EXISTS get_route_geometry;
+DROP FUNCTION IF EXISTS calculate_walking_route;
+
+
+-- A route, or its part between two of its stops: shape as GeoJSON text and
+-- the stops as a JSON array. The ETA is at p_speed_kmh (the API passes
+-- SPEED_PROFILE_DEFAULT_KMH and refines it from the speed profiles).
+CREATE FUNCTION get_route_geometry(
+    p_route_id BIGINT,
+    p_speed_kmh DOUBLE PRECISION,
+    p_start_stop BIGINT DEFAULT NULL,
+    p_end_stop BIGINT DEFAULT NULL
+)
+RETURNS TABLE (
+    route_id BIGINT,
+    route_name TEXT,
+    route_type TEXT,
+    total_distance_meters DOUBLE PRECISION,
+    estimated_time_seconds DOUBLE PRECISION,
+    geom_json TEXT,
+    stops JSON
+)
+LANGUAGE sql STABLE AS $$
+    WITH bounds AS (
+        SELECT COALESCE(
+                   (SELECT min(rs.sequence) FROM route_stop rs
+                    WHERE rs.route_id = p_route_id AND rs.stop_id = p_start_stop),
+                   (SELECT min(rs.sequence) FROM route_stop rs WHERE rs.route_id = p_route_id)
+               ) AS lo,
+               COALESCE(
+                   (SELECT max(rs.sequence) FROM route_stop rs
+                    WHERE rs.route_id = p_route_id AND rs.stop_id = p_end_stop),
+                   (SELECT max(rs.sequence) FROM route_stop rs WHERE rs.route_id = p_route_id)
+               ) AS hi
+    ),
+    route_stops AS (
+        SELECT rs.sequence, s.stop_id, s.name, s.geom,
+               ST_Distance(s.geom::geography, (lag(s.geom) OVER (ORDER BY rs.sequence))::geography) AS hop
+        FROM route_stop rs
+        JOIN bus_stop s ON s.stop_id = rs.stop_id
+        CROSS JOIN bounds b
+        WHERE rs.route_id = p_route_id AND rs.sequence BETWEEN b.lo AND b.hi
+    ),
+    shape AS (
+        SELECT r.route_id, r.route_name, r.route_type,
+               CASE
+                   WHEN p_start_stop IS NULL AND p_end_stop IS NULL THEN r.geom
+                   WHEN GeometryType(ST_LineMerge(r.geom)) <> 'LINESTRING' THEN r.geom
+                   ELSE (
+                       SELECT ST_LineSubstring(m.line, LEAST(m.a, m.b), GREATEST(m.a, m.b))
+                       FROM (
+                           SELECT ST_LineMerge(r.geom) AS line,
+                                  ST_LineLocatePoint(ST_LineMerge(r.geom),
+                                      (SELECT geom FROM route_stops ORDER BY sequence LIMIT 1)) AS a,
+                                  ST_LineLocatePoint(ST_LineMerge(r.geom),
+                                      (SELECT geom FROM route_stops ORDER BY sequence DESC LIMIT 1)) AS b
+                       ) m
+                   )
+               END AS geom
+        FROM route r
+        WHERE r.route_id = p_route_id
+    )
+    SELECT sh.route_id, sh.route_name, sh.route_type, d.meters, d.meters * 3.6 / p_speed_kmh,
+           ST_AsGeoJSON(COALESCE(sh.geom, (SELECT ST_MakeLine(geom ORDER BY sequence) FROM route_stops))),
+           (SELECT COALESCE(json_agg(json_build_object(
+                       'sequence', sequence,
+                       'stop_id', stop_id,
+                       'stop_name', name,
+                       'latitude', ST_Y(geom),
+                       'longitude', ST_X(geom)
+                   ) ORDER BY sequence), '[]'::json)
+            FROM route_stops)
+    FROM shape sh
+    CROSS JOIN LATERAL (
+        SELECT COALESCE(ST_Length(sh.geom::geography), (SELECT COALESCE(sum(hop), 0) FROM route_stops)) AS meters
+    ) d
+$$;
+
+
+-- Walking path between two points over osm_way (pgRouting, undirected),
+-- one row per way. cost is in seconds at p_walking_kmh (the API passes
+-- WALKING_SPEED_KMH).
+CREATE FUNCTION calculate_walking_route(
+    p_s_lat DOUBLE PRECISION,
+    p_s_lng DOUBLE PRECISION,
+    p_e_lat DOUBLE PRECISION,
+    p_e_lng DOUBLE PRECISION,
+    p_walking_kmh DOUBLE PRECISION
+)
+RETURNS TABLE (
+    seq INTEGER,
+    way_id BIGINT,
+    way_name TEXT,
+    length_meters DOUBLE PRECISION,
+    cost DOUBLE PRECISION,
+    geom_json TEXT
+)
+LANGUAGE plpgsql STABLE AS $$
+#variable_conflict use_column
+DECLARE
+    v_start geometry := ST_SetSRID(ST_MakePoint(p_s_lng, p_s_lat), 4326);
+    v_end geometry := ST_SetSRID(ST_MakePoint(p_e_lng, p_e_lat), 4326);
+    v_source BIGINT;
+    v_target BIGINT;
+    v_box geometry;
+BEGIN
+    -- The closer end of the nearest way, as in the network snapshot export
+    SELECT CASE WHEN ST_LineLocatePoint(w.geom, v_start) < 0.5 THEN w.source ELSE w.target END
+    INTO v_source
+    FROM osm_way w
+    WHERE w.source IS NOT NULL
+    ORDER BY w.geom <-> v_start
+    LIMIT 1;
+
+    SELECT CASE WHEN ST_LineLocatePoint(w.geom, v_end) < 0.5 THEN w.source ELSE w.target END
+    INTO v_target
+    FROM osm_way w
+    WHERE w.source IS NOT NULL
+    ORDER BY w.geom <-> v_end
+    LIMIT 1;
+
+    IF v_source IS NULL OR v_target IS NULL OR v_source = v_target THEN
+        RETURN;
+    END IF;
+
+    -- Only ways around the two points (~1 km margin) take part in the search
+    v_box := ST_Expand(ST_Envelope(ST_Collect(v_start, v_end)), 0.01);
+
+    RETURN QUERY
+    SELECT d.seq::INTEGER, w.osm_id, w.name, w.length_meters, d.cost * 3.6 / p_walking_kmh, ST_AsGeoJSON(w.geom)
+    FROM pgr_dijkstra(
+        format(
+            'SELECT osm_id AS id, source, target, length_meters AS cost, length_meters AS reverse_cost '
+            'FROM osm_way WHERE source IS NOT NULL AND geom && %L::geometry',
+            v_box
+        ),
+        v_source, v_target, directed => false
+    ) d
+    JOIN osm_way w ON w.osm_id = d.edge
+    ORDER BY d.seq;
+END;
+$$;
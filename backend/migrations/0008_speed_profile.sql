@@ -0,0 +1,13 @@
+-- Time-dependent speed profiles (app/model/speed_profile.py): speeds in km/h
+-- per SPEED_PROFILE_BUCKET_MINUTES bucket of the day, for either a highway
+-- type or one route. The API's speed model reloads when count(*) or
+-- max(updated_at) changes.
+
+CREATE TABLE IF NOT EXISTS speed_profile (
+    profile_id SERIAL PRIMARY KEY,
+    highway_type TEXT UNIQUE,
+    route_id BIGINT UNIQUE,
+    speeds_kmh DOUBLE PRECISION[] NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    CONSTRAINT ck_speed_profile_target CHECK ((highway_type IS NULL) <> (route_id IS NULL))
+);
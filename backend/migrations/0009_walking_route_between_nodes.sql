@@ -0,0 +1,57 @@
+-- Walking paths between nodes snapped by the API. With a network snapshot
+-- the endpoints are snapped in Python (STRtree over the way shapes), so the
+-- search no longer starts with two nearest-way scans of osm_way.
+-- calculate_walking_route stays for deployments without a snapshot.
+
+DROP FUNCTION IF EXISTS calculate_walking_route_between_nodes;
+
+
+-- Walking path from node p_source to node p_target over osm_way (pgRouting,
+-- undirected), one row per way. The snapped points bound the search; cost
+-- is in seconds at p_walking_kmh (the API passes WALKING_SPEED_KMH).
+CREATE FUNCTION calculate_walking_route_between_nodes(
+    p_source BIGINT,
+    p_target BIGINT,
+    p_s_lat DOUBLE PRECISION,
+    p_s_lng DOUBLE PRECISION,
+    p_e_lat DOUBLE PRECISION,
+    p_e_lng DOUBLE PRECISION,
+    p_walking_kmh DOUBLE PRECISION
+)
+RETURNS TABLE (
+    seq INTEGER,
+    way_id BIGINT,
+    way_name TEXT,
+    length_meters DOUBLE PRECISION,
+    cost DOUBLE PRECISION,
+    geom_json TEXT
+)
+LANGUAGE plpgsql STABLE AS $$
+#variable_conflict use_column
+DECLARE
+    v_box geometry;
+BEGIN
+    IF p_source IS NULL OR p_target IS NULL OR p_source = p_target THEN
+        RETURN;
+    END IF;
+
+    -- Only ways around the two points (~1 km margin) take part in the search
+    v_box := ST_Expand(ST_Envelope(ST_Collect(
+        ST_SetSRID(ST_MakePoint(p_s_lng, p_s_lat), 4326),
+        ST_SetSRID(ST_MakePoint(p_e_lng, p_e_lat), 4326)
+    )), 0.01);
+
+    RETURN QUERY
+    SELECT d.seq::INTEGER, w.osm_id, w.name, w.length_meters, d.cost * 3.6 / p_walking_kmh, ST_AsGeoJSON(w.geom)
+    FROM pgr_dijkstra(
+        format(
+            'SELECT osm_id AS id, source, target, length_meters AS cost, length_meters AS reverse_cost '
+            'FROM osm_way WHERE source IS NOT NULL AND geom && %L::geometry',
+            v_box
+        ),
+        p_source, p_target, directed => false
+    ) d
+    JOIN osm_way w ON w.osm_id = d.edge
+    ORDER BY d.seq;
+END;
+$$;
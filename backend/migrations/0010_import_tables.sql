@@ -0,0 +1,65 @@
+-- Tables the importers and offline jobs write, which they used to create
+-- themselves: the GTFS schedule (app/model/schedule.py, written by
+-- app/importers/gtfs.py) and the stop-to-stop transfers
+-- (app/model/transfer.py, written by app/graph/transfers.py). station is in
+-- 0001; its region index is added here. IF NOT EXISTS adopts the tables
+-- the importers created before.
+
+CREATE INDEX IF NOT EXISTS ix_station_region_id ON station (region_id);
+
+CREATE TABLE IF NOT EXISTS gtfs_stop_map (
+    feed_stop_id TEXT PRIMARY KEY,
+    stop_id BIGINT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS gtfs_route_map (
+    feed_route_id TEXT PRIMARY KEY,
+    route_id BIGINT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS trip (
+    trip_id BIGINT PRIMARY KEY,
+    feed_trip_id TEXT NOT NULL UNIQUE,
+    route_id BIGINT NOT NULL,
+    service_id TEXT,
+    headsign TEXT,
+    direction_id SMALLINT,
+    shape_id TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_trip_route_id ON trip (route_id);
+
+-- Seconds after midnight of the service day, may exceed 24h
+CREATE TABLE IF NOT EXISTS stop_time (
+    trip_id BIGINT REFERENCES trip (trip_id),
+    stop_sequence INTEGER,
+    stop_id BIGINT NOT NULL,
+    arrival_seconds INTEGER,
+    departure_seconds INTEGER,
+    PRIMARY KEY (trip_id, stop_sequence)
+);
+CREATE INDEX IF NOT EXISTS ix_stop_time_stop_id ON stop_time (stop_id);
+
+CREATE TABLE IF NOT EXISTS frequency (
+    trip_id BIGINT REFERENCES trip (trip_id),
+    start_seconds INTEGER,
+    end_seconds INTEGER NOT NULL,
+    headway_seconds INTEGER NOT NULL,
+    exact_times BOOLEAN DEFAULT FALSE,
+    PRIMARY KEY (trip_id, start_seconds)
+);
+
+CREATE TABLE IF NOT EXISTS gtfs_shape (
+    shape_id TEXT PRIMARY KEY,
+    length_meters DOUBLE PRECISION,
+    geom geometry(LINESTRING, 4326)
+);
+
+CREATE TABLE IF NOT EXISTS stop_transfer (
+    from_stop_id BIGINT,
+    to_stop_id BIGINT,
+    walk_seconds DOUBLE PRECISION NOT NULL,
+    distance_meters DOUBLE PRECISION NOT NULL,
+    -- osm_way ids walked, in order
+    path_way_ids BIGINT[] NOT NULL,
+    PRIMARY KEY (from_stop_id, to_stop_id)
+);
@@ -0,0 +1,169 @@
+import heapq
+import math
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.graph.alternatives import (
+    Option, bus_leg, journey_alternatives, pick_diverse, route_stop_meters, tree_path, walk_leg,
+    walking_tree,
+)
+
+
+def _dijkstra(city, source_id, limit):
+    """Reference walk distances (node id -> meters) straight off the generator's ways"""
+    adjacency = {}
+    for _, _, _, a, b, length in city.ways:
+        adjacency.setdefault(a, []).append((b, length))
+        adjacency.setdefault(b, []).append((a, length))
+    dist = {source_id: 0.0}
+    heap = [(0.0, source_id)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        for v, length in adjacency.get(u, ()):
+            nd = d + length
+            if nd <= limit and nd < dist.get(v, math.inf):
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return dist
+
+
+def test_walking_tree_matches_reference(synthetic):
+    city, network = synthetic
+    source_id = city.node_id(city.size // 2, city.size // 2)
+    source = network.node_index(source_id)
+    dist, pred = walking_tree(network, {source: 0.0}, 800.0)
+
+    expected = _dijkstra(city, source_id, 800.0)
+    got = {int(network.node_id[node]): meters for node, meters in dist.items()}
+    assert got.keys() == expected.keys()
+    for node_id, meters in expected.items():
+        assert got[node_id] == pytest.approx(meters, rel=1e-4)
+
+    # Every tree path adds up to the distance it was reached at
+    for node in list(dist)[::25]:
+        nodes, edges = tree_path(pred, node)
+        assert nodes[0] == source and nodes[-1] == node
+        assert float(network.way_length[edges].sum()) == pytest.approx(dist[node], rel=1e-4)
+
+
+def test_route_stop_meters_restart_per_route(synthetic):
+    _, network = synthetic
+    cumulative = route_stop_meters(network)
+    offsets = network.route_stop_offsets
+    for route in range(len(network.route_id)):
+        meters = cumulative[offsets[route]:offsets[route + 1]]
+        if len(meters) == 0:
+            continue
+        assert meters[0] == 0.0
+        assert np.all(np.diff(meters) >= 0)
+
+
+def _walk(ways, meters):
+    return {"mode": "walk", "distance_meters": meters, "duration_seconds": meters,
+            "ways": ways, "way_meters": [meters / len(ways)] * len(ways)}
+
+
+def test_pick_diverse_drops_overlapping_options():
+    fastest = Option([_walk([1, 2, 3, 4], 100.0)])
+    similar = Option([_walk([1, 2, 3, 5], 110.0)])
+    different = Option([_walk([6, 7], 150.0)])
+    chosen = pick_diverse([different, similar, fastest], 3)
+    assert chosen == [fastest, different]
+    assert pick_diverse([different, similar, fastest], 1) == [fastest]
+
+
+def test_option_totals(synthetic):
+    _, network = synthetic
+    option = Option([
+        walk_leg(network, [0], 100.0),
+        bus_leg(network, 0, 0, 1, 2000.0),
+        walk_leg(network, [1, 2], 50.0),
+    ])
+    walk_pace = 3.6 / settings.WALKING_SPEED_KMH
+    ride = settings.ALTERNATIVE_BOARDING_SECONDS + 2000.0 * 3.6 / settings.SPEED_PROFILE_DEFAULT_KMH
+    assert option.walking_meters == 150.0
+    assert option.transfers == 0
+    assert option.total_seconds == pytest.approx(150.0 * walk_pace + ride)
+
+
+def test_journey_alternatives_are_ranked_and_diverse(synthetic):
+    city, network = synthetic
+    _, _, _, _, stop_ids = max(city.routes, key=lambda r: len(r[4]))
+    stops = {stop_id: (lng, lat) for stop_id, lng, lat in city.stops.values()}
+    start, end = stops[stop_ids[0]], stops[stop_ids[-1]]
+
+    options = journey_alternatives(network, start, end, 500.0, 4)
+    assert 0 < len(options) <= 4
+    seconds = [option.total_seconds for option in options]
+    assert seconds == sorted(seconds)
+    for i, option in enumerate(options):
+        for better in options[:i]:
+            assert option.overlap(better) <= settings.ALTERNATIVE_MAX_OVERLAP
+        for leg in option.legs:
+            if leg["mode"] == "bus":
+                routes, positions = network.stop_routes(leg["from_stop"])
+                board = int(positions[list(routes).index(leg["route"])])
+                routes, positions = network.stop_routes(leg["to_stop"])
+                assert int(positions[list(routes).index(leg["route"])]) > board
+
+
+class _Corridors:
+    """
+    A hand-drawn street network for SyntheticDB, laid out in meters: a
+    straight main street with a small bump next to every block, and a
+    northern street 150 m away joining both of its ends
+    """
+
+    LNG, LAT = 85.3240, 27.7172
+
+    def __init__(self):
+        self.nodes, self.ways, self.stops, self.routes = {}, [], {}, []
+        self.meters = {}
+        self.main = [self.point(x, 0) for x in range(0, 1001, 50)]
+        for a, b in zip(self.main, self.main[1:]):
+            self.street(a, b, "Main")
+            bump = self.point((self.meters[a][0] + self.meters[b][0]) / 2, 5)
+            self.street(a, bump, "Bump")
+            self.street(bump, b, "Bump")
+        north = [self.main[0]] + [self.point(x, 150) for x in range(0, 1001, 100)] + [self.main[-1]]
+        for a, b in zip(north, north[1:]):
+            self.street(a, b, "North")
+
+    def point(self, x, y):
+        node_id = len(self.nodes) + 1
+        self.meters[node_id] = (x, y)
+        radius = 6_371_000.0
+        self.nodes[node_id] = (
+            self.LNG + math.degrees(x / (radius * math.cos(math.radians(self.LAT)))),
+            self.LAT + math.degrees(y / radius),
+        )
+        return node_id
+
+    def street(self, a, b, name):
+        (x1, y1), (x2, y2) = self.meters[a], self.meters[b]
+        self.ways.append((len(self.ways) + 1, name, "residential", a, b, math.hypot(x2 - x1, y2 - y1)))
+
+    def route_stop_rows(self):
+        return []
+
+    def route_way_rows(self):
+        return []
+
+
+def test_via_nodes_find_the_second_corridor(snapshot_of):
+    city = _Corridors()
+    network = snapshot_of(city)
+    start, end = city.nodes[city.main[0]], city.nodes[city.main[-1]]
+
+    options = journey_alternatives(network, start, end, 800.0, 3)
+    assert len(options) >= 2
+    fastest, other = options[0], options[1]
+    assert fastest.walking_meters == pytest.approx(1000.0, rel=1e-3)
+    # Not one of the bumps off the main street, those share nearly all of it
+    assert other.walking_meters == pytest.approx(1300.0, rel=1e-3)
+    assert other.overlap(fastest) < settings.ALTERNATIVE_MAX_OVERLAP
+    assert other.total_seconds <= fastest.total_seconds * (1 + settings.ALTERNATIVE_STRETCH)
@@ -0,0 +1,75 @@
+import copy
+import gzip
+import json
+
+from app.core.config import settings
+from app.graph.bundle import (
+    ROUTE_COLUMNS, STOP_COLUMNS, BundleCache, build_bundle, build_delta, encode_polyline,
+)
+
+
+def _apply(bundle: dict, delta: dict) -> dict:
+    """What the client does with a delta"""
+    merged = copy.deepcopy(bundle)
+    for table, columns, removed in (("stops", STOP_COLUMNS, "removed_stops"),
+                                    ("routes", ROUTE_COLUMNS, "removed_routes")):
+        rows = {row[0]: list(row) for row in zip(*(merged[table][c] for c in columns))}
+        for key in delta[removed]:
+            del rows[key]
+        for row in zip(*(delta[table][c] for c in columns)):
+            rows[row[0]] = list(row)
+        ordered = sorted(rows.values())
+        merged[table] = {c: [row[i] for row in ordered] for i, c in enumerate(columns)}
+    merged["version"] = delta["version"]
+    return merged
+
+
+def _sorted(bundle: dict) -> dict:
+    return _apply(bundle, {"version": bundle["version"], "removed_stops": [], "removed_routes": [],
+                           "stops": {c: [] for c in STOP_COLUMNS},
+                           "routes": {c: [] for c in ROUTE_COLUMNS}})
+
+
+def test_encode_polyline_reference():
+    # The worked example from Google's polyline algorithm documentation
+    assert encode_polyline([-120.2, -120.95, -126.453], [38.5, 40.7, 43.252]) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+
+def test_bundle_lists_every_stop_and_route(synthetic):
+    city, network = synthetic
+    bundle = build_bundle(network)
+    assert sorted(bundle["stops"]["id"]) == sorted(stop_id for stop_id, _, _ in city.stops.values())
+    routes = dict(zip(bundle["routes"]["id"], bundle["routes"]["stops"]))
+    assert routes == {route_id: stop_ids for route_id, _, _, _, stop_ids in city.routes}
+    assert all(bundle["routes"]["polyline"])
+
+
+def test_delta_reproduces_the_new_bundle(synthetic):
+    _, network = synthetic
+    old = json.loads(json.dumps(build_bundle(network)))
+    new = copy.deepcopy(old)
+    new["version"] = old["version"] + 1
+    new["stops"]["name"][0] = "Renamed"
+    for c in ROUTE_COLUMNS:
+        del new["routes"][c][-1]
+    for c, value in zip(STOP_COLUMNS, (99, "New stop", 27.7, 85.3)):
+        new["stops"][c].append(value)
+
+    delta = build_delta(new, old)
+    assert delta["since"] == old["version"] and not delta["full"]
+    assert delta["stops"]["id"] == [old["stops"]["id"][0], 99]
+    assert delta["removed_routes"] == [old["routes"]["id"][-1]]
+    assert delta["routes"]["id"] == []
+    assert _apply(old, delta) == _sorted(new)
+
+
+def test_cache_serves_deltas_from_published_bundles(synthetic, tmp_path, monkeypatch):
+    _, network = synthetic
+    monkeypatch.setattr(settings, "NETWORK_BUNDLE_DIR", str(tmp_path))
+    cache = BundleCache(network)
+    assert json.loads(gzip.decompress(cache.body)) == json.loads(json.dumps(cache.bundle))
+    assert cache.delta(cache.version - 1) is None
+
+    delta = json.loads(gzip.decompress(cache.delta(cache.version)))
+    assert delta["stops"]["id"] == [] and delta["removed_stops"] == []
+    assert cache.delta(cache.version) is cache.delta(cache.version)
@@ -0,0 +1,98 @@
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app.core.compression import CompressionMiddleware, _ResponseCache, _vary, choose_encoding
+from app.core.config import settings
+
+BODY = {"route_types": ["bus", "minibus", "microbus"] * 200}
+
+
+def _app(calls: list) -> FastAPI:
+    """Same middleware order as app.main"""
+    app = FastAPI()
+
+    @app.get("/api/routing/route-types")
+    def route_types():
+        calls.append(1)
+        return JSONResponse(BODY, headers={"Vary": "Cookie"})
+
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+    return app
+
+
+def test_choose_encoding():
+    assert choose_encoding("gzip") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("") is None
+    assert choose_encoding("*") is not None
+
+
+def test_vary_is_appended():
+    assert _vary([]) == b"Accept-Encoding"
+    assert _vary([(b"vary", b"Origin")]) == b"Origin, Accept-Encoding"
+    assert _vary([(b"Vary", b"Accept-Encoding, Origin")]) == b"Accept-Encoding, Origin"
+
+
+def test_gzip_response_is_cached():
+    calls = []
+    client = TestClient(_app(calls))
+    for _ in range(2):
+        response = client.get("/api/routing/route-types", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.json() == BODY
+    assert len(calls) == 1
+    # CORS adds Origin on its way out
+    assert response.headers["vary"].startswith("Cookie, Accept-Encoding")
+
+
+def test_cached_response_still_gets_cors_headers():
+    client = TestClient(_app([]))
+    first = client.get("/api/routing/route-types", headers={"Accept-Encoding": "gzip"})
+    assert "access-control-allow-origin" not in first.headers
+    second = client.get(
+        "/api/routing/route-types",
+        headers={"Accept-Encoding": "gzip", "Origin": "http://example.com"},
+    )
+    assert second.headers["access-control-allow-origin"] == "*"
+
+
+def test_origin_is_part_of_the_cache_key():
+    middleware = CompressionMiddleware(None)
+    scope = {"method": "GET", "path": "/api/routing/route-types", "query_string": b""}
+    plain = middleware._cache_key(scope, {}, "gzip")
+    with_origin = middleware._cache_key(scope, {b"origin": b"http://example.com"}, "gzip")
+    assert plain != with_origin
+
+
+def test_main_app_keeps_cors_outside_compression():
+    from app.main import app
+
+    # user_middleware lists the outermost middleware first
+    order = [m.cls for m in app.user_middleware]
+    assert order.index(CORSMiddleware) < order.index(CompressionMiddleware)
+
+
+def test_cache_is_bounded_by_size(monkeypatch):
+    monkeypatch.setattr(settings, "COMPRESSION_CACHE_MAX_BYTES", 10)
+    cache = _ResponseCache()
+    cache.put("a", 200, [], b"123456")
+    cache.put("b", 200, [], b"123456")
+    assert cache.get("a") is None
+    assert cache.get("b") == (200, [], b"123456")
+    assert cache.size == 6
+
+
+def test_small_bodies_are_not_compressed():
+    app = FastAPI()
+
+    @app.get("/small")
+    def small():
+        return {"ok": True}
+
+    app.add_middleware(CompressionMiddleware)
+    response = TestClient(app).get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.json() == {"ok": True}
@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import concurrency
+from app.core.concurrency import AdmissionLimiter, SingleFlight
+from app.core.config import settings
+
+
+@pytest.fixture(autouse=True)
+def pool_has_room(monkeypatch):
+    monkeypatch.setattr(concurrency, "read_pool_saturated", lambda: False)
+
+
+def test_identical_calls_share_one_computation():
+    calls = []
+
+    async def compute(canceller):
+        calls.append(canceller)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("key", compute) for _ in range(5)))
+        assert flight.in_flight() == 0
+        return results
+
+    assert asyncio.run(main()) == [1] * 5
+    assert len(calls) == 1
+
+
+def test_different_keys_run_separately():
+    async def main():
+        flight = SingleFlight()
+
+        async def compute(canceller):
+            return object()
+
+        a, b = await asyncio.gather(flight.do("a", compute), flight.do("b", compute))
+        assert a is not b
+
+    asyncio.run(main())
+
+
+def test_last_waiter_leaving_cancels_the_work():
+    seen = {}
+
+    async def compute(canceller):
+        seen["canceller"] = canceller
+        await asyncio.sleep(10)
+
+    async def main():
+        flight = SingleFlight()
+        first = asyncio.ensure_future(flight.do("key", compute))
+        second = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0.01)
+
+        first.cancel()
+        await asyncio.sleep(0.01)
+        # One caller is still waiting, so the work goes on
+        assert not seen["canceller"].cancelled
+        assert flight.in_flight() == 1
+
+        second.cancel()
+        await asyncio.sleep(0.01)
+        assert seen["canceller"].cancelled
+        assert flight.in_flight() == 0
+
+    asyncio.run(main())
+
+
+def test_errors_reach_every_waiter():
+    async def compute(canceller):
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        flight = SingleFlight()
+        return await asyncio.gather(*(flight.do("key", compute) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in asyncio.run(main()))
+
+
+def test_limiter_sheds_when_the_queue_is_full(monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_QUEUE_SIZE", 1)
+    monkeypatch.setattr(settings, "ADMISSION_QUEUE_TIMEOUT_SECONDS", 5.0)
+    running = []
+
+    async def work(limiter):
+        async with limiter.slot():
+            running.append(1)
+            await asyncio.sleep(0.05)
+
+    async def main():
+        limiter = AdmissionLimiter("test", 1)
+        return await asyncio.gather(*(work(limiter) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    shed = [r for r in results if isinstance(r, HTTPException)]
+    assert len(shed) == 1 and shed[0].status_code == 503
+    assert shed[0].headers["Retry-After"] == str(settings.ADMISSION_RETRY_AFTER_SECONDS)
+    assert len(running) == 2
+
+
+def test_limiter_times_out_waiting(monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_QUEUE_TIMEOUT_SECONDS", 0.01)
+
+    async def main():
+        limiter = AdmissionLimiter("test", 1)
+        async with limiter.slot():
+            with pytest.raises(HTTPException) as error:
+                async with limiter.slot():
+                    pass
+        assert error.value.status_code == 503
+        # The slot is free again afterwards
+        async with limiter.slot():
+            pass
+
+    asyncio.run(main())
+
+
+def test_limiter_sheds_when_the_pool_is_exhausted(monkeypatch):
+    monkeypatch.setattr(concurrency, "read_pool_saturated", lambda: True)
+
+    async def main():
+        with pytest.raises(HTTPException):
+            async with AdmissionLimiter("test", 4).slot():
+                pass
+
+    asyncio.run(main())
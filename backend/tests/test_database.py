@@ -0,0 +1,119 @@
+import os
+import threading
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import QueryCanceller, QueryCancelled, _prepare_read_transaction
+
+
+class FakeConnection:
+    def __init__(self):
+        self.cancels = 0
+
+    def cancel(self):
+        self.cancels += 1
+
+
+def test_cancel_reaches_the_attached_connection():
+    canceller, connection = QueryCanceller(), FakeConnection()
+    canceller.attach(connection)
+    canceller.cancel()
+    assert connection.cancels == 1
+
+
+def test_cancel_after_detach_leaves_the_pooled_connection_alone():
+    canceller, connection = QueryCanceller(), FakeConnection()
+    canceller.attach(connection)
+    canceller.detach()
+    canceller.cancel()
+    assert connection.cancels == 0
+
+
+def test_detach_waits_for_a_cancel_in_progress():
+    cancelling, detached = threading.Event(), threading.Event()
+
+    class SlowConnection:
+        cancel_finished = None
+
+        def cancel(self):
+            cancelling.set()
+            # detach() must not return while the cancel request is being sent
+            assert not detached.wait(0.2)
+            self.cancel_finished = True
+
+    canceller, connection = QueryCanceller(), SlowConnection()
+    canceller.attach(connection)
+
+    def detach():
+        cancelling.wait(5)
+        canceller.detach()
+        detached.set()
+
+    thread = threading.Thread(target=detach)
+    thread.start()
+    canceller.cancel()
+    thread.join(5)
+    assert connection.cancel_finished and detached.is_set()
+
+
+def test_transaction_setup_attaches_and_sets_the_timeout():
+    dbapi_connection, executed = FakeConnection(), []
+    connection = SimpleNamespace(
+        connection=SimpleNamespace(dbapi_connection=dbapi_connection),
+        execute=lambda statement, params: executed.append(params),
+    )
+    canceller = QueryCanceller()
+    session = SimpleNamespace(info={"statement_timeout_ms": 1500, "canceller": canceller})
+    _prepare_read_transaction(session, None, connection)
+    assert executed == [{"ms": "1500"}]
+    canceller.cancel()
+    assert dbapi_connection.cancels == 1
+
+
+# Against a real server when one is given, e.g.
+# TEST_DATABASE_URL=postgresql+psycopg2://postgres@localhost:5432/postgres
+@pytest.fixture
+def read_factory():
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    engine = create_engine(url, pool_size=1, max_overflow=0)
+    factory = sessionmaker(bind=engine)
+    event.listen(factory, "after_begin", _prepare_read_transaction)
+    yield factory
+    engine.dispose()
+
+
+def test_session_gets_the_statement_timeout(read_factory):
+    db = read_factory(info={"statement_timeout_ms": 1500, "canceller": QueryCanceller()})
+    try:
+        assert db.execute(text("SHOW statement_timeout")).scalar() == "1500ms"
+    finally:
+        db.close()
+
+
+def test_cancelled_session_returns_its_connection(read_factory):
+    canceller = QueryCanceller()
+    canceller.cancel()
+    db = read_factory(info={"canceller": canceller})
+    with pytest.raises(QueryCancelled):
+        db.execute(text("SELECT 1"))
+    db.close()
+    assert read_factory.kw["bind"].pool.checkedout() == 0
+
+
+def test_cancel_stops_a_running_query(read_factory):
+    canceller = QueryCanceller()
+    db = read_factory(info={"canceller": canceller})
+    timer = threading.Timer(0.2, canceller.cancel)
+    timer.start()
+    try:
+        with pytest.raises(OperationalError):
+            db.execute(text("SELECT pg_sleep(5)"))
+    finally:
+        timer.cancel()
+        db.close()
@@ -0,0 +1,52 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+from app.core import fastjson
+from app.core.fastjson import FastJSONResponse, RawJSON, _stdlib_dumps, dumps, raw_json
+
+GEOMETRY = '{"type":"Point","coordinates":[85.324,27.717]}'
+
+
+def test_raw_geometry_is_spliced_in():
+    body = dumps({"geometry": raw_json(GEOMETRY), "name": "Ratnapark"})
+    assert json.loads(body) == {"geometry": json.loads(GEOMETRY), "name": "Ratnapark"}
+    assert GEOMETRY.encode() in body
+
+
+def test_stdlib_fallback_matches():
+    obj = {
+        "geometry": RawJSON(GEOMETRY),
+        "stops": [RawJSON("[1,2]"), {"d": Decimal("1.5")}],
+        "name": "नयाँ बसपार्क",
+    }
+    assert json.loads(_stdlib_dumps(obj)) == {
+        "geometry": json.loads(GEOMETRY),
+        "stops": [[1, 2], {"d": 1.5}],
+        "name": "नयाँ बसपार्क",
+    }
+
+
+def test_stdlib_fallback_leaves_lookalike_strings_alone():
+    body = _stdlib_dumps({"name": "rawjson:0", "geometry": RawJSON("{}")})
+    assert json.loads(body) == {"name": "rawjson:0", "geometry": {}}
+
+
+def test_decimal_is_a_float():
+    assert json.loads(dumps({"meters": Decimal("12.5")})) == {"meters": 12.5}
+
+
+def test_unknown_types_are_refused():
+    with pytest.raises(TypeError):
+        dumps({"value": object()})
+
+
+def test_response_passes_rendered_bytes_through():
+    assert FastJSONResponse(b'{"a":1}').body == b'{"a":1}'
+
+
+@pytest.mark.skipif(not fastjson._USE_ORJSON, reason="orjson with Fragment is not installed")
+def test_orjson_and_stdlib_agree():
+    obj = {"a": [1, 2.5, None, True], "g": GEOMETRY}
+    assert json.loads(dumps(obj)) == json.loads(_stdlib_dumps(obj))
@@ -0,0 +1,79 @@
+import io
+import zipfile
+
+from app.importers.gtfs import CopyStream, GTFSFeed, GTFSImporter, _seconds, copy_rows
+
+
+def test_copy_stream_renders_copy_text():
+    stream = CopyStream([(1, "a\tb", None), (2, "line\nbreak", 1.5), (3, "back\\slash", "")])
+    assert stream.read() == b"1\ta\\tb\t\\N\n2\tline\\nbreak\t1.5\n3\tback\\\\slash\t\n"
+    assert stream.count == 3
+
+
+def test_copy_stream_small_reads_add_up():
+    rows = [(i, f"stop {i}") for i in range(1000)]
+    whole = CopyStream(rows).read()
+    stream, chunks = CopyStream(rows), []
+    while True:
+        chunk = stream.read(7)
+        if not chunk:
+            break
+        assert len(chunk) <= 7
+        chunks.append(chunk)
+    assert b"".join(chunks) == whole
+    assert stream.count == 1000
+
+
+def test_gtfs_times_may_pass_midnight():
+    assert _seconds("06:30:05") == 6 * 3600 + 30 * 60 + 5
+    assert _seconds("25:00:00") == 25 * 3600
+    assert _seconds("") is None
+
+
+def _feed(tmp_path, files: dict) -> GTFSFeed:
+    path = tmp_path / "feed.zip"
+    with zipfile.ZipFile(path, "w") as z:
+        for name, text in files.items():
+            # Nested in a folder and with a BOM, as some producers write them
+            z.writestr(f"feed/{name}", "﻿" + text)
+    return GTFSFeed(str(path))
+
+
+def test_feed_rows_stream_from_nested_files(tmp_path):
+    feed = _feed(tmp_path, {"routes.txt": "route_id,route_short_name\nR1,1\nR2,2\n"})
+    assert feed.has("routes.txt") and not feed.has("trips.txt")
+    assert list(feed.rows("routes.txt")) == [
+        {"route_id": "R1", "route_short_name": "1"},
+        {"route_id": "R2", "route_short_name": "2"},
+    ]
+    assert list(feed.rows("trips.txt")) == []
+
+
+def test_copy_rows_round_trip(pg_raw):
+    cursor = pg_raw.cursor()
+    cursor.execute("CREATE TEMP TABLE t (id BIGINT, name TEXT)")
+    rows = [(1, "Ratna\tPark"), (2, None), (3, "नयाँ बसपार्क")]
+    assert copy_rows(cursor, "t", ["id", "name"], rows) == 3
+    cursor.execute("SELECT id, name FROM t ORDER BY id")
+    assert cursor.fetchall() == rows
+
+
+def test_repeated_route_ids_upsert_once(pg_raw, tmp_path):
+    cursor = pg_raw.cursor()
+    # Just the columns import_routes touches, shadowing any real tables
+    cursor.execute("""
+        CREATE TEMP TABLE route (
+            route_id BIGINT PRIMARY KEY, route_name TEXT, route_type TEXT, region_id SMALLINT
+        );
+        CREATE TEMP TABLE gtfs_stop_map (feed_stop_id TEXT, stop_id BIGINT);
+        CREATE TEMP TABLE gtfs_route_map (feed_route_id TEXT, route_id BIGINT);
+    """)
+    feed = _feed(tmp_path, {
+        "routes.txt": "route_id,route_long_name,route_type\nR1,Old,3\nR2,Ring,3\nR1,New,704\n",
+    })
+    importer = GTFSImporter(cursor, feed)
+    assert importer.import_routes() == 3
+    cursor.execute("SELECT route_name, route_type FROM route ORDER BY route_id")
+    assert cursor.fetchall() == [("New", "bus"), ("Ring", "bus")]
+    cursor.execute("SELECT count(*) FROM gtfs_route_map")
+    assert cursor.fetchone()[0] == 2
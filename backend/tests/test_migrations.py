@@ -0,0 +1,141 @@
+import os
+import re
+
+import psycopg2
+import pytest
+
+from app.core.migrations import MIGRATIONS_DIR, MigrationError, discover, migrate, status
+
+
+def _write(directory, files):
+    for name, sql in files.items():
+        (directory / name).write_text(sql)
+
+
+def test_discover_orders_by_version_and_skips_other_files(tmp_path):
+    _write(tmp_path, {
+        "0002_second.sql": "SELECT 2;",
+        "0001_first.sql": "SELECT 1;",
+        "README.md": "notes",
+        "12_short.sql": "SELECT 3;",
+    })
+    migrations = discover(str(tmp_path))
+    assert [(m.version, m.name) for m in migrations] == [(1, "first"), (2, "second")]
+    assert migrations[0].checksum != migrations[1].checksum
+
+
+def test_duplicate_versions_are_refused(tmp_path):
+    _write(tmp_path, {"0001_a.sql": "SELECT 1;", "0001_b.sql": "SELECT 2;"})
+    with pytest.raises(MigrationError):
+        discover(str(tmp_path))
+
+
+def test_shipped_migrations_are_numbered_without_gaps():
+    versions = [m.version for m in discover(MIGRATIONS_DIR)]
+    assert versions == list(range(1, len(versions) + 1))
+
+
+def _created_columns():
+    """Table -> column names of every CREATE TABLE in the shipped migrations"""
+    tables = {}
+    for migration in discover(MIGRATIONS_DIR):
+        for name, body in re.findall(r"CREATE TABLE (?:IF NOT EXISTS )?(\w+) \((.*?)\n\);", migration.sql, re.S):
+            columns = tables.setdefault(name, set())
+            for line in body.splitlines():
+                match = re.match(r"\s+(\w+) ", line)
+                if match and match.group(1) not in ("PRIMARY", "CONSTRAINT", "UNIQUE"):
+                    columns.add(match.group(1))
+        for name, column in re.findall(r"ALTER TABLE (\w+) ADD COLUMN IF NOT EXISTS (\w+)", migration.sql):
+            tables.setdefault(name, set()).add(column)
+    return tables
+
+
+def test_tables_written_by_jobs_come_from_migrations():
+    from app import model
+
+    created = _created_columns()
+    for table in (model.Station, model.GTFSStopMap, model.GTFSRouteMap, model.Trip, model.StopTime,
+                  model.Frequency, model.GTFSShape, model.SpeedProfile, model.StopTransfer):
+        table = table.__table__
+        assert created.get(table.name) == set(table.columns.keys()), table.name
+
+
+@pytest.fixture
+def scratch_schema(pg_raw):
+    """Migrations commit, so they run in a schema of their own that is dropped afterwards"""
+    cursor = pg_raw.cursor()
+    cursor.execute("DROP SCHEMA IF EXISTS migration_test CASCADE; CREATE SCHEMA migration_test")
+    cursor.execute("SET search_path TO migration_test")
+    pg_raw.commit()
+    try:
+        yield pg_raw
+    finally:
+        pg_raw.rollback()
+        cursor.execute("DROP SCHEMA migration_test CASCADE")
+        pg_raw.commit()
+
+
+def test_migrate_applies_pending_files_once(scratch_schema, tmp_path):
+    raw = scratch_schema
+    _write(tmp_path, {"0001_table.sql": "CREATE TABLE thing (id INTEGER PRIMARY KEY);"})
+    assert [m.version for m in migrate(raw, str(tmp_path), verbose=False)] == [1]
+    assert migrate(raw, str(tmp_path), verbose=False) == []
+
+    _write(tmp_path, {"0002_row.sql": "INSERT INTO thing VALUES (1);"})
+    assert status(raw, str(tmp_path)) == [(1, "table", "applied"), (2, "row", "pending")]
+    assert [m.version for m in migrate(raw, str(tmp_path), verbose=False)] == [2]
+    cursor = raw.cursor()
+    cursor.execute("SELECT count(*) FROM thing")
+    assert cursor.fetchone()[0] == 1
+
+
+def test_changed_file_is_an_error(scratch_schema, tmp_path):
+    raw = scratch_schema
+    _write(tmp_path, {"0001_table.sql": "CREATE TABLE thing (id INTEGER);"})
+    migrate(raw, str(tmp_path), verbose=False)
+
+    _write(tmp_path, {"0001_table.sql": "CREATE TABLE thing (id BIGINT);"})
+    assert status(raw, str(tmp_path)) == [(1, "table", "changed")]
+    with pytest.raises(MigrationError):
+        migrate(raw, str(tmp_path), verbose=False)
+
+
+def test_failed_migration_is_rolled_back(scratch_schema, tmp_path):
+    raw = scratch_schema
+    _write(tmp_path, {
+        "0001_table.sql": "CREATE TABLE thing (id INTEGER);",
+        "0002_broken.sql": "CREATE TABLE other (id INTEGER); SELECT missing_column FROM thing;",
+    })
+    with pytest.raises(Exception):
+        migrate(raw, str(tmp_path), verbose=False)
+    assert status(raw, str(tmp_path)) == [(1, "table", "applied"), (2, "broken", "pending")]
+    cursor = raw.cursor()
+    cursor.execute("SELECT to_regclass('migration_test.other')")
+    assert cursor.fetchone()[0] is None
+
+
+def _table_columns(cursor, table):
+    cursor.execute(
+        "SELECT column_name FROM information_schema.columns"
+        " WHERE table_schema = 'migration_test' AND table_name = %s", (table,)
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def test_speed_profile_table_matches_the_model(scratch_schema):
+    from app.model import SpeedProfile
+
+    raw = scratch_schema
+    cursor = raw.cursor()
+    with open(os.path.join(MIGRATIONS_DIR, "0008_speed_profile.sql")) as f:
+        cursor.execute(f.read())
+    assert _table_columns(cursor, "speed_profile") == set(SpeedProfile.__table__.columns.keys())
+
+    cursor.execute("INSERT INTO speed_profile (highway_type, speeds_kmh) VALUES ('primary', '{20, 30}')")
+    cursor.execute("INSERT INTO speed_profile (route_id, speeds_kmh) VALUES (7, '{15}') RETURNING updated_at")
+    assert cursor.fetchone()[0] is not None
+    for values in ("('primary', 7, '{20}')", "(NULL, NULL, '{20}')"):
+        cursor.execute("SAVEPOINT target")
+        with pytest.raises(psycopg2.errors.CheckViolation):
+            cursor.execute(f"INSERT INTO speed_profile (highway_type, route_id, speeds_kmh) VALUES {values}")
+        cursor.execute("ROLLBACK TO SAVEPOINT target")
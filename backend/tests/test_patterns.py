@@ -0,0 +1,90 @@
+import pytest
+
+from app.graph.patterns import (
+    FORMAT_VERSION, MAGIC, SECTIONS, TransferPatterns, _best_ride, _pattern, _search, build_patterns,
+    hub_journeys,
+)
+from app.graph.ranking import rank_direct_routes
+from app.graph.snapshot import write_snapshot
+
+
+def _origins(network, count=5):
+    """Stations at the start of the longest routes"""
+    routes = sorted(range(len(network.route_id)), key=lambda r: -len(network.route_stops(r)))
+    return sorted({int(network.stop_station[network.route_stops(r)[0]]) for r in routes[:count]})
+
+
+def test_first_round_is_the_best_direct_ride(synthetic):
+    _, network = synthetic
+    for origin in _origins(network):
+        rounds = _search(network, None, origin, 1)
+        direct = {}
+        for station in range(len(network.station_id)):
+            ride = _best_ride(network, origin, station, None, None) if station != origin else None
+            if ride is not None:
+                direct[station] = ride[0]
+        assert rounds[1].keys() == direct.keys()
+        for station, seconds in direct.items():
+            assert rounds[1][station][0] == pytest.approx(seconds)
+            assert rounds[1][station][1] == ("ride", origin)
+
+
+def test_patterns_add_up_to_their_labels(synthetic):
+    _, network = synthetic
+    origin = _origins(network)[0]
+    rounds = _search(network, None, origin, 3)
+    assert len(rounds) > 2
+    for k in range(1, len(rounds)):
+        for destination, (arrival, _) in list(rounds[k].items())[::7]:
+            pattern = _pattern(rounds, k, destination)
+            assert len(pattern) == 2 * k
+            assert pattern[0] == origin and pattern[-1] == destination
+            # Without walking transfers a change happens within one station
+            assert all(pattern[i] == pattern[i + 1] for i in range(1, len(pattern) - 1, 2))
+            legs = [_best_ride(network, pattern[i], pattern[i + 1], None, None)[0]
+                    for i in range(0, len(pattern), 2)]
+            assert sum(legs) == pytest.approx(arrival)
+            # Each round only keeps stations it reaches faster than fewer rides do
+            assert all(destination not in rounds[j] or rounds[j][destination][0] > arrival
+                       for j in range(k))
+
+
+@pytest.fixture(scope="module")
+def hub_patterns(synthetic, tmp_path_factory):
+    _, network = synthetic
+    path = tmp_path_factory.mktemp("patterns") / "network.patterns"
+    arrays = build_patterns(network, None, 20, 2)
+    write_snapshot(str(path), network.version, arrays, SECTIONS, MAGIC, FORMAT_VERSION)
+    return TransferPatterns(str(path))
+
+
+def _at(network, station):
+    stop = int(network.station_stops(station)[0])
+    return float(network.stop_lng[stop]), float(network.stop_lat[stop])
+
+
+def test_hub_journeys_compete_with_direct_routes(synthetic, hub_patterns):
+    _, network = synthetic
+    hubs = hub_patterns.hub_station.tolist()
+    origin, destination = next(
+        (o, d) for o in hubs for d in hubs
+        if o != d and len(hub_patterns.patterns(o, d)) > 0
+        and rank_direct_routes(network, _at(network, o), _at(network, d), 300.0, 5)
+    )
+    start, end = _at(network, origin), _at(network, destination)
+    direct = rank_direct_routes(network, start, end, 300.0, 5)
+
+    options = hub_journeys(network, hub_patterns, start, end, 300.0, 3, direct_routes=direct)
+    assert options
+    seconds = [option.total_seconds for option in options]
+    assert seconds == sorted(seconds)
+    alone = hub_journeys(network, hub_patterns, start, end, 300.0, 3)
+    assert seconds[0] <= alone[0].total_seconds + 1e-6
+
+
+def test_no_patterns_when_the_nearest_station_is_not_a_hub(synthetic, hub_patterns):
+    _, network = synthetic
+    hubs = set(hub_patterns.hub_station.tolist())
+    other = next(s for s in range(len(network.station_id)) if s not in hubs)
+    hub = min(hubs)
+    assert hub_journeys(network, hub_patterns, _at(network, other), _at(network, hub), 300.0, 3) is None
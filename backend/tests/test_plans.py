@@ -0,0 +1,22 @@
+from bench.plans import full_scans
+
+
+def _plan(*nodes):
+    return {"Plan": {"Node Type": "Limit", "Plans": list(nodes)}}
+
+
+def test_seq_scans_are_reported():
+    plan = _plan({"Node Type": "Seq Scan", "Relation Name": "bus_stop"})
+    assert full_scans(plan) == ["bus_stop"]
+
+
+def test_index_scans_need_a_condition_or_knn_order():
+    bounded = {"Node Type": "Index Scan", "Relation Name": "route_stop", "Index Name": "route_stop_pkey",
+               "Index Cond": "(route_id = 1)"}
+    knn = {"Node Type": "Index Scan", "Relation Name": "osm_way", "Index Name": "osm_way_geom_idx",
+           "Order By": "(geom <-> '...'::geometry)"}
+    whole = {"Node Type": "Index Only Scan", "Relation Name": "route", "Index Name": "route_pkey"}
+    assert full_scans(_plan(bounded, knn)) == []
+    assert full_scans([_plan(bounded, {"Node Type": "Hash", "Plans": [whole]})]) == [
+        "route (Index Only Scan on route_pkey)"
+    ]
@@ -0,0 +1,58 @@
+import time
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from app.core import profiling
+from app.core.profiling import ProfiledRoute, get_profile, run_in_threadpool
+
+
+def _spin(seconds):
+    """CPU work without SQL"""
+    end = time.perf_counter() + seconds
+    count = 0
+    while time.perf_counter() < end:
+        count += 1
+    return count
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def allow(request):
+        pass
+
+    monkeypatch.setattr(profiling, "_authorize_profiling", allow)
+    router = APIRouter(route_class=ProfiledRoute)
+
+    @router.get("/sync")
+    def sync_endpoint():
+        return {"count": _spin(0.2)}
+
+    @router.get("/offloaded")
+    async def offloaded_endpoint():
+        return {"count": await run_in_threadpool(_spin, 0.2)}
+
+    app = FastAPI()
+    app.include_router(router)
+    with TestClient(app) as client:
+        yield client
+
+
+def _spin_samples(client, path):
+    response = client.get(path, params={"profile": 1})
+    assert response.status_code == 200
+    profile = get_profile(response.headers["X-Profile-Id"])
+    assert profile["path"] == path
+    return sum(s["count"] for s in profile["samples"] if ":_spin:" in s["stack"])
+
+
+@pytest.mark.parametrize("path", ["/sync", "/offloaded"])
+def test_threadpool_work_is_sampled(client, path):
+    assert _spin_samples(client, path) > 0
+
+
+def test_unprofiled_requests_are_not_stored(client):
+    response = client.get("/sync")
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
@@ -0,0 +1,92 @@
+import pytest
+
+from app.core.config import settings
+from app.graph.alternatives import route_stop_meters
+from app.graph.ranking import direct_candidates, haversine_meters, rank_direct_routes, stops_within
+
+WALK = 400.0
+
+
+def _trips(city, count=6):
+    """(start, end) points at the ends of the longest routes, nudged off the stops"""
+    stops = {stop_id: (lng, lat) for stop_id, lng, lat in city.stops.values()}
+    routes = sorted(city.routes, key=lambda r: -len(r[4]))[:count]
+    return [
+        ((stops[r[4][0]][0] + 0.0005, stops[r[4][0]][1]), (stops[r[4][-1]][0], stops[r[4][-1]][1] - 0.0005))
+        for r in routes
+    ]
+
+
+def _brute_force(network, start, end):
+    """{(route, board stop, alight stop, board position, alight position): walk meters}"""
+    board_stops, board_walk = stops_within(network, start[0], start[1], WALK)
+    alight_stops, alight_walk = stops_within(network, end[0], end[1], WALK)
+    found = {}
+    for b, bw in zip(board_stops.tolist(), board_walk.tolist()):
+        for a, aw in zip(alight_stops.tolist(), alight_walk.tolist()):
+            for route in range(len(network.route_id)):
+                stops = network.route_stops(route).tolist()
+                for p, stop in enumerate(stops):
+                    if stop != b:
+                        continue
+                    for q in range(p + 1, len(stops)):
+                        if stops[q] == a:
+                            found[(route, b, a, p, q)] = bw + aw
+    return found
+
+
+def test_stops_within_matches_haversine(synthetic):
+    city, network = synthetic
+    start, _ = _trips(city)[0]
+    stops, meters = stops_within(network, start[0], start[1], WALK)
+    everything = haversine_meters(start[0], start[1], network.stop_lng, network.stop_lat)
+    assert sorted(stops.tolist()) == sorted((everything <= WALK).nonzero()[0].tolist())
+    assert meters == pytest.approx(everything[stops])
+
+
+def test_direct_candidates_match_brute_force(synthetic):
+    city, network = synthetic
+    for start, end in _trips(city):
+        c = direct_candidates(network, start, end, WALK)
+        got = {
+            (int(r), int(b), int(a), int(p), int(q)): float(w)
+            for r, b, a, p, q, w in zip(c.route, c.board_stop, c.alight_stop,
+                                        c.board_position, c.alight_position, c.walk_meters)
+        }
+        expected = _brute_force(network, start, end)
+        assert got.keys() == expected.keys()
+        for key, meters in expected.items():
+            assert got[key] == pytest.approx(meters)
+
+
+def test_ranked_routes_are_the_cheapest_pair_per_route(synthetic):
+    city, network = synthetic
+    cumulative = route_stop_meters(network)
+    walk_pace = 3.6 / settings.WALKING_SPEED_KMH
+    ride_pace = 3.6 / settings.SPEED_PROFILE_DEFAULT_KMH
+    for start, end in _trips(city):
+        best = {}
+        for (route, b, a, p, q), walk in _brute_force(network, start, end).items():
+            base = network.route_stop_offsets[route]
+            ride = cumulative[base + q] - cumulative[base + p]
+            cost = (settings.WALK_RELUCTANCE * walk * walk_pace + ride * ride_pace
+                    + settings.ALTERNATIVE_BOARDING_SECONDS)
+            if route not in best or cost < best[route][0]:
+                best[route] = (cost, p, q)
+
+        ranked = rank_direct_routes(network, start, end, WALK, 3)
+        expected = sorted(best.values())[:3]
+        assert [r["generalized_cost_seconds"] for r in ranked] == pytest.approx([e[0] for e in expected])
+        for route in ranked:
+            r = network.route_index(route["route_id"])
+            cost, p, q = best[r]
+            sequence = network.route_stop_sequence[network.route_stop_offsets[r]:]
+            # The stored route_stop.sequence, not the position
+            assert (route["start_sequence"], route["end_sequence"]) == (sequence[p], sequence[q])
+            assert network.stop_index(route["from_stop_id"]) == network.route_stops(r)[p]
+            assert network.stop_index(route["to_stop_id"]) == network.route_stops(r)[q]
+
+
+def test_nothing_in_range(synthetic):
+    _, network = synthetic
+    assert rank_direct_routes(network, (0.0, 0.0), (0.1, 0.1), WALK, 3) == []
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import os
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.endpoints import routing
+from app.core.config import settings
+from app.graph.regions import MANIFEST, RegionRegistry
+
+
+def _manifest(directory, *regions):
+    entries = [
+        {"region_id": region_id, "slug": f"r{region_id}", "bbox": bbox, "file": f"{region_id}.snap"}
+        for region_id, bbox in regions
+    ]
+    path = os.path.join(directory, MANIFEST)
+    with open(path, "w") as f:
+        json.dump({"regions": entries}, f)
+    return path
+
+
+def test_smallest_region_wins(tmp_path):
+    _manifest(tmp_path, (1, [80, 20, 90, 30]), (2, [85, 27, 86, 28]))
+    registry = RegionRegistry(str(tmp_path))
+    assert registry.region_at(85.3, 27.7).region_id == 2
+    assert registry.region_at(81.0, 21.0).region_id == 1
+    assert registry.region_at(0.0, 0.0) is None
+    assert registry.region(None).region_id == 1
+
+
+def test_manifest_is_reread_when_it_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "NETWORK_SNAPSHOT_CHECK_SECONDS", 0.0)
+    path = _manifest(tmp_path, (1, [80, 20, 90, 30]))
+    registry = RegionRegistry(str(tmp_path))
+    assert registry.region(3) is None
+
+    _manifest(tmp_path, (1, [80, 20, 90, 30]), (3, [0, 0, 1, 1]))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert registry.region(3).region_id == 3
+
+
+def test_concurrent_refresh_reads_the_manifest_once(tmp_path, monkeypatch):
+    _manifest(tmp_path, (1, [80, 20, 90, 30]))
+    registry = RegionRegistry(str(tmp_path))
+    reads = []
+    real_open = open
+
+    def counting_open(path, *args, **kwargs):
+        if str(path).endswith(MANIFEST):
+            reads.append(path)
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", counting_open)
+    start = threading.Barrier(8)
+
+    def lookup():
+        start.wait()
+        assert registry.region_at(85.0, 25.0).region_id == 1
+
+    threads = [threading.Thread(target=lookup) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(reads) == 1
+
+
+class _StopDB:
+    """Answers the stop position lookup; any other query is a search that should not run"""
+
+    def __init__(self, stops):
+        self.stops = stops
+        self.searches = []
+
+    def execute(self, query, params=None):
+        if query is routing.STOP_POINT_SQL:
+            point = self.stops.get(params["stop_id"])
+
+            class Row:
+                def fetchone(self):
+                    return point
+
+            return Row()
+        self.searches.append(str(query))
+        raise AssertionError("searched outside every region")
+
+
+@pytest.fixture
+def two_cities(tmp_path, monkeypatch):
+    _manifest(tmp_path, (1, [85.2, 27.6, 85.5, 27.8]), (2, [83.9, 28.1, 84.1, 28.3]))
+    monkeypatch.setattr(settings, "NETWORK_REGIONS_DIR", str(tmp_path))
+
+
+def test_requests_are_routed_by_their_point(two_cities):
+    assert routing._region_at(85.32, 27.71) == 1
+    assert routing._region_at(84.0, 28.2) == 2
+    db = _StopDB({7: (84.0, 28.2)})
+    assert routing._region_of(db, routing.STOP_POINT_SQL, {"stop_id": 7}, "missing") == 2
+
+
+def test_points_outside_every_region_are_refused(two_cities):
+    with pytest.raises(HTTPException) as error:
+        routing._region_at(0.0, 0.0)
+    assert error.value.status_code == 400
+
+    db = _StopDB({7: (0.0, 0.0)})
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(routing.get_nearest_stops(lat=0.0, lng=0.0, max_distance=500, limit=5, db=db))
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(routing.get_routes_between_stops(start_stop_id=7, end_stop_id=8, departure_time=None, db=db))
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(routing.get_routes_between_stops(start_stop_id=9, end_stop_id=8, departure_time=None, db=db))
+    assert error.value.status_code == 404
+    assert db.searches == []
+
+
+def test_without_regions_nothing_is_looked_up(monkeypatch):
+    monkeypatch.setattr(settings, "NETWORK_REGIONS_DIR", None)
+    assert routing._region_at(0.0, 0.0) is None
+    assert routing._region_of(_StopDB({}), routing.STOP_POINT_SQL, {"stop_id": 7}, "missing") is None
@@ -0,0 +1,40 @@
+import json
+
+from app.core import request_log
+from app.core.request_log import TRUNCATED_BODY, _LogWriter, anonymize_body, anonymize_query
+from bench.replay import load_log
+
+
+def test_query_coordinates_are_rounded_and_profile_dropped():
+    query = anonymize_query("lat=27.717245&lng=85.324012&limit=5&profile=1")
+    assert query == "lat=27.717&lng=85.324&limit=5"
+
+
+def test_body_coordinates_are_rounded():
+    body = anonymize_body(json.dumps({"start": {"lat": 27.717245, "lng": 85.324012}, "n": 2}).encode())
+    assert body == {"start": {"lat": 27.717, "lng": 85.324}, "n": 2}
+
+
+def test_oversized_body_is_marked(monkeypatch):
+    monkeypatch.setattr(request_log, "MAX_BODY_BYTES", 10)
+    assert anonymize_body(b'{"points": [1, 2, 3, 4]}') == TRUNCATED_BODY
+
+
+def test_close_writes_buffered_lines(tmp_path):
+    writer = _LogWriter(str(tmp_path / "requests.log"))
+    for i in range(100):
+        writer.write(json.dumps([i, "GET", "/api/routing/health", "", None]) + "\n")
+    writer.close()
+    with open(writer.path) as f:
+        assert len(f.readlines()) == 100
+
+
+def test_replay_skips_truncated_bodies(tmp_path):
+    path = tmp_path / "requests.log.1"
+    path.write_text(
+        json.dumps([2.0, "POST", "/api/routing/snap", "", TRUNCATED_BODY]) + "\n"
+        + json.dumps([1.0, "GET", "/api/routing/nearest-stops", "lat=1.0", None]) + "\n"
+    )
+    records, skipped = load_log([str(path)])
+    assert skipped == 1
+    assert [r[2] for r in records] == ["/api/routing/nearest-stops"]
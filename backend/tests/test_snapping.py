@@ -0,0 +1,74 @@
+import math
+
+import numpy as np
+import pytest
+
+from app.graph.snapping import EARTH_RADIUS_METERS, Snapper, nearest_node
+
+
+class _NoStreets:
+    nodes, ways, stops, routes = {}, [], {}, []
+
+    def route_stop_rows(self):
+        return []
+
+    def route_way_rows(self):
+        return []
+
+
+def _along(network, way, fraction, offset_meters):
+    """(lng, lat) `fraction` along a straight way, pushed `offset_meters` to its left"""
+    lngs, lats = network.way_coords(way)
+    (x1, y1), (x2, y2) = (lngs[0], lats[0]), (lngs[-1], lats[-1])
+    scale = math.cos(math.radians(y1))
+    dx, dy = (x2 - x1) * scale, y2 - y1
+    norm = math.hypot(dx, dy)
+    shift = math.degrees(offset_meters / EARTH_RADIUS_METERS)
+    return (x1 + fraction * (x2 - x1) - dy / norm * shift / scale,
+            y1 + fraction * (y2 - y1) + dx / norm * shift)
+
+
+def test_points_snap_to_the_nearest_way(synthetic):
+    _, network = synthetic
+    snapper = Snapper(network)
+    for way in range(0, len(network.way_id), 97):
+        for fraction in (0.2, 0.5, 0.7):
+            snap = snapper.snap(*_along(network, way, fraction, 8.0))
+            assert snap.way == way
+            assert snap.fraction == pytest.approx(fraction, abs=1e-3)
+            assert snap.distance_meters == pytest.approx(8.0, rel=1e-2)
+            length = float(network.way_length[way])
+            assert snap.source_cost == pytest.approx(fraction * length, rel=1e-3)
+            assert snap.source_cost + snap.target_cost == pytest.approx(length, rel=1e-4)
+
+
+def test_snapped_point_lies_on_the_way(synthetic):
+    _, network = synthetic
+    snapper = Snapper(network)
+    way = len(network.way_id) // 3
+    snap = snapper.snap(*_along(network, way, 0.4, 20.0))
+    assert (snap.lng, snap.lat) == pytest.approx(_along(network, way, 0.4, 0.0), abs=1e-7)
+
+
+def test_nearest_node_is_the_closer_end(synthetic):
+    _, network = synthetic
+    snapper = Snapper(network)
+    way = len(network.way_id) // 2
+    near_source = snapper.snap(*_along(network, way, 0.3, 5.0))
+    near_target = snapper.snap(*_along(network, way, 0.8, 5.0))
+    assert nearest_node(network, near_source) == network.way_source[way]
+    assert nearest_node(network, near_target) == network.way_target[way]
+
+
+def test_far_points_and_empty_networks_do_not_snap(synthetic, snapshot_of):
+    _, network = synthetic
+    snapper = Snapper(network)
+    lngs, lats = network.node_lng, network.node_lat
+    far = (float(lngs.max()) + 1.0, float(lats.max()) + 1.0)
+    inside = (float(np.mean(lngs)), float(np.mean(lats)))
+    snaps = snapper.snap_many([far, inside, far])
+    assert snaps[0] is None and snaps[2] is None and snaps[1] is not None
+
+    empty = Snapper(snapshot_of(_NoStreets()))
+    assert len(empty.lines) == 0
+    assert empty.snap_many([inside, far]) == [None, None]
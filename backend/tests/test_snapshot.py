@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.graph.snapshot import (
+    MappedArrays, NetworkSnapshot, SnapshotError, SnapshotFile, StringTable, build_csr, write_snapshot,
+)
+
+SECTIONS = {"ids": "<i8", "values": "<f4"}
+
+
+class Pairs(MappedArrays):
+    SECTIONS = SECTIONS
+    MAGIC = b"TESTSNAP"
+    FORMAT_VERSION = 1
+
+
+def _write(path, version=7, ids=(3, 1, 2)):
+    arrays = {"ids": np.array(ids), "values": np.arange(len(ids)) / 2}
+    write_snapshot(str(path), version, arrays, SECTIONS, Pairs.MAGIC, Pairs.FORMAT_VERSION)
+    return arrays
+
+
+def test_round_trip(tmp_path):
+    arrays = _write(tmp_path / "pairs.snap")
+    pairs = Pairs(str(tmp_path / "pairs.snap"))
+    assert pairs.version == 7
+    assert pairs.ids.dtype == np.dtype("<i8")
+    np.testing.assert_array_equal(pairs.ids, arrays["ids"])
+    np.testing.assert_array_equal(pairs.values, arrays["values"].astype(np.float32))
+    assert not pairs.ids.flags.writeable
+
+
+def test_wrong_magic_and_format(tmp_path):
+    path = tmp_path / "pairs.snap"
+    _write(path)
+    with pytest.raises(SnapshotError):
+        NetworkSnapshot(str(path))
+
+    class Newer(Pairs):
+        FORMAT_VERSION = 2
+
+    with pytest.raises(SnapshotError):
+        Newer(str(path))
+
+
+def test_missing_section_is_refused(tmp_path):
+    with pytest.raises(SnapshotError):
+        write_snapshot(str(tmp_path / "x.snap"), 1, {"ids": np.zeros(1)}, SECTIONS, Pairs.MAGIC, 1)
+    assert not os.path.exists(tmp_path / "x.snap")
+
+
+def test_build_csr_keeps_order_within_groups():
+    keys = np.array([2, 0, 2, 1, 0])
+    offsets, values = build_csr(4, keys, np.array([10, 11, 12, 13, 14]))
+    np.testing.assert_array_equal(offsets, [0, 2, 3, 5, 5])
+    np.testing.assert_array_equal(values, [11, 14, 13, 10, 12])
+
+
+def test_string_table_dedupes():
+    strings = StringTable()
+    assert [strings.add(v) for v in ("a", "b", "a", None)] == [0, 1, 0, -1]
+    arrays = strings.arrays()
+    assert arrays["string_blob"].tobytes() == b"ab"
+
+
+def test_snapshot_file_swaps_in_a_new_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "NETWORK_SNAPSHOT_CHECK_SECONDS", 0.0)
+    path = tmp_path / "pairs.snap"
+    _write(path, version=1)
+    current = SnapshotFile(str(path), Pairs)
+    first = current.get()
+    assert first.version == 1
+    assert current.get() is first
+
+    _write(path, version=2)
+    second = current.get()
+    assert second.version == 2
+    # The old mapping stays readable for requests still holding it
+    assert first.ids.tolist() == [3, 1, 2]
+
+
+def test_network_indexes_are_consistent(synthetic):
+    city, network = synthetic
+    assert len(network.stop_id) == len(city.stops)
+    assert np.all(np.diff(network.stop_id) > 0)
+    for route in range(len(network.route_id)):
+        for position, stop in enumerate(network.route_stops(route).tolist()):
+            routes, positions = network.stop_routes(stop)
+            assert (route, position) in zip(routes.tolist(), positions.tolist())
+    stop = int(network.stop_id[5])
+    assert network.stop_index(stop) == 5
+    assert network.stop_index(stop + 10 ** 9) is None
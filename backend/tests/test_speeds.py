@@ -0,0 +1,167 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.graph import speeds
+from app.graph.speeds import _ProfileSlot, bucket_count, build_speed_profiles, reload_speed_profiles
+
+
+def _highways(network):
+    return np.array([network.string(int(code)) for code in network.way_highway])
+
+
+def _route_with_ways(network):
+    return next(r for r in range(len(network.route_id)) if len(network.route_ways(r)) > 3)
+
+
+def test_edge_seconds_follow_the_highway_profile(synthetic):
+    _, network = synthetic
+    buckets = bucket_count()
+    primary = np.linspace(10.0, 40.0, buckets)
+    # Recorded with hourly buckets, stretched to the configured size
+    residential = np.arange(1.0, 25.0)
+    rows = [("primary", None, primary.tolist()), ("residential", None, residential.tolist())]
+    profiles = build_speed_profiles(network, rows, (2, None))
+
+    assert profiles.edge_seconds.shape == (buckets, len(network.way_id))
+    highways = _highways(network)
+    lengths = network.way_length.astype(np.float64)
+    for bucket in (0, buckets // 2, buckets - 1):
+        is_primary = highways == "primary"
+        np.testing.assert_allclose(profiles.edge_seconds[bucket, is_primary],
+                                   lengths[is_primary] * 3.6 / primary[bucket], rtol=1e-5)
+        hour = bucket * settings.SPEED_PROFILE_BUCKET_MINUTES // 60
+        np.testing.assert_allclose(profiles.edge_seconds[bucket, ~is_primary],
+                                   lengths[~is_primary] * 3.6 / residential[hour], rtol=1e-5)
+
+
+def test_ways_without_a_profile_use_the_default_speed(synthetic):
+    _, network = synthetic
+    profiles = build_speed_profiles(network, [("motorway", None, [90.0] * bucket_count())], (1, None))
+    np.testing.assert_allclose(profiles.edge_seconds,
+                               np.broadcast_to(network.way_length * 3.6 / settings.SPEED_PROFILE_DEFAULT_KMH,
+                                               profiles.edge_seconds.shape), rtol=1e-5)
+
+
+def test_route_eta_uses_the_route_profile_at_the_departure(synthetic):
+    _, network = synthetic
+    route = _route_with_ways(network)
+    route_id = int(network.route_id[route])
+    buckets = bucket_count()
+    # Crawling in the first bucket, quick for the rest of the day
+    slow_start = np.full(buckets, 30.0)
+    slow_start[0] = 5.0
+    rows = [(None, route_id, slow_start.tolist()), (None, 10 ** 12, slow_start.tolist())]
+    profiles = build_speed_profiles(network, rows, (1, None))
+    assert set(profiles.route_pace) == {route}
+
+    noon = 12 * 3600
+    assert profiles.route_eta(route_id, 1000.0, noon) == pytest.approx(1000.0 * 3.6 / 30.0, rel=1e-5)
+    midnight = profiles.route_eta(route_id, 1000.0, 0)
+    assert midnight > profiles.route_eta(route_id, 1000.0, noon)
+    # The whole route is longer than one bucket at 5 km/h, so it speeds up part way
+    assert midnight < 1000.0 * 3.6 / 5.0
+
+
+def test_route_eta_without_a_route_profile_follows_the_ways(synthetic):
+    _, network = synthetic
+    route = _route_with_ways(network)
+    profiles = build_speed_profiles(network, [], (0, None))
+    eta = profiles.route_eta(int(network.route_id[route]), 500.0, 8 * 3600)
+    assert eta == pytest.approx(500.0 * 3.6 / settings.SPEED_PROFILE_DEFAULT_KMH, rel=1e-5)
+    assert profiles.route_eta(10 ** 12, 500.0, 0) is None
+    assert profiles.route_eta(int(network.route_id[route]), None, 0) is None
+
+
+class _ProfileTable:
+    """
+    The speed_profile table for _ProfileSlot. The state is the speed every
+    row was written with; a session sees the table as it was when it began.
+    """
+
+    def __init__(self):
+        self.data = ([], 0.0)
+        self.loads = 0
+
+    def set(self, speed):
+        self.data = ([(h, None, [speed] * bucket_count()) for h in ("primary", "residential")], speed)
+
+    def session(self):
+        table, (rows, speed) = self, self.data
+
+        class Session:
+            def execute(self, query):
+                class Result:
+                    def fetchone(self):
+                        return len(rows), speed
+
+                    def fetchall(self):
+                        table.loads += 1
+                        return list(rows)
+
+                return Result()
+
+        return Session()
+
+
+@pytest.fixture
+def profile_table(monkeypatch):
+    table = _ProfileTable()
+
+    @contextmanager
+    def read_session(endpoint=None, canceller=None):
+        yield table.session()
+
+    monkeypatch.setattr(speeds, "read_session", read_session)
+    monkeypatch.setattr(settings, "SPEED_PROFILE_CHECK_SECONDS", 0.0)
+    return table
+
+
+def test_slot_rebuilds_only_when_the_table_changes(synthetic, profile_table):
+    _, network = synthetic
+    slot = _ProfileSlot(network)
+    profile_table.set(20.0)
+    first = slot.get()
+    assert slot.get() is first and profile_table.loads == 1
+
+    profile_table.set(40.0)
+    second = slot.get()
+    assert second is not first and profile_table.loads == 2
+    # The old set is left untouched for requests still holding it
+    np.testing.assert_allclose(first.edge_seconds, second.edge_seconds * 2, rtol=1e-5)
+
+
+def test_readers_see_one_complete_set_during_swaps(synthetic, profile_table):
+    _, network = synthetic
+    slot = _ProfileSlot(network)
+    profile_table.set(10.0)
+    slot.get()
+    seconds_at = {10.0 * k: network.way_length * 3.6 / (10.0 * k) for k in range(1, 6)}
+    stop, mixed = threading.Event(), []
+
+    def read():
+        while not stop.is_set():
+            current = slot.get()
+            speed = current.state[1]
+            edge = current.edge_seconds[0]
+            if not np.allclose(edge, seconds_at[speed], rtol=1e-5):
+                mixed.append(speed)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    try:
+        for k in range(2, 6):
+            profile_table.set(10.0 * k)
+            reload_speed_profiles()
+            time.sleep(0.01)
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+    assert mixed == []
+    assert slot.get().state == (2, 50.0)
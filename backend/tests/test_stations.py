@@ -0,0 +1,51 @@
+import numpy as np
+
+from app.importers.stations import EARTH_RADIUS_METERS, cluster_stops
+
+LAT = 27.7172
+LNG = 85.3240
+
+
+def _east(meters):
+    """(lngs, lats) of points `meters` east of a fixed origin"""
+    meters = np.asarray(meters, dtype=np.float64)
+    lngs = LNG + np.degrees(meters / (EARTH_RADIUS_METERS * np.cos(np.radians(LAT))))
+    return lngs, np.full(len(meters), LAT)
+
+
+def _spans(lngs, seeds):
+    meters = (lngs - LNG) * np.radians(1.0) * EARTH_RADIUS_METERS * np.cos(np.radians(LAT))
+    return {seed: np.ptp(meters[seeds == seed]) for seed in set(seeds.tolist())}
+
+
+def test_a_row_of_stops_does_not_chain_into_one_station():
+    lngs, lats = _east(np.arange(20) * 25.0)
+    seeds = cluster_stops(lngs, lats, 30.0)
+    assert len(set(seeds.tolist())) == 10
+    assert max(_spans(lngs, seeds).values()) <= 30.0
+    np.testing.assert_array_equal(seeds, np.arange(20) // 2 * 2)
+
+
+def test_seeds_are_the_smallest_member():
+    lngs, lats = _east([40.0, 0.0, 5.0, 500.0, 45.0])
+    seeds = cluster_stops(lngs, lats, 30.0)
+    np.testing.assert_array_equal(seeds, [0, 1, 1, 3, 0])
+
+
+def test_random_stops_stay_within_distance_of_their_seed():
+    rng = np.random.default_rng(3)
+    meters = rng.uniform(0, 2000, size=(500, 2))
+    lngs = LNG + np.degrees(meters[:, 0] / (EARTH_RADIUS_METERS * np.cos(np.radians(LAT))))
+    lats = LAT + np.degrees(meters[:, 1] / EARTH_RADIUS_METERS)
+    seeds = cluster_stops(lngs, lats, 30.0)
+
+    assert np.all(seeds <= np.arange(500))
+    assert np.all(seeds[seeds] == seeds)
+    offset = meters - meters[seeds]
+    assert np.all(np.hypot(offset[:, 0], offset[:, 1]) <= 30.0 + 1e-3)
+
+
+def test_nothing_to_cluster():
+    assert len(cluster_stops(np.array([]), np.array([]), 30.0)) == 0
+    lngs, lats = _east([0.0, 5.0])
+    np.testing.assert_array_equal(cluster_stops(lngs, lats, 0.0), [0, 1])
@@ -0,0 +1,71 @@
+import math
+
+import pytest
+
+from app.core.config import settings
+from app.graph.snapshot import write_snapshot
+from app.graph.transfers import FORMAT_VERSION, MAGIC, SECTIONS, Transfers, build_transfers
+
+LNG, LAT = 85.3240, 27.7172
+WALK_PACE = 3.6 / settings.WALKING_SPEED_KMH
+
+
+class _Street:
+    """
+    One straight street with a stop at every node, `positions` metres east
+    of a fixed point. Stops 1 and 2 are platforms of one station.
+    """
+
+    positions = [0.0, 40.0, 160.0]
+
+    def __init__(self):
+        self.nodes, self.ways, self.stops, self.routes = {}, [], {}, []
+        for i, x in enumerate(self.positions, start=1):
+            self.nodes[i] = (LNG + math.degrees(x / (6_371_000.0 * math.cos(math.radians(LAT)))), LAT)
+            self.stops[i] = (i, *self.nodes[i])
+        for i in range(1, len(self.positions)):
+            self.ways.append((i, "Street", "residential", i, i + 1, self.positions[i] - self.positions[i - 1]))
+
+    def route_stop_rows(self):
+        return []
+
+    def route_way_rows(self):
+        return []
+
+
+@pytest.fixture
+def street_transfers(snapshot_of, tmp_path):
+    def build():
+        network = snapshot_of(_Street(), stations={1: 900, 2: 900})
+        path = tmp_path / f"network{len(list(tmp_path.glob('*.transfers')))}.transfers"
+        write_snapshot(str(path), network.version, build_transfers(network, 400.0), SECTIONS, MAGIC, FORMAT_VERSION)
+        return network, Transfers(str(path))
+
+    return build
+
+
+def _seconds(network, transfers, from_id, to_id):
+    return transfers.walk_seconds(network.stop_index(from_id), network.stop_index(to_id))
+
+
+def test_transfers_are_measured_from_each_platform(street_transfers, monkeypatch):
+    monkeypatch.setattr(settings, "TRANSFER_MIN_SECONDS", 0.0)
+    network, transfers = street_transfers()
+    assert network.stop_station[network.stop_index(1)] == network.stop_station[network.stop_index(2)]
+
+    assert _seconds(network, transfers, 1, 2) == pytest.approx(40.0 * WALK_PACE, rel=1e-4)
+    assert _seconds(network, transfers, 2, 1) == pytest.approx(40.0 * WALK_PACE, rel=1e-4)
+    # Each platform walks its own way to the next station
+    assert _seconds(network, transfers, 1, 3) == pytest.approx(160.0 * WALK_PACE, rel=1e-4)
+    assert _seconds(network, transfers, 2, 3) == pytest.approx(120.0 * WALK_PACE, rel=1e-4)
+    assert _seconds(network, transfers, 3, 1) == pytest.approx(160.0 * WALK_PACE, rel=1e-4)
+    i = transfers.find(network.stop_index(1), network.stop_index(3))
+    assert network.way_id[transfers.walk_path(i)].tolist() == [1, 2]
+
+
+def test_changing_platforms_costs_at_least_the_minimum(street_transfers, monkeypatch):
+    monkeypatch.setattr(settings, "TRANSFER_MIN_SECONDS", 90.0)
+    network, transfers = street_transfers()
+    assert _seconds(network, transfers, 1, 2) == pytest.approx(90.0)
+    assert _seconds(network, transfers, 1, 3) == pytest.approx(160.0 * WALK_PACE, rel=1e-4)
+    assert transfers.walk_seconds(network.stop_index(1), network.stop_index(1)) is None